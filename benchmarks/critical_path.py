@@ -0,0 +1,112 @@
+"""
+Compares the makespan of local runs of the example applications
+when ready tasks start in critical-path order versus in the order
+they became ready. This simulates the local runner's admission,
+using each job's ``run_time_minutes``, instead of running processes::
+
+    python benchmarks/critical_path.py --memory-limit 4 --vary 0.8
+
+With ``--vary``, each job's run time is scaled by a random factor,
+so that branches of the graph differ in length.
+"""
+import sys
+from argparse import ArgumentParser
+from heapq import heappush, heappop
+from itertools import count
+from pathlib import Path
+from random import Random
+from types import SimpleNamespace
+
+from gridengineapp.main import RunNext, expand_task_arrays
+from gridengineapp.multiprocess import LocalResources, AdmissionQueue
+
+EXAMPLES = Path(__file__).resolve().parent.parent / "examples"
+
+
+def example_apps():
+    for directory in ["location_hierarchy", "aggregate", "single_task_array"]:
+        sys.path.append(str(EXAMPLES / directory))
+    from location_app import LocationApp
+    from aggregate_app import PAFApplication
+    from countries import Countries
+    from gridengineapp.tests.cascade_app import CascadeIsh
+
+    parsable = dict(
+        location_hierarchy=LocationApp(),
+        aggregate=PAFApplication(),
+        single_task_array=Countries(),
+        cascade=CascadeIsh(),
+    )
+    for name, app in parsable.items():
+        parser = app.add_arguments(ArgumentParser())
+        app.initialize(parser.parse_args(["--base-directory", "."]))
+        yield name, app
+
+
+class VariedRunTimes:
+    """Wraps an application so each job's run time is scaled by a
+    random factor that is the same every time that job is made."""
+    def __init__(self, app, vary, seed):
+        self.app = app
+        self.vary = vary
+        self.seed = seed
+
+    def __getattr__(self, name):
+        return getattr(self.app, name)
+
+    def job(self, identifier):
+        resources = dict(self.app.job(identifier).resources)
+        scale = Random(f"{self.seed}{identifier}").uniform(
+            1 - self.vary, 1 + self.vary)
+        resources["run_time_minutes"] *= scale
+        return SimpleNamespace(resources=resources)
+
+
+def makespan(app, memory_limit, cpu_limit, prioritize):
+    """Simulates a local run and returns how long it takes, in minutes."""
+    task_graph = expand_task_arrays(app.job_graph(), app)
+    run_next = RunNext(app, task_graph, [], dict())
+    # No processes start, so skip finding the script for this app.
+    run_next._executable = [sys.executable, "-c", "pass"]
+
+    def ready(descriptions):
+        if not prioritize:
+            for description in descriptions.values():
+                description.priority = 0
+        return descriptions
+
+    resources = LocalResources(memory_limit, cpu_limit)
+    waiting = AdmissionQueue(ready(run_next(set())).items())
+    finish_times = list()
+    started = count()  # Breaks ties without comparing task IDs.
+    clock = 0
+    while waiting or finish_times:
+        for task, description in waiting.fitting(resources.fits):
+            resources.claim(task, description)
+            minutes = app.job(task[0]).resources["run_time_minutes"]
+            heappush(finish_times, (clock + minutes, next(started), task))
+        clock, _, finished = heappop(finish_times)
+        resources.release(finished)
+        for task, description in ready(run_next.complete(finished)).items():
+            waiting.add(task, description)
+    return clock
+
+
+def compare(memory_limit, cpu_limit, vary, seed):
+    print(f"{'app':>20} {'ready order':>12} {'critical path':>14}")
+    for name, app in example_apps():
+        if vary:
+            app = VariedRunTimes(app, vary, seed)
+        current = makespan(app, memory_limit, cpu_limit, False)
+        critical = makespan(app, memory_limit, cpu_limit, True)
+        print(f"{name:>20} {current:>12.1f} {critical:>14.1f}")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--memory-limit", type=float, default=4)
+    parser.add_argument("--cpu-limit", type=int, default=64)
+    parser.add_argument("--vary", type=float, default=0.8)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    compare(args.memory_limit, args.cpu_limit, args.vary, args.seed)
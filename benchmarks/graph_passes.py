@@ -0,0 +1,87 @@
+"""
+Times the graph passes that every launch makes, with the compact
+CSR graph and with networkx alone, on location-hierarchy-like trees
+whose identifiers are ``(location_id, sex)`` tuples::
+
+    python benchmarks/graph_passes.py --sizes 10000 100000 1000000
+
+The first pass over a graph makes its compact copy, and later passes
+over the same graph reuse it, as the passes of a launch do.
+"""
+from argparse import ArgumentParser
+from time import perf_counter
+from types import SimpleNamespace
+
+import networkx as nx
+
+from gridengineapp import graph_choice
+from gridengineapp.graph_choice import (
+    job_subset, jobs_not_done, execution_ordered
+)
+
+
+def location_sex_graph(size):
+    """A tree of locations, four children per location, where
+    each location has a job for each sex that depends on both."""
+    tree = nx.full_rary_tree(4, size // 3, create_using=nx.DiGraph)
+    graph = nx.DiGraph()
+    for location in tree:
+        for sex in ["female", "male"]:
+            graph.add_edge((location, sex), (location, "both"))
+    for parent, child in tree.edges:
+        for sex in ["female", "male"]:
+            graph.add_edge((parent, "both"), (child, sex))
+    return graph
+
+
+class GraphApp:
+    def __init__(self, graph):
+        self.graph = graph
+
+    def job_graph(self):
+        return self.graph
+
+    @staticmethod
+    def job_identifiers(_args):
+        return [(0, "female"), (0, "male")]
+
+
+def passes(graph):
+    """Seconds for each pass over the graph."""
+    app = GraphApp(graph)
+    args = SimpleNamespace(run_dependents=True)
+    times = dict()
+    begin = perf_counter()
+    job_subset(app, args)
+    times["job_subset"] = perf_counter() - begin
+    begin = perf_counter()
+    jobs_not_done(graph, lambda job_id: job_id[0] % 10 != 7)
+    times["jobs_not_done"] = perf_counter() - begin
+    begin = perf_counter()
+    for _job_id in execution_ordered(graph):
+        pass
+    times["execution_ordered"] = perf_counter() - begin
+    return times
+
+
+def benchmark(sizes):
+    print(f"{'nodes':>8} {'pass':>18} {'networkx s':>11} {'csr s':>8}")
+    compact_graph = graph_choice.CSRGraph
+    for size in sizes:
+        graph = location_sex_graph(size)
+        compact = passes(graph)
+        graph_choice.CSRGraph = None
+        try:
+            networkx_only = passes(graph)
+        finally:
+            graph_choice.CSRGraph = compact_graph
+        for name in compact:
+            print(f"{len(graph):>8} {name:>18} "
+                  f"{networkx_only[name]:>11.3f} {compact[name]:>8.3f}")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    benchmark(parser.parse_args().sizes)
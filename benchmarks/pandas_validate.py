@@ -0,0 +1,72 @@
+"""
+Compares validating a ``PandasFile`` by reading each dataset,
+as it used to, with reading only the column names from the metadata
+of each dataset, first with an empty cache and then with the cache
+warm::
+
+    python benchmarks/pandas_validate.py --rows 1000000 --keys 4
+
+"""
+import tempfile
+from argparse import ArgumentParser
+from pathlib import Path
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+from gridengineapp import data_passing
+from gridengineapp.data_passing import PandasFile
+
+COLUMNS = ["location", "sex", "age", "mean", "lower", "upper"]
+
+
+def write_file(path, rows, keys):
+    rng = np.random.default_rng(7)
+    for key_idx in range(keys):
+        frame = pd.DataFrame(rng.random((rows, len(COLUMNS))), columns=COLUMNS)
+        frame.to_hdf(path, key=f"draws{key_idx}", format="fixed", mode="a")
+
+
+def read_everything(path, keys):
+    """How PandasFile validated before, reading every dataset."""
+    for key in keys:
+        set(pd.read_hdf(path, key=key).columns)
+
+
+def seconds(work, repeats):
+    begin = perf_counter()
+    for _ in range(repeats):
+        work()
+    return (perf_counter() - begin) / repeats
+
+
+def benchmark(rows, key_cnt, repeats):
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "draws.hdf"
+        write_file(path, rows, key_cnt)
+        keys = [f"draws{key_idx}" for key_idx in range(key_cnt)]
+        entity = PandasFile(path, {key: COLUMNS for key in keys})
+
+        def cold():
+            data_passing._SCHEMA_CACHE.clear()
+            assert entity.validate() is None
+
+        def warm():
+            assert entity.validate() is None
+
+        size_mb = path.stat().st_size / 1024 ** 2
+        print(f"{key_cnt} keys, {rows} rows each, {size_mb:.0f} MB")
+        print(f"{'read datasets':>20} "
+              f"{seconds(lambda: read_everything(path, keys), repeats):.4f} s")
+        print(f"{'metadata':>20} {seconds(cold, repeats):.4f} s")
+        print(f"{'metadata, cached':>20} {seconds(warm, repeats):.6f} s")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--keys", type=int, default=4)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+    benchmark(args.rows, args.keys, args.repeats)
@@ -0,0 +1,114 @@
+"""
+Measures how long the local runner takes to decide what can run
+after each task completes, first in ``RunNext`` alone and then
+in all of ``graph_do``, which also admits tasks and reaps children.
+Children are stand-ins that have already finished, so only the
+runner's own work is timed. The cost per completion should stay
+flat as the number of tasks grows::
+
+    python benchmarks/ready_tasks.py --sizes 1000 10000 100000
+
+"""
+import sys
+from argparse import ArgumentParser
+from collections import deque
+from time import perf_counter
+from types import SimpleNamespace
+from unittest import mock
+
+import networkx as nx
+
+from gridengineapp import Job
+from gridengineapp import multiprocess
+from gridengineapp.main import RunNext, expand_task_arrays
+
+
+class TreeApp:
+    """A location hierarchy with four children per location."""
+    def __init__(self, size):
+        self.size = size
+
+    @staticmethod
+    def job_id_to_arguments(job_id):
+        return ["--job-id", str(job_id)]
+
+    def job_graph(self):
+        return nx.full_rary_tree(4, self.size, create_using=nx.DiGraph)
+
+    @staticmethod
+    def job(_identifier):
+        return Job()
+
+
+class FinishedWatcher:
+    """Stands in for the ``ChildWatcher``, where every child
+    has finished by the time it's waited upon."""
+    def __init__(self):
+        self._children = list()
+
+    def __len__(self):
+        return len(self._children)
+
+    def add(self, key, child):
+        self._children.append(key)
+
+    def wait(self, timeout=None):
+        finished, self._children = self._children, list()
+        return finished
+
+    def close(self):
+        pass
+
+
+def make_run_next(size):
+    app = TreeApp(size)
+    task_graph = expand_task_arrays(app.job_graph(), app)
+    run_next = RunNext(app, task_graph, [], dict())
+    # No processes start, so skip finding the script for this app.
+    run_next._executable = [sys.executable, "-c", "pass"]
+    return run_next
+
+
+def per_completion_seconds(size):
+    run_next = make_run_next(size)
+    unblocked = deque(run_next(set()))
+    begin = perf_counter()
+    completions = 0
+    while unblocked:
+        task = unblocked.popleft()
+        unblocked.extend(run_next.complete(task))
+        completions += 1
+    assert completions == size
+    return (perf_counter() - begin) / completions
+
+
+def graph_do_per_completion_seconds(size, cpu_limit):
+    run_next = make_run_next(size)
+
+    def finished_child(description, cores=None):
+        return SimpleNamespace(returncode=0, args=description.args)
+
+    with mock.patch.object(multiprocess, "ChildWatcher", FinishedWatcher), \
+            mock.patch.object(multiprocess, "_start_child", finished_child):
+        begin = perf_counter()
+        result = multiprocess.graph_do(
+            run_next, memory_limit=10 ** 6, cpu_limit=cpu_limit)
+    assert len(result.completed) == size
+    return (perf_counter() - begin) / size
+
+
+def benchmark(sizes, cpu_limit):
+    print(f"{'tasks':>10} {'RunNext us':>11} {'graph_do us':>12}")
+    for size in sizes:
+        cost = per_completion_seconds(size)
+        executor = graph_do_per_completion_seconds(size, cpu_limit)
+        print(f"{size:>10} {1e6 * cost:>11.1f} {1e6 * executor:>12.1f}")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--cpu-limit", type=int, default=64)
+    args = parser.parse_args()
+    benchmark(args.sizes, args.cpu_limit)
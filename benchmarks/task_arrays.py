@@ -0,0 +1,71 @@
+"""
+Compares the time and memory to build a task graph for two task
+arrays in sequence, followed by one job, when every task is its
+own node with an edge to every task after it, versus the
+``TaskGraph`` that ``expand_task_arrays`` makes::
+
+    python benchmarks/task_arrays.py --sizes 100 300 1000
+
+"""
+import tracemalloc
+from argparse import ArgumentParser
+from time import perf_counter
+
+import networkx as nx
+
+from gridengineapp.task_graph import TaskGraph, ReadyArrayTasks
+
+
+def two_arrays(size):
+    job_graph = nx.DiGraph([("first", "second"), ("second", "summary")])
+    task_ids = dict(
+        first=range(1, size + 1), second=range(1, size + 1), summary=[0])
+    return job_graph, task_ids
+
+
+def every_task_a_node(job_graph, task_ids):
+    task_graph = nx.DiGraph()
+    for job_id in nx.topological_sort(job_graph):
+        task_graph.add_nodes_from((job_id, t) for t in task_ids[job_id])
+        task_graph.add_edges_from(
+            ((pred, pred_task), (job_id, task))
+            for pred in job_graph.predecessors(job_id)
+            for pred_task in task_ids[pred]
+            for task in task_ids[job_id]
+        )
+    return task_graph
+
+
+def compact(job_graph, task_ids):
+    task_graph = TaskGraph(job_graph, task_ids)
+    ReadyArrayTasks(task_graph)
+    return task_graph
+
+
+def measure(build, size):
+    tracemalloc.start()
+    begin = perf_counter()
+    task_graph = build(*two_arrays(size))
+    seconds = perf_counter() - begin
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(task_graph) == 2 * size + 1
+    return seconds, peak / 1024 ** 2
+
+
+def benchmark(sizes):
+    print(f"{'tasks':>8} {'edges':>10} {'nodes s':>9} {'nodes MB':>9} "
+          f"{'compact s':>10} {'compact MB':>11}")
+    for size in sizes:
+        full_seconds, full_mb = measure(every_task_a_node, size)
+        compact_seconds, compact_mb = measure(compact, size)
+        edges = size * size + size
+        print(f"{size:>8} {edges:>10} {full_seconds:>9.3f} {full_mb:>9.1f} "
+              f"{compact_seconds:>10.4f} {compact_mb:>11.3f}")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[100, 300, 1000])
+    benchmark(parser.parse_args().sizes)
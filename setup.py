@@ -24,7 +24,9 @@ setup(
     extras_require={
         # You might put these in tests_require if you are using
         # setup.py, but pip wants them here.
-        "testing": ["pytest", "pytest-mock", "pandas", "tables"],
+        "testing": [
+            "pytest", "pytest-mock", "pandas", "tables", "pyarrow"
+        ],
         "documentation": [
             "sphinx",
             "sphinx_rtd_theme",
@@ -1,10 +1,13 @@
-from gridengineapp.data_passing import FileEntity, PandasFile, ShelfFile
+from gridengineapp.data_passing import (
+    FileEntity, PandasFile, ParquetFile, ShelfFile
+)
 from gridengineapp.delete import qdel
 from gridengineapp.exceptions import NodeMisconfigurationError
 from gridengineapp.graph_choice import execution_ordered
 from gridengineapp.identifier import IntegerIdentifier, StringIdentifier
 from gridengineapp.job import Job
 from gridengineapp.main import entry
+from gridengineapp.shared_arrays import SharedArrays
 from gridengineapp.status import (
     qstat, qstat_short, FlyWeightJob, FlyWeightTask, MiteWeightJob
 )
@@ -20,7 +23,9 @@ __all__ = [
     "ArgumentError",
     "FileEntity",
     "PandasFile",
+    "ParquetFile",
     "ShelfFile",
+    "SharedArrays",
     "Job",
     "check_complete",
     "IntegerIdentifier",
@@ -1,6 +1,7 @@
 import sys
 from argparse import ArgumentParser
 from os import environ
+from pathlib import Path
 from secrets import token_hex
 from textwrap import fill
 
@@ -68,6 +69,7 @@ def execution_parser():
         help=fill("""
         This is a string identifier that is added to the application
         name in order to make it easier to use qstat, qdel, and such.
+        It also names the journal of a local run.
         """)
     )
     try:
@@ -85,6 +87,33 @@ def execution_parser():
         """)
     )
     remove_for_jobs["--task-id"] = True
+    grid.add_argument(
+        "--last-task-id", type=int,
+        help=fill("""
+        Run the tasks from --task-id through this one, in order,
+        within this process.
+        """)
+    )
+    remove_for_jobs["--last-task-id"] = True
+    grid.add_argument(
+        "--job-table", type=Path,
+        help=fill("""
+        A file of the arguments of jobs that were submitted together
+        as one task array. This task runs the job in the row for
+        its --task-id.
+        """)
+    )
+    remove_for_jobs["--job-table"] = True
+    grid.add_argument(
+        "--sibling-arrays", type=int,
+        help=fill("""
+        Submit sibling jobs, which have the same jobs before and
+        after them and the same qsub flags, as one task array, when
+        there are at least this many of them. Zero turns it off.
+        Defaults to sibling-array-minimum in the configuration.
+        """)
+    )
+    remove_for_jobs["--sibling-arrays"] = True
 
     multiprocess = parser.add_argument_group(
         "Multiprocess",
@@ -99,6 +128,77 @@ def execution_parser():
         """),
     )
     remove_for_jobs["--memory-limit"] = True
+    multiprocess.add_argument(
+        "--cpu-limit", type=int,
+        help=fill("""
+        Total cores to use for multiple processes, counted against
+        the threads each job declares in its resources. The default
+        is all cores this process may use.
+        """),
+    )
+    remove_for_jobs["--cpu-limit"] = True
+    multiprocess.add_argument(
+        "--pin-cores", action="store_true",
+        help=fill("""
+        Bind each process to its own set of cores, so that processes
+        don't compete for the same cores and caches.
+        """),
+    )
+    remove_for_jobs["--pin-cores"] = False
+    multiprocess.add_argument(
+        "--measure-memory", action="store_true",
+        help=fill("""
+        Decide whether there is memory to start another job by measuring
+        how much memory running jobs use, instead of trusting how much
+        they declare. If the machine runs low on memory, this pauses
+        the most recently started jobs until memory frees up.
+        """),
+    )
+    remove_for_jobs["--measure-memory"] = False
+    multiprocess.add_argument(
+        "--memory-report", type=Path,
+        help=fill("""
+        With --measure-memory, write a CSV file that compares the
+        peak memory each task used with the memory it declared.
+        """),
+    )
+    remove_for_jobs["--memory-report"] = True
+    multiprocess.add_argument(
+        "--fork-tasks", action="store_true",
+        help=fill("""
+        Run each job in a fork of this process, which already has the
+        application initialized, instead of starting a new Python
+        process for each job. Each job still runs in its own process.
+        """),
+    )
+    remove_for_jobs["--fork-tasks"] = False
+    multiprocess.add_argument(
+        "--keep-going", action="store_true",
+        help=fill("""
+        If a job fails, skip the jobs that depend on it, but keep
+        running all other jobs, and report at the end which
+        succeeded, failed, or were skipped.
+        """),
+    )
+    remove_for_jobs["--keep-going"] = False
+    multiprocess.add_argument(
+        "--resume", action="store_true",
+        help=fill("""
+        Pick up a local run that stopped partway, running only those
+        jobs that its journal doesn't record as finished. Use this
+        with the same --run-id as the run that stopped.
+        """),
+    )
+    remove_for_jobs["--resume"] = False
+    multiprocess.add_argument(
+        "--task-blocks", action="store_true",
+        help=fill("""
+        Run each task array as blocks of consecutive tasks, one
+        process per block, instead of one process per task. Blocks
+        are sized from the memory and cpu limits.
+        """),
+    )
+    remove_for_jobs["--task-blocks"] = False
 
     graph = parser.add_argument_group(
         "Job Graph",
@@ -127,6 +227,20 @@ def execution_parser():
         """),
     )
     remove_for_jobs["--run-dependents"] = False
+    graph.add_argument(
+        "--graph-snapshot", type=Path,
+        help=fill("""
+        A file of the jobs in this run, written by the process that
+        started this one, so that this process can find its job
+        without making the job graph. Use with --snapshot-index.
+        """),
+    )
+    remove_for_jobs["--graph-snapshot"] = True
+    graph.add_argument(
+        "--snapshot-index", type=int,
+        help="Which job in the --graph-snapshot this process runs.",
+    )
+    remove_for_jobs["--snapshot-index"] = True
 
     debug = parser.add_argument_group(
         "Debugging and Logging",
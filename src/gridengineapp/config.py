@@ -3,10 +3,13 @@ from getpass import getuser
 from logging import getLogger
 from pathlib import Path
 from tempfile import gettempdir
+from threading import Lock
 
 from pkg_resources import resource_string, iter_entry_points
 
 LOGGER = getLogger(__name__)
+# Threads that submit jobs read the configuration at once.
+_CONFIGURATION_LOCK = Lock()
 
 
 def installed_config_parsers():
@@ -30,30 +33,54 @@ def configuration(alternate_configparser=None):
     Returns:
         ConfigParser.SectionProxy: This is a mapping type.
     """
-    if (not hasattr(configuration, "_config") or
-            alternate_configparser is not None):
-        bytes_form = resource_string(__package__, "configuration.cfg")
-        parser = ConfigParser()
-        parser.read_string(bytes_form.decode())
-        parsers = installed_config_parsers()
-        if alternate_configparser is not None:
-            parsers.append(alternate_configparser)
-        for ordered_load in parsers:
-            parser.read_dict(ordered_load)
-        section = parser[__package__]
-        configuration._config = section
-    return getattr(configuration, "_config")
+    with _CONFIGURATION_LOCK:
+        if (not hasattr(configuration, "_config") or
+                alternate_configparser is not None):
+            bytes_form = resource_string(__package__, "configuration.cfg")
+            parser = ConfigParser()
+            parser.read_string(bytes_form.decode())
+            parsers = installed_config_parsers()
+            if alternate_configparser is not None:
+                parsers.append(alternate_configparser)
+            for ordered_load in parsers:
+                parser.read_dict(ordered_load)
+            section = parser[__package__]
+            configuration._config = section
+        return getattr(configuration, "_config")
 
 
 def shell_directory():
-    shell_dir = Path(configuration()["qsub-shell-file-directory"].format(
-        user=getuser()
-    ))
-    early_path = Path(*shell_dir.parts[:2])
+    return shared_directory("qsub-shell-file-directory", "shellfiles")
+
+
+def run_directory():
+    """Directory for records of local runs, such as their journals."""
+    return shared_directory("local-run-directory", "runs")
+
+
+def shared_directory(configuration_key, fallback_name):
+    """
+    Makes and returns a directory named in the configuration, where the
+    name may include ``{user}``. If the first part of that path doesn't
+    exist on this machine, as when we aren't on the cluster, it uses a
+    directory of the fallback name and the user in the temporary
+    directory instead, so that users on one host don't share it.
+
+    Args:
+        configuration_key (str): Key in the configuration for the path.
+        fallback_name (str): Name of the directory to use under the
+            temporary directory, before the user's name.
+
+    Returns:
+        Path: A directory that exists.
+    """
+    user = getuser()
+    shared_dir = Path(configuration()[configuration_key].format(user=user))
+    early_path = Path(*shared_dir.parts[:2])
     if early_path.exists():
-        shell_dir.mkdir(parents=True, exist_ok=True)
-        return shell_dir
+        shared_dir.mkdir(parents=True, exist_ok=True)
+        return shared_dir
     temp_dir = Path(gettempdir())
-    shell_dir = temp_dir / "shellfiles"
-    shell_dir.mkdir(parents=True, exist_ok=True)
-    return shell_dir
+    shared_dir = temp_dir / f"{fallback_name}-{user}"
+    shared_dir.mkdir(parents=True, exist_ok=True)
+    return shared_dir
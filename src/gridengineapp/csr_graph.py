@@ -0,0 +1,176 @@
+"""
+A compact directed graph for passes over large job graphs.
+Identifiers are numbered in the order the graph lists them,
+and edges to successors are stored in compressed sparse row (CSR)
+arrays, with a count of each node's predecessors, so that finding
+descendants or topological levels works on whole frontiers
+of nodes at a time instead of one node at a time.
+
+This needs NumPy, which isn't a requirement of this package,
+so ``graph_choice`` uses it only when NumPy can be imported.
+"""
+from logging import getLogger
+
+import networkx as nx
+import numpy as np
+
+LOGGER = getLogger(__name__)
+
+
+def _compressed(rows, columns, node_cnt):
+    """CSR arrays for edges from ``rows`` to ``columns``, keeping the
+    order of edges within each row."""
+    order = np.argsort(rows, kind="stable")
+    indptr = np.zeros(node_cnt + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=node_cnt), out=indptr[1:])
+    return indptr, columns[order]
+
+
+def _gather(indptr, indices, nodes):
+    """All neighbors of all the given nodes, as one array,
+    with repeats if nodes share neighbors."""
+    starts = indptr[nodes]
+    lengths = indptr[nodes + 1] - starts
+    total = int(lengths.sum())
+    if total == 0:
+        return np.empty(0, dtype=indices.dtype)
+    # Offset of each neighbor from the start of its node's row.
+    row_begin = np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return indices[np.repeat(starts, lengths) + np.arange(total) - row_begin]
+
+
+class CSRGraph:
+    """
+    Args:
+        identifiers (List): Node identifiers. A node's index is its
+            position in this list.
+        sources (np.ndarray): Index of the source of each edge.
+        targets (np.ndarray): Index of the target of each edge.
+    """
+    def __init__(self, identifiers, sources, targets):
+        self.identifiers = list(identifiers)
+        self.index = {
+            identifier: node_idx
+            for (node_idx, identifier) in enumerate(self.identifiers)
+        }
+        node_cnt = len(self.identifiers)
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        self._out_ptr, self._out = _compressed(sources, targets, node_cnt)
+        self._in_degree = np.bincount(targets, minlength=node_cnt)
+
+    @classmethod
+    def from_networkx(cls, graph):
+        """Makes a compact copy of the nodes and edges of a graph,
+        without edge data. Successors keep the graph's order."""
+        identifiers = list(graph)
+        index = {
+            identifier: node_idx
+            for (node_idx, identifier) in enumerate(identifiers)
+        }
+        out_degree = np.fromiter(
+            (len(successors) for _u, successors in graph.adjacency()),
+            np.int64, len(identifiers))
+        sources = np.repeat(np.arange(len(identifiers)), out_degree)
+        targets = np.fromiter(
+            (index[v] for _u, successors in graph.adjacency()
+             for v in successors),
+            np.int64, int(out_degree.sum()))
+        return cls(identifiers, sources, targets)
+
+    def __len__(self):
+        return len(self.identifiers)
+
+    def mask(self, identifiers):
+        """A boolean array that is true for those of the given
+        identifiers that are in the graph."""
+        selected = np.zeros(len(self), dtype=bool)
+        selected[[self.index[identifier] for identifier in identifiers
+                  if identifier in self.index]] = True
+        return selected
+
+    def identifiers_of(self, selected):
+        """Identifiers where the boolean array is true, in graph order."""
+        return [self.identifiers[node_idx]
+                for node_idx in np.flatnonzero(selected).tolist()]
+
+    def in_degree(self):
+        return self._in_degree
+
+    def successors(self, nodes):
+        return _gather(self._out_ptr, self._out, np.asarray(nodes))
+
+    def descendants(self, selected, reached=None):
+        """
+        Marks the selected nodes and all nodes reachable from them.
+
+        Args:
+            selected (np.ndarray): Boolean array of starting nodes,
+                or an array of their indices.
+            reached (np.ndarray): A boolean array to mark, in place.
+                Nodes already marked aren't searched again, so marking
+                from many starting nodes, one after another, costs
+                no more than marking from all of them at once.
+
+        Returns:
+            np.ndarray: The boolean array of reached nodes.
+        """
+        if reached is None:
+            reached = np.zeros(len(self), dtype=bool)
+        if selected.dtype == bool:
+            selected = np.flatnonzero(selected)
+        frontier = selected[~reached[selected]]
+        reached[frontier] = True
+        while frontier.size:
+            following = self.successors(frontier)
+            frontier = np.unique(following[~reached[following]])
+            reached[frontier] = True
+        return reached
+
+    def topological_levels(self):
+        """
+        Splits nodes into levels, where a level is every node whose
+        predecessors are in earlier levels. This takes one step
+        for each level of the graph.
+
+        Returns:
+            List[np.ndarray]: Indices of nodes in each level.
+        """
+        waiting = self.in_degree().copy()
+        frontier = np.flatnonzero(waiting == 0)
+        levels = list()
+        while frontier.size:
+            levels.append(frontier)
+            following = self.successors(frontier)
+            waiting -= np.bincount(following, minlength=len(self))
+            frontier = np.unique(following)
+            frontier = frontier[waiting[frontier] == 0]
+        if sum(level.size for level in levels) < len(self):
+            raise nx.NetworkXUnfeasible(
+                "Graph contains a cycle, so it has no topological order.")
+        return levels
+
+    def execution_order(self):
+        """
+        The same order as ``execution_ordered`` gives for a networkx
+        graph, which is depth-first, given that all predecessors
+        must complete before a node.
+
+        Returns:
+            List[int]: Indices of nodes.
+        """
+        waiting = self.in_degree().tolist()
+        out_ptr = self._out_ptr.tolist()
+        out = self._out.tolist()
+        possible = [node for node, count in enumerate(waiting) if count == 0]
+        seen = [False] * len(self)
+        order = list()
+        while possible:
+            node = possible.pop()
+            if not seen[node] and waiting[node] == 0:
+                seen[node] = True
+                order.append(node)
+                for successor in out[out_ptr[node]:out_ptr[node + 1]]:
+                    waiting[successor] -= 1
+                    possible.append(successor)
+        return order
@@ -1,14 +1,159 @@
+import os
+from collections import OrderedDict
+from contextlib import contextmanager
 from logging import getLogger
 from pathlib import Path
+from threading import Lock
 import shelve
 
+from .validation_cache import validation_cache
+
 try:
     import pandas as pd
 except ImportError:
     pass
 
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pass
+
 
 LOGGER = getLogger(__name__)
+# Listings that validation shares, within ``shared_listings``.
+_SHARED_LISTINGS = None
+# From path of an HDF file to its (mtime, size) and columns of its keys.
+_SCHEMA_CACHE = OrderedDict()
+_SCHEMA_LOCK = Lock()
+SCHEMA_CACHE_SIZE = 4096
+
+
+class DirectoryListings:
+    """
+    Answers whether files exist, and how large they are, by listing
+    each directory once with ``os.scandir``, instead of asking the
+    filesystem about each file. On a network filesystem, each question
+    is a round trip, so checking many files in a few directories
+    is much faster this way. Listings don't see changes made after
+    a directory is first listed. Threads may share this.
+    """
+    def __init__(self):
+        self._listings = dict()
+        self._lock = Lock()
+
+    def _listing(self, directory):
+        with self._lock:
+            listing = self._listings.get(directory)
+        if listing is not None:
+            return listing
+        try:
+            with os.scandir(directory) as entries:
+                listing = {entry.name: entry for entry in entries}
+        except (FileNotFoundError, NotADirectoryError):
+            listing = dict()
+        with self._lock:
+            return self._listings.setdefault(directory, listing)
+
+    def exists(self, path):
+        path = Path(path)
+        entry = self._listing(path.parent).get(path.name)
+        if entry is not None and entry.is_symlink():
+            return path.exists()  # The listing doesn't follow links.
+        return entry is not None
+
+    def size(self, path):
+        """Size in bytes, or None if the file doesn't exist."""
+        stat = self.stat(path)
+        return stat.st_size if stat is not None else None
+
+    def stat(self, path):
+        """The ``os.stat_result``, or None if the file doesn't exist."""
+        path = Path(path)
+        entry = self._listing(path.parent).get(path.name)
+        if entry is None:
+            return None
+        try:
+            return entry.stat()
+        except FileNotFoundError:
+            return None
+
+    def names(self, directory):
+        """Names of everything in a directory."""
+        return set(self._listing(Path(directory)))
+
+
+@contextmanager
+def shared_listings():
+    """
+    Within this context, ``validate_entities`` lists each directory
+    only once, for all entities of all jobs, as when checking which
+    jobs of a graph are done. Use it only while files aren't changing.
+    """
+    global _SHARED_LISTINGS
+    previous = _SHARED_LISTINGS
+    _SHARED_LISTINGS = DirectoryListings()
+    try:
+        yield _SHARED_LISTINGS
+    finally:
+        _SHARED_LISTINGS = previous
+
+
+def validate_entities(entities):
+    """
+    Validates entities. Within ``shared_listings``, it answers for
+    files of this package's entity classes from one listing of each
+    directory, and otherwise it asks about each file. Entities of other
+    classes, including subclasses that override ``validate``,
+    are asked to ``validate()`` themselves. For files whose validation
+    reads their contents, results are kept in the validation cache,
+    and a file that hasn't changed since it was validated isn't read.
+
+    Args:
+        entities (Iterable): Inputs or outputs of a job.
+
+    Returns:
+        List: None, for each entity that's valid, or a string error.
+    """
+    listings = _SHARED_LISTINGS
+    entities = list(entities)
+    signatures = _validation_signatures(entities, listings)
+    cache = validation_cache() if signatures else None
+    cached = cache.lookup(list(signatures.values())) if cache else dict()
+    errors = list()
+    validated = dict()
+    for entity_idx, entity in enumerate(entities):
+        signature = signatures.get(entity_idx)
+        if signature in cached:
+            errors.append(cached[signature])
+        elif type(entity).validate in _LISTED_VALIDATORS:
+            errors.append(entity.validate_listed(listings))
+            if signature is not None:
+                validated[signature] = errors[-1]
+        else:
+            errors.append(entity.validate())
+    if cache:
+        cache.store(validated)
+    return errors
+
+
+def _validation_signatures(entities, listings):
+    """From index of each entity whose validation can be cached
+    to its ``(path, kind, size, mtime_ns)``, if its file exists."""
+    signatures = dict()
+    for entity_idx, entity in enumerate(entities):
+        if type(entity).validate not in _LISTED_VALIDATORS:
+            continue
+        kind = entity._validation_kind()
+        if kind is None:
+            continue
+        for path in entity._content_paths():
+            stat = _stat(path, listings)
+            if stat is not None:
+                signatures[entity_idx] = (
+                    str(path), kind, stat.st_size, stat.st_mtime_ns)
+                break
+    return signatures
 
 
 class FileEntity:
@@ -23,8 +168,12 @@ class FileEntity:
 
     @property
     def path(self):
-        """Return a full file path to the file, given the current context."""
-        self._file_path.parent.mkdir(parents=True, exist_ok=True)
+        """Return a full file path to the file, given the current context.
+        If the file's directory doesn't exist, as when the file is about
+        to be written, this makes it. Validation never makes it."""
+        parent = self._file_path.parent
+        if not parent.is_dir():
+            parent.mkdir(parents=True, exist_ok=True)
         return self._file_path
 
     def validate(self):
@@ -33,10 +182,28 @@ class FileEntity:
         Returns:
             None, on success, or a string on error.
         """
-        exists = self.path.exists()
-        LOGGER.debug(f"{self.path} exists {exists}")
+        return self.validate_listed(None)
+
+    def validate_listed(self, listings):
+        """Validate, using directory listings to learn whether files
+        exist, or asking the filesystem if ``listings`` is None.
+
+        Returns:
+            None, on success, or a string on error.
+        """
+        exists = _exists(self._file_path, listings)
+        LOGGER.debug(f"{self._file_path} exists {exists}")
         if not exists:
-            return f"File {self.path} not found"
+            return f"File {self._file_path} not found"
+
+    def _validation_kind(self):
+        """What validation checks, for the validation cache, or None
+        if validating doesn't read the file, so isn't cached."""
+        return None
+
+    def _content_paths(self):
+        """Paths where the file's contents may be, in order."""
+        return [self._file_path]
 
     def mock(self):
         """Touch the file into existence."""
@@ -45,11 +212,80 @@ class FileEntity:
     def remove(self):
         """Delete, unlink, remove the file. No error if it doesn't exist."""
         try:
-            self.path.unlink()
+            self._file_path.unlink()
         except FileNotFoundError:
             pass  # OK if it didn't exist
 
 
+def _exists(path, listings):
+    if listings is None:
+        return path.exists()
+    return listings.exists(path)
+
+
+def _stat(path, listings):
+    """The ``os.stat_result``, or None if the file doesn't exist."""
+    if listings is not None:
+        return listings.stat(path)
+    try:
+        return os.stat(path)
+    except FileNotFoundError:
+        return None
+
+
+def stored_columns(path, keys):
+    """
+    Column names of datasets in an HDF file, read from the metadata
+    that Pandas stores with each dataset, without reading the data.
+    This opens the file once for all keys. Results are kept for each
+    file until its modification time or size changes.
+
+    Args:
+        path (Path): An HDF file that Pandas wrote.
+        keys (List[str]): Keys of datasets, as given to ``to_hdf``.
+
+    Returns:
+        Dict[str,frozenset]: From key to its columns, or to None
+        if the file has no dataset for that key.
+    """
+    path = Path(path)
+    stat = path.stat()
+    version = (stat.st_mtime_ns, stat.st_size)
+    with _SCHEMA_LOCK:
+        cached = _SCHEMA_CACHE.get(path)
+        if cached is not None and cached[0] == version:
+            known = dict(cached[1])
+        else:
+            known = dict()
+    unknown = [key for key in keys if key not in known]
+    if unknown:
+        with pd.HDFStore(str(path), mode="r") as store:
+            for key in unknown:
+                try:
+                    known[key] = frozenset(_dataset_columns(store, key))
+                except KeyError:
+                    known[key] = None
+        with _SCHEMA_LOCK:
+            _SCHEMA_CACHE[path] = (version, known)
+            _SCHEMA_CACHE.move_to_end(path)
+            while len(_SCHEMA_CACHE) > SCHEMA_CACHE_SIZE:
+                _SCHEMA_CACHE.popitem(last=False)
+    return {key: known[key] for key in keys}
+
+
+def _dataset_columns(store, key):
+    """Columns of one dataset. Frames in fixed format keep their
+    columns as a small index node, and frames in table format keep
+    them in the table's attributes. Anything else is read."""
+    storer = store.get_storer(key)
+    if storer.is_table and storer.non_index_axes:
+        return storer.non_index_axes[0][1]
+    elif getattr(storer, "pandas_type", None) == "frame":
+        return storer.read_index("axis0")
+    else:
+        return store.get(key).columns
+
+
 class PandasFile(FileEntity):
     """Responsible for validating a Pandas file.
 
@@ -70,21 +306,32 @@ class PandasFile(FileEntity):
         Returns:
             None, on success, or a string on error.
         """
-        super_valid = super().validate()
+        return self.validate_listed(None)
+
+    def validate_listed(self, listings):
+        super_valid = super().validate_listed(listings)
         if super_valid:
             return super_valid
 
+        if not self._columns:
+            return None
+        stored = stored_columns(self._file_path, list(self._columns))
         errors = list()
         for key, cols in self._columns.items():
-            try:
-                df = pd.read_hdf(self.path, key=key)
-                if cols != set(df.columns):
-                    errors.append(
-                        f"for {key} found {df.columns} expected {cols}.")
-            except KeyError as key:
+            if stored[key] is None:
                 errors.append(f"for {key} found nothing expected {cols}.")
+            elif cols != stored[key]:
+                errors.append(
+                    f"for {key} found {sorted(stored[key])} expected {cols}.")
         return " ".join(errors) if errors else None
 
+    def _validation_kind(self):
+        if not self._columns:
+            return None
+        frames = sorted(
+            (key, sorted(cols)) for (key, cols) in self._columns.items())
+        return f"PandasFile {frames}"
+
     def mock(self):
         path = self.path
         LOGGER.debug(f"Mocking Pandas dataframe {path}.")
@@ -100,6 +347,84 @@ class PandasFile(FileEntity):
             )
 
 
+class ParquetFile(FileEntity):
+    """Responsible for validating a Parquet file, which stores data
+    by column, so that readers can read only the columns they need.
+
+    Validation reads only the footer of the file, where Parquet keeps
+    the schema and the number of rows. Reading maps the file into
+    memory, so columns that are read come from the page cache
+    without a copy.
+
+    Args:
+        file_path (Path|str): Path to the file.
+        required_columns (Iterable[str]): Columns the file must have.
+        rows (int): If given, how many rows the file must have.
+    """
+    def __init__(self, file_path, required_columns=None, rows=None):
+        super().__init__(file_path)
+        self._columns = set(required_columns) if required_columns else set()
+        self._rows = rows
+
+    def validate(self):
+        """
+        Returns:
+            None, on success, or a string on error.
+        """
+        return self.validate_listed(None)
+
+    def validate_listed(self, listings):
+        super_valid = super().validate_listed(listings)
+        if super_valid:
+            return super_valid
+
+        try:
+            footer = pq.read_metadata(str(self._file_path))
+        except (pa.ArrowInvalid, OSError) as read_error:
+            # As when a job was killed while writing it.
+            return f"Parquet file {self._file_path} unreadable: {read_error}"
+        errors = list()
+        missing = self._columns - set(footer.schema.names)
+        if missing:
+            errors.append(f"columns {sorted(missing)} not found.")
+        if self._rows is not None and footer.num_rows != self._rows:
+            errors.append(
+                f"found {footer.num_rows} rows expected {self._rows}.")
+        if errors:
+            return f"Parquet file {self._file_path} " + " ".join(errors)
+
+    def _validation_kind(self):
+        return f"ParquetFile {sorted(self._columns)} {self._rows}"
+
+    def read(self, columns=None, row_groups=None):
+        """
+        Reads some or all of the file, from a memory map.
+
+        Args:
+            columns (List[str]): Columns to read. Defaults to all.
+            row_groups (List[int]): Row groups to read. Defaults to all.
+
+        Returns:
+            pyarrow.Table: Call ``to_pandas()`` on it for a DataFrame.
+        """
+        parquet = pq.ParquetFile(str(self._file_path), memory_map=True)
+        if row_groups is not None:
+            return parquet.read_row_groups(row_groups, columns=columns)
+        return parquet.read(columns=columns)
+
+    def mock(self):
+        path = self.path
+        LOGGER.debug(f"Mocking Parquet file {path}.")
+        row_cnt = self._rows if self._rows is not None else 1
+        if self._columns:
+            columns = sorted(self._columns)
+        else:
+            columns = ["key", "value"]
+        table = pa.table(
+            {column: pa.array([0] * row_cnt) for column in columns})
+        pq.write_table(table, str(path))
+
+
 class ShelfFile(FileEntity):
     """Responsible for validating a Python shelf file.
 
@@ -118,12 +443,13 @@ class ShelfFile(FileEntity):
         Returns:
             None, on success, or a string on error.
         """
-        path = self.path
-        suffixes = [".dat", ".db", ""]
+        return self.validate_listed(None)
+
+    def validate_listed(self, listings):
+        path = self._file_path
         found = False
-        for suffix in suffixes:
-            search_name = path.parent / (path.name + suffix)
-            if search_name.exists():
+        for search_name in self._content_paths():
+            if _exists(search_name, listings):
                 found = True
         if not found:
             nearby = list(path.parent.glob("*"))
@@ -137,6 +463,18 @@ class ShelfFile(FileEntity):
                 return (f"Shelf keys not found {path} expected "
                         f"{self._keys} found {in_file}")
 
+    def _validation_kind(self):
+        if not self._keys:
+            return None
+        return f"ShelfFile {sorted(self._keys)}"
+
+    def _content_paths(self):
+        """The shelf's data is in one of these, depending on
+        which database module made it."""
+        path = self._file_path
+        return [path.parent / (path.name + suffix)
+                for suffix in [".dat", ".db", ""]]
+
     def mock(self):
         path = self.path
         with shelve.open(str(path)) as db:
@@ -145,7 +483,13 @@ class ShelfFile(FileEntity):
                 db[key] = "marker"
 
     def remove(self):
-        path = self.path
+        path = self._file_path
         base = path.parent
         for dbm_file in base.glob(f"{path.name}*"):
             dbm_file.unlink()
+
+
+_LISTED_VALIDATORS = {
+    FileEntity.validate, PandasFile.validate, ParquetFile.validate,
+    ShelfFile.validate,
+}
@@ -8,4 +8,4 @@ LOGGER = getLogger(__name__)
 def qdel(job_list):
     if isinstance(job_list, list):
         job_list = ",".join(str(job_id) for job_id in job_list)
-    run_check("qdel", job_list)
+    run_check("qdel", [job_list])
@@ -1,32 +1,138 @@
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from time import time
+from weakref import WeakKeyDictionary
+
 import networkx as nx
 
+from .config import configuration
+from .data_passing import shared_listings
+from .job_cache import cached_job
+
+try:
+    from .csr_graph import CSRGraph
+except ImportError:
+    CSRGraph = None
+
 LOGGER = logging.getLogger(__name__)
+# From a graph, or a view of one, to its node count and compact copy.
+_COMPACT = WeakKeyDictionary()
+_COMPACT_LOCK = Lock()
+
+
+def compact_graph(graph):
+    """
+    The ``CSRGraph`` of a graph, made once for each graph object,
+    while its number of nodes stays the same. Launching makes
+    several passes over the same job graph, and this is how they
+    share one compact copy. Counting edges would cost about as much
+    as copying them, so a graph whose edges change after a pass,
+    without its nodes changing, must be copied before the next pass.
+
+    Args:
+        graph (nx.DiGraph): A graph or a view of one.
 
+    Returns:
+        CSRGraph: Or None if NumPy isn't available.
+    """
+    if CSRGraph is None:
+        return None
+    size = len(graph)
+    with _COMPACT_LOCK:
+        cached = _COMPACT.get(graph)
+    if cached is not None and cached[0] == size:
+        return cached[1]
+    compact = CSRGraph.from_networkx(graph)
+    with _COMPACT_LOCK:
+        _COMPACT[graph] = (size, compact)
+    return compact
+
+
+def jobs_not_done(job_graph, job_done, max_workers=None,
+                  progress_seconds=10):
+    """
+    The subgraph of jobs that aren't done. A job is not done if
+    ``job_done`` says so or if any job before it is not done,
+    and ``job_done`` isn't asked about jobs after one that's not done.
 
-def jobs_not_done(job_graph, job_done):
-    graph = job_graph.copy()  # Copy so we can add "done" attribute.
-    check_next = list(nx.topological_sort(graph))
-    check_next.reverse()
-    remaining_graph = graph.copy()
-    while len(remaining_graph) > 0:
-        check = check_next.pop()
-        if check not in remaining_graph:
-            continue
-        complete = job_done(check)
-        graph.node[check]["done"] = complete
-        to_remove = [check]
-        if not complete:
-            for subsequent in nx.descendants(graph, check):
-                graph.node[subsequent]["done"] = False
-                to_remove.append(subsequent)
-        # If a node is done, an un-done node above it can make
-        # it incorrect, so don't mark predecessors as known to be done.
-        remaining_graph.remove_nodes_from(to_remove)
-    keep = [not_done for not_done in graph
-            if not graph.node[not_done]["done"]]
-    LOGGER.debug(f"Doing jobs {keep}")
-    return nx.subgraph(job_graph, keep)
+    This checks jobs in waves, where each wave is the jobs whose
+    predecessors were all in earlier waves, and it checks the jobs
+    of a wave at the same time, in threads, because each check
+    usually waits on a filesystem. A job that isn't done marks its
+    successors, so that they aren't checked and are also not done.
+
+    Args:
+        job_graph (nx.DiGraph): Jobs to check.
+        job_done (function): From job ID to whether it's done.
+            This is called from more than one thread at a time.
+        max_workers (int): How many checks to run at once. Defaults
+            to the ``continue-check-threads`` configuration.
+        progress_seconds (float): How often to log progress.
+
+    Returns:
+        nx.DiGraph: A view of the jobs to run.
+    """
+    if max_workers is None:
+        max_workers = int(configuration()["continue-check-threads"])
+    job_cnt = len(job_graph)
+    checked_cnt = 0
+    not_done = set()
+    # Jobs with a predecessor that isn't done.
+    after_not_done = set()
+    last_report = time()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for wave in topological_levels(job_graph):
+            to_check = [job for job in wave if job not in after_not_done]
+            for job, done in zip(to_check, pool.map(job_done, to_check)):
+                if not done:
+                    not_done.add(job)
+            not_done.update(job for job in wave if job in after_not_done)
+            for job in wave:
+                if job in not_done:
+                    after_not_done.update(job_graph.successors(job))
+            checked_cnt += len(to_check)
+            if time() - last_report > progress_seconds:
+                last_report = time()
+                LOGGER.info(f"Checked {checked_cnt} of {job_cnt} jobs. "
+                            f"{len(not_done)} are not done.")
+    LOGGER.info(f"Checked {checked_cnt} of {job_cnt} jobs. "
+                f"{len(not_done)} are not done.")
+    LOGGER.debug(f"Doing jobs {not_done}")
+    return nx.subgraph(job_graph, not_done)
+
+
+def topological_levels(graph):
+    """
+    Splits the nodes of a graph into levels, where the predecessors
+    of every node are in earlier levels.
+
+    Args:
+        graph (nx.DiGraph): A directed acyclic graph.
+
+    Returns:
+        List[List]: Lists of nodes, from the first level.
+    """
+    compact = compact_graph(graph)
+    if compact is not None:
+        return [[compact.identifiers[node_idx] for node_idx in level.tolist()]
+                for level in compact.topological_levels()]
+    waiting = {node: graph.in_degree(node) for node in graph}
+    level = [node for node, count in waiting.items() if count == 0]
+    levels = list()
+    while level:
+        levels.append(level)
+        following = list()
+        for node in level:
+            for successor in graph.successors(node):
+                waiting[successor] -= 1
+                if waiting[successor] == 0:
+                    following.append(successor)
+        level = following
+    if sum(len(level) for level in levels) < len(graph):
+        raise nx.NetworkXUnfeasible(
+            "Graph contains a cycle, so it has no topological order.")
+    return levels
 
 
 def job_subset(app, args):
@@ -34,6 +140,10 @@ def job_subset(app, args):
     job_graph = app.job_graph()
     if hasattr(args, "run_dependents") and not args.run_dependents:
         sub_graph = nx.subgraph(job_graph, identifiers)
+    elif CSRGraph is not None:
+        compact = compact_graph(job_graph)
+        descendants = compact.descendants(compact.mask(identifiers))
+        sub_graph = nx.subgraph(job_graph, compact.identifiers_of(descendants))
     else:
         descendants = set(identifiers)
         for identifier in identifiers:
@@ -43,9 +153,10 @@ def job_subset(app, args):
     if hasattr(args, "continue") and getattr(args, "continue"):
 
         def job_done(job_id):
-            return app.job(job_id).done()
+            return cached_job(app, job_id).done()
 
-        sub_graph = jobs_not_done(sub_graph, job_done)
+        with shared_listings():
+            sub_graph = jobs_not_done(sub_graph, job_done)
     return sub_graph
 
 
@@ -57,6 +168,11 @@ def execution_ordered(graph):
     depth-first, but depth-first, given that all predecessors must
     be complete before a node executes.
     """
+    compact = compact_graph(graph)
+    if compact is not None:
+        for node_idx in compact.execution_order():
+            yield compact.identifiers[node_idx]
+        return
     possible = [n for n in graph if not list(graph.predecessors(n))]
     seen = set()
     while possible:
@@ -67,3 +183,31 @@ def execution_ordered(graph):
             yield node
             for successor in graph.successors(node):
                 possible.append(successor)
+
+
+def critical_path_lengths(graph, duration):
+    """
+    For each node, finds the longest total duration along any path
+    that starts at that node, including the node itself. Edges with
+    ``launch`` set don't count, because the node after them doesn't
+    wait for the node before them to finish. Starting the nodes with
+    the longest remaining paths first shortens the time to finish
+    the whole graph.
+
+    Args:
+        graph (nx.DiGraph): A directed acyclic graph.
+        duration (function): Takes a node and returns its duration.
+
+    Returns:
+        Dict: From node to the length of its critical path.
+    """
+    lengths = dict()
+    for node in reversed(list(nx.topological_sort(graph))):
+        longest_after = max(
+            (lengths[successor] for _u, successor, data
+             in graph.out_edges(node, data=True)
+             if not ("launch" in data and data["launch"])),
+            default=0,
+        )
+        lengths[node] = duration(node) + longest_after
+    return lengths
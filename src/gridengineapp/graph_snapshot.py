@@ -0,0 +1,160 @@
+"""
+A file that holds the jobs of a run, so that each child process
+can find its own job without asking the application for the whole
+job graph. The launcher writes the file once, and each child reads
+only the record for its job, through a memory map.
+
+The file is a header, a table of offsets, and one pickled record
+per job. The file name is a hash of its contents, so a run that
+selects the same jobs with the same arguments reuses the file.
+Writing a snapshot removes those that no launch has written or
+reused for ``graph-snapshot-days``.
+"""
+import os
+import pickle
+import struct
+from hashlib import sha256
+from logging import getLogger
+from mmap import mmap, ACCESS_READ
+from time import time
+from types import SimpleNamespace
+
+import networkx as nx
+
+from .config import configuration, run_directory
+from .job_cache import job_resources
+
+LOGGER = getLogger(__name__)
+MAGIC = b"GEAGRPH1"
+OFFSET = struct.Struct("<Q")
+
+
+def write_graph_snapshot(app, job_graph, job_arguments, directory=None):
+    """
+    Writes a snapshot of a job graph, unless an identical one exists.
+
+    Args:
+        app (Application): The application, for job resources.
+        job_graph (nx.DiGraph): The jobs that will run.
+        job_arguments (function): From job ID to the list of
+            command-line arguments for the child that runs that job.
+        directory (Path): Where to write it. Defaults to the
+            run directory.
+
+    Returns:
+        SimpleNamespace: With ``path`` to the file and ``index``,
+        a dictionary from job ID to its index in the file,
+        or None if the job identifiers can't be pickled.
+    """
+    ordered = list(nx.topological_sort(job_graph))
+    index = {job_id: job_idx for (job_idx, job_id) in enumerate(ordered)}
+    try:
+        records = [
+            pickle.dumps(dict(
+                identifier=job_id,
+                predecessors=[
+                    index[pred] for pred in job_graph.predecessors(job_id)],
+                successors=[
+                    index[succ] for succ in job_graph.successors(job_id)],
+                resources=dict(job_resources(app, job_id)),
+                arguments=[str(arg) for arg in job_arguments(job_id)],
+            ), protocol=pickle.HIGHEST_PROTOCOL)
+            for job_id in ordered
+        ]
+    except (pickle.PicklingError, AttributeError, TypeError) as pickle_err:
+        LOGGER.info(f"Children will build the job graph themselves because "
+                    f"the jobs can't be saved: {pickle_err}")
+        return None
+
+    offsets = [0]
+    for record in records:
+        offsets.append(offsets[-1] + len(record))
+    contents = b"".join(
+        [MAGIC, OFFSET.pack(len(records))] +
+        [OFFSET.pack(offset) for offset in offsets] +
+        records
+    )
+    directory = directory if directory is not None else run_directory()
+    path = directory / f"{sha256(contents).hexdigest()[:32]}.graph"
+    if not path.exists():
+        partial_path = path.with_suffix(f".{os.getpid()}")
+        partial_path.write_bytes(contents)
+        os.replace(partial_path, path)
+        LOGGER.debug(f"Wrote {len(records)} jobs to {path}")
+    else:
+        # Its time says when a launch last used it.
+        os.utime(path)
+        LOGGER.debug(f"Reusing job graph snapshot {path}")
+    remove_old_snapshots(directory)
+    return SimpleNamespace(path=path, index=index)
+
+
+def remove_old_snapshots(directory):
+    """Removes snapshots in the directory that haven't been written
+    or reused for ``graph-snapshot-days``."""
+    days = float(configuration().get("graph-snapshot-days", "0"))
+    if days <= 0:
+        return
+    oldest = time() - days * 24 * 3600
+    for snapshot_path in directory.glob("*.graph"):
+        try:
+            if snapshot_path.stat().st_mtime < oldest:
+                snapshot_path.unlink()
+                LOGGER.debug(f"Removed old job graph snapshot "
+                             f"{snapshot_path}")
+        except FileNotFoundError:
+            pass  # Another launch removed it.
+
+
+def snapshot_arguments(snapshot, job_id):
+    """Command-line arguments that tell a child where its job is."""
+    if snapshot is None:
+        return list()
+    return ["--graph-snapshot", str(snapshot.path),
+            "--snapshot-index", str(snapshot.index[job_id])]
+
+
+class GraphSnapshot:
+    """
+    Reads records of jobs from a snapshot file. Each record has
+    ``identifier``, ``predecessors`` and ``successors``, which are
+    indices of other records, ``resources``, and ``arguments``.
+
+    Args:
+        path (Path): The snapshot file.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as snapshot_stream:
+            self._map = mmap(snapshot_stream.fileno(), 0, access=ACCESS_READ)
+        if self._map[:len(MAGIC)] != MAGIC:
+            self._map.close()
+            raise ValueError(f"{path} isn't a job graph snapshot.")
+        self._count = OFFSET.unpack_from(self._map, len(MAGIC))[0]
+        self._table = len(MAGIC) + OFFSET.size
+        self._data = self._table + (self._count + 1) * OFFSET.size
+
+    def __len__(self):
+        return self._count
+
+    def node(self, job_idx):
+        if not 0 <= job_idx < self._count:
+            raise IndexError(f"No job {job_idx} in {self.path}")
+        begin = OFFSET.unpack_from(
+            self._map, self._table + job_idx * OFFSET.size)[0]
+        end = OFFSET.unpack_from(
+            self._map, self._table + (job_idx + 1) * OFFSET.size)[0]
+        record = pickle.loads(self._map[self._data + begin:self._data + end])
+        return SimpleNamespace(**record)
+
+    def close(self):
+        self._map.close()
+
+
+def snapshot_identifier(path, job_idx):
+    """The identifier of one job in a snapshot."""
+    snapshot = GraphSnapshot(path)
+    try:
+        return snapshot.node(job_idx).identifier
+    finally:
+        snapshot.close()
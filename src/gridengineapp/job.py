@@ -1,5 +1,8 @@
 from copy import deepcopy
 
+from .data_passing import validate_entities
+from .manifest import manifest_current
+
 
 class Job:
     def __init__(self):
@@ -52,14 +55,19 @@ class Job:
         pass
 
     def mock_run(self):
-        for input in self.inputs.values():
-            input.validate()
+        validate_entities(self.inputs.values())
 
         for output in self.outputs.values():
             output.mock()
 
     def done(self):
-        errors = [output.validate() for output in self.outputs.values()]
+        """A job is done if its outputs match the manifest it recorded
+        when it ran, and its inputs haven't changed since. If there is
+        no manifest, it's done if its outputs validate."""
+        current = manifest_current(self)
+        if current is not None:
+            return current
+        errors = validate_entities(self.outputs.values())
         return all(err is None for err in errors)
 
 
@@ -0,0 +1,118 @@
+"""
+Keeps the jobs that an application makes, so that each pass over the
+job graph, such as expanding task arrays, checking which jobs are
+done, describing tasks, and launching, asks the application to make
+a job only once. Applications whose ``job()`` reads files or
+databases spend much of their launch time there.
+"""
+from collections import OrderedDict
+from logging import getLogger
+from threading import Lock
+from types import MappingProxyType
+from weakref import WeakKeyDictionary
+
+from .config import configuration
+
+LOGGER = getLogger(__name__)
+_CACHES = WeakKeyDictionary()  # From application to its JobCache.
+_CACHES_LOCK = Lock()
+
+
+class JobCache:
+    """
+    The most recently used jobs of one application, by identifier,
+    each with a read-only copy of its resources. When there are more
+    than ``maxsize`` jobs, the least recently used one is dropped.
+    Threads may share it.
+
+    Args:
+        maxsize (int): How many jobs to keep.
+    """
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        # From identifier to a list of the job and its resources.
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def job(self, app, identifier):
+        return self._entry(app, identifier)[0]
+
+    def resources(self, app, identifier):
+        entry = self._entry(app, identifier)
+        if entry[1] is None:
+            entry[1] = MappingProxyType(dict(entry[0].resources))
+        return entry[1]
+
+    def _entry(self, app, identifier):
+        with self._lock:
+            entry = self._entries.get(identifier)
+            if entry is not None:
+                self._entries.move_to_end(identifier)
+                return entry
+        # Make the job outside the lock, so threads that check jobs
+        # don't wait on each other. If two threads make the same job,
+        # both get the one that was stored first.
+        made = [app.job(identifier), None]
+        with self._lock:
+            entry = self._entries.setdefault(identifier, made)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return entry
+
+
+def _job_cache(app):
+    """The cache for this application, or None if the application
+    can't be a key, as for a SimpleNamespace, which isn't hashable."""
+    try:
+        with _CACHES_LOCK:
+            cache = _CACHES.get(app)
+            if cache is None:
+                cache = JobCache(int(configuration()["job-cache-size"]))
+                _CACHES[app] = cache
+        return cache
+    except TypeError:
+        return None
+
+
+def cached_job(app, identifier):
+    """
+    The job for this identifier, made once by ``app.job(identifier)``.
+
+    Args:
+        app (Application): The application.
+        identifier: A job identifier, as in the job graph.
+
+    Returns:
+        Job: The same instance each time, while it stays in the cache.
+    """
+    cache = _job_cache(app)
+    if cache is None:
+        return app.job(identifier)
+    return cache.job(app, identifier)
+
+
+def job_resources(app, identifier):
+    """
+    Resources of the job for this identifier, read once from
+    ``Job.resources``.
+
+    Returns:
+        Mapping: A read-only view of the resources dictionary.
+    """
+    cache = _job_cache(app)
+    if cache is None:
+        return MappingProxyType(dict(app.job(identifier).resources))
+    return cache.resources(app, identifier)
+
+
+def clear_job_cache(app):
+    """Forget the jobs of this application, as when it's initialized
+    again with arguments that could change what its jobs are."""
+    try:
+        with _CACHES_LOCK:
+            _CACHES.pop(app, None)
+    except TypeError:
+        pass
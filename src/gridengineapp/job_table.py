@@ -0,0 +1,58 @@
+"""
+A table of the command-line arguments of jobs that are submitted
+together as one task array. Each task of the array starts with
+``--job-table`` and finds the arguments of its own job in the row
+for its ``SGE_TASK_ID``, so jobs of an application that never
+declares ``task_cnt`` can still share one grid engine job.
+"""
+import json
+import os
+from hashlib import sha256
+from logging import getLogger
+
+from .config import run_directory
+
+LOGGER = getLogger(__name__)
+
+
+def write_job_table(rows, directory=None):
+    """
+    Writes a table, unless an identical one exists.
+
+    Args:
+        rows (List[List[str]]): Command-line arguments for each task,
+            where the first row is for task 1.
+        directory (Path): Where to write it. Defaults to the
+            run directory, which tasks on other hosts can read.
+
+    Returns:
+        Path: The table file, named by a hash of its contents.
+    """
+    contents = json.dumps(
+        [[str(arg) for arg in row] for row in rows]).encode()
+    directory = directory if directory is not None else run_directory()
+    path = directory / f"{sha256(contents).hexdigest()[:32]}.jobs"
+    if not path.exists():
+        partial_path = path.with_suffix(f".{os.getpid()}")
+        partial_path.write_bytes(contents)
+        os.replace(partial_path, path)
+        LOGGER.debug(f"Wrote {len(rows)} jobs to {path}")
+    return path
+
+
+def job_table_arguments(path, task_id):
+    """
+    Arguments of the job that one task of an array runs. The job
+    isn't itself a task array, so it runs as task 0.
+
+    Args:
+        path (Path): From ``write_job_table``.
+        task_id (int): The 1-based ``SGE_TASK_ID``.
+
+    Returns:
+        List[str]: Arguments to parse in place of the command line.
+    """
+    rows = json.loads(path.read_text())
+    if not 1 <= task_id <= len(rows):
+        raise IndexError(f"No task {task_id} in job table {path}")
+    return rows[task_id - 1] + ["--task-id", "0"]
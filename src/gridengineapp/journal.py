@@ -0,0 +1,156 @@
+"""
+Durable records of what a run has done, so that a run can pick up
+where it left off after its parent process dies.
+"""
+import json
+import os
+from logging import getLogger
+from time import time
+
+LOGGER = getLogger(__name__)
+
+
+class Journal:
+    """
+    An append-only file of records, one JSON object per line.
+    Each append is flushed and fsync'd before it returns, so a record
+    that was written survives the writer being killed. Reading skips
+    a partial last line, which is what a crash during a write leaves.
+
+    Args:
+        path (Path): The file.
+        resume (bool): Add to an existing file instead of starting over.
+    """
+    def __init__(self, path, resume=False):
+        self.path = path
+        self._stream = None
+        self._resume = resume
+
+    def append(self, **record):
+        if self._stream is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._stream = self.path.open("a" if self._resume else "w")
+            if self._resume and not _ends_line(self.path):
+                # End a partial record from a crash, so that it
+                # doesn't swallow the first new one.
+                self._stream.write("\n")
+        record["time"] = time()
+        self._stream.write(json.dumps(record) + "\n")
+        self._stream.flush()
+        os.fsync(self._stream.fileno())
+
+    def records(self):
+        """Reads every complete record in the file.
+
+        Returns:
+            Iterable[Dict]: Records in the order written.
+        """
+        if not self.path.exists():
+            return
+        with self.path.open() as stream:
+            for line_idx, line in enumerate(stream):
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    LOGGER.warning(
+                        f"Skipping partial record {line_idx} in {self.path}")
+
+    def close(self):
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
+
+def _ends_line(path):
+    """Whether a file is empty or ends with a newline."""
+    with path.open("rb") as stream:
+        if stream.seek(0, os.SEEK_END) == 0:
+            return True
+        stream.seek(-1, os.SEEK_END)
+        return stream.read(1) == b"\n"
+
+
+class TaskJournal(Journal):
+    """
+    Records when each task of a local run starts and finishes.
+    Tasks are written by a key that doesn't change between runs,
+    such as the arguments that select the task, because task IDs
+    themselves may not survive a trip through a file.
+
+    Args:
+        path (Path): The file.
+        task_key (function): From task ID to a string.
+        resume (bool): Add to an existing file instead of starting over.
+    """
+    def __init__(self, path, task_key, resume=False):
+        super().__init__(path, resume)
+        self.task_key = task_key
+
+    def started(self, tasks):
+        """Records that one process started the given tasks."""
+        self.append(
+            event="start", tasks=[self.task_key(task) for task in tasks])
+
+    def finished(self, tasks, returncode):
+        """Records that the process for the given tasks finished."""
+        self.append(
+            event="finish", tasks=[self.task_key(task) for task in tasks],
+            returncode=returncode,
+        )
+
+    def completed_keys(self):
+        """Keys of tasks whose last record says they finished
+        successfully. A task that started again after finishing,
+        and never finished that second time, isn't complete.
+
+        Returns:
+            Set[str]: Task keys.
+        """
+        completed = set()
+        for record in self.records():
+            if record["event"] == "finish" and record["returncode"] == 0:
+                completed.update(record["tasks"])
+            else:
+                completed.difference_update(record["tasks"])
+        return completed
+
+
+class SubmissionLedger(Journal):
+    """
+    Records the grid ID of each job as a launch submits it,
+    so that launching the same run again can find the jobs
+    that are still in the queue instead of submitting them twice.
+    It always adds to an existing ledger.
+
+    Args:
+        path (Path): The file.
+        job_key (function): From job ID to a string.
+    """
+    def __init__(self, path, job_key):
+        super().__init__(path, resume=True)
+        self.job_key = job_key
+
+    def submitted(self, grid_ids):
+        """
+        Records submitted jobs.
+
+        Args:
+            grid_ids (Dict): From job ID to its grid ID.
+        """
+        self.append(
+            event="submit",
+            jobs={self.job_key(job_id): str(grid_id)
+                  for (job_id, grid_id) in grid_ids.items()},
+        )
+
+    def grid_ids(self):
+        """
+        The last grid ID recorded for each job.
+
+        Returns:
+            Dict[str,str]: From job key to grid ID.
+        """
+        recorded = dict()
+        for record in self.records():
+            recorded.update(record["jobs"])
+        return recorded
@@ -1,32 +1,45 @@
+import csv
 import faulthandler
+import json
 import logging
 import sys
 import traceback
 from bdb import BdbQuit
 from enum import Enum
+from functools import partial
 from inspect import getmembers, ismethod
 from types import SimpleNamespace
 
-import networkx as nx
-
 from .argument_handling import (
     setup_args_for_job, execution_parser
 )
-from .config import configuration
+from .config import configuration, run_directory
 from .determine_executable import subprocess_executable
-from .graph_choice import job_subset, execution_ordered
-from .run_grid_app import launch_jobs
+from .graph_choice import (
+    job_subset, execution_ordered, critical_path_lengths
+)
+from .graph_snapshot import (
+    write_graph_snapshot, snapshot_arguments, snapshot_identifier
+)
+from .job_cache import cached_job, job_resources, clear_job_cache
+from .job_table import job_table_arguments
+from .journal import TaskJournal
+from .run_grid_app import launch_jobs, application_name
 from .exceptions import NodeMisconfigurationError
-from .multiprocess import graph_do
+from .manifest import input_fingerprint, record_manifest
+from .multiprocess import graph_do, ChildProcessProblem, usable_cores
 from .restart import restart_count
+from .shared_arrays import shared_segments
+from .task_graph import TaskGraph, ReadyArrayTasks
 
 LOGGER = logging.getLogger(__name__)
 
 
-def iterate_tasks(job, command_line_task_id):
+def iterate_tasks(job, command_line_task_id, last_task_id=None):
     """
     Walk through tasks to run from a job. If the task_id is nonzero,
-    then limit it to that task_id.
+    then limit it to that task_id, or, if there is a last task ID,
+    to the tasks from the task_id through the last task ID.
 
     Args:
         job (Job): The job object.
@@ -34,13 +47,17 @@ def iterate_tasks(job, command_line_task_id):
             line. This is how a job learns it should do a particular
             task. This value is set by ``SGE_TASK_ID`` environment
             variable, if that's set.
+        last_task_id (int): The last of a block of tasks to run,
+            starting at the command-line task ID.
 
     Returns:
         A job instance.
     """
     if "task_cnt" in job.resources and job.resources["task_cnt"] > 0:
         if command_line_task_id is not None and command_line_task_id > 0:
-            yield job.clone_task(command_line_task_id)
+            last_task_id = last_task_id or command_line_task_id
+            for task_id in range(command_line_task_id, 1 + last_task_id):
+                yield job.clone_task(task_id)
         else:
             for task_id in range(1, 1 + job.resources["task_cnt"]):
                 yield job.clone_task(task_id)
@@ -51,14 +68,17 @@ def iterate_tasks(job, command_line_task_id):
 def run_jobs(app, args):
     faulthandler.enable()
     try:
-        job_graph = job_subset(app, args)
-        for identifier in execution_ordered(job_graph):
+        if args.graph_snapshot is not None:
+            identifiers = [snapshot_identifier(
+                args.graph_snapshot, args.snapshot_index)]
+        else:
+            identifiers = execution_ordered(job_subset(app, args))
+        for identifier in identifiers:
             LOGGER.info(f"Run {identifier}.")
-            for task in iterate_tasks(app.job(identifier), args.task_id):
-                if not args.mock_job:
-                    task.run()
-                else:
-                    task.mock_run()
+            tasks = iterate_tasks(
+                cached_job(app, identifier), args.task_id, args.last_task_id)
+            for task in tasks:
+                run_and_record(task, args.mock_job)
 
     except BdbQuit:
         pass
@@ -77,12 +97,25 @@ def run_jobs(app, args):
             raise
 
 
+def run_and_record(task, mock):
+    """Runs a task, or mocks it, and records the manifest of its
+    outputs, so that ``--continue`` can tell it's done."""
+    inputs = input_fingerprint(task)
+    if not mock:
+        task.run()
+    else:
+        task.mock_run()
+    record_manifest(task, inputs)
+
+
 def job_task_ids(job):
-    """Yields task IDs. If this isn't an array job, the only ID is 0."""
-    if "task_cnt" in job.resources and int(job.resources["task_cnt"]) > 1:
-        yield from range(1, 1 + int(job.resources["task_cnt"]))
+    """Task IDs of a job, as a range. If this isn't an array job,
+    the only ID is 0."""
+    resources = job.resources
+    if "task_cnt" in resources and int(resources["task_cnt"]) > 1:
+        return range(1, 1 + int(resources["task_cnt"]))
     else:
-        yield from [0]
+        return range(0, 1)
 
 
 def expand_task_arrays(job_graph, app):
@@ -90,25 +123,14 @@ def expand_task_arrays(job_graph, app):
     Every job has at least one task. Jobs that are task
     arrays can have more tasks. If the node type for
     a job graph is Type, then the node type for a
-    task graph is the tuple (Type, task_id)."""
-    # Pull out the task counts.
-    task_graph = nx.DiGraph()
-    for job_id in nx.topological_sort(job_graph):
-        job = app.job(job_id)
-        task_predecessors = list()
-        for job_pred in job_graph.predecessors(job_id):
-            for pred_idx in job_task_ids(app.job(job_pred)):
-                task_predecessors.append((job_pred, pred_idx))
-        # Add nodes before edges in case there are no edges.
-        task_graph.add_nodes_from(
-            (job_id, task_job) for task_job in job_task_ids(job)
-        )
-        task_graph.add_edges_from(
-            (task_pred, (job_id, task_job))
-            for task_pred in task_predecessors
-            for task_job in job_task_ids(job)
-        )
-    return task_graph
+    task graph is the tuple (Type, task_id). Every task of a job
+    depends on every task of the jobs before it, so the task graph
+    keeps those dependencies as edges between jobs."""
+    return TaskGraph(
+        job_graph,
+        {job_id: job_task_ids(cached_job(app, job_id))
+         for job_id in job_graph},
+    )
 
 
 def find_runnable(remaining):
@@ -124,44 +146,327 @@ def find_runnable(remaining):
     return runnable
 
 
+def run_task(app, job_id, task_id, args, last_task_id=None):
+    """
+    Runs one task, or a block of tasks, of a job within this process.
+    A forked child
+    calls this, so that it uses the parent's initialized application
+    instead of starting Python and making the application again.
+
+    Args:
+        app (Application): An initialized application.
+        job_id: Identifier of the job.
+        task_id (int): The task, or 0 for all tasks of the job.
+        args (Namespace): Parsed arguments of the parent.
+        last_task_id (int): If given, run tasks from ``task_id``
+            through this one.
+
+    Returns:
+        int: An exit code, as from ``grid_child_guard``.
+    """
+    def work():
+        LOGGER.info(f"Run {job_id} task {task_id}.")
+        job = cached_job(app, job_id)
+        for task in iterate_tasks(job, task_id, last_task_id):
+            run_and_record(task, args.mock_job)
+
+    return grid_child_guard(work, args)
+
+
 class RunNext:
-    def __init__(self, app, task_graph, arg_list, args_to_remove):
+    """
+    Tells ``graph_do`` which tasks can run. It keeps track of
+    which tasks are ready as they complete, so that each completion
+    costs work only for the tasks that depend on it.
+
+    Args:
+        app (Application): The application.
+        task_graph (TaskGraph): Graph of (job_id, task_id) tasks.
+        arg_list (List[str]): Command-line arguments to the parent.
+        args_to_remove (Dict[str,bool]): Flags not to pass to children.
+        fork_args (Namespace): Parsed arguments. If these are given,
+            tasks run in forks of this process, with ``run_task``,
+            instead of in new Python processes.
+        snapshot (SimpleNamespace): From ``write_graph_snapshot``.
+            If given, child processes read their job from it.
+        segments (SharedSegments): If given, this tells it when
+            tasks finish, so it can release the arrays they read.
+        block_limits (SimpleNamespace): The ``memory`` and ``threads``
+            of the whole run. If these are given, each process runs
+            a block of consecutive tasks of a task array, and blocks
+            are sized so that there are about as many blocks as
+            could run at once. The key for a block is its first task.
+    """
+    def __init__(self, app, task_graph, arg_list, args_to_remove,
+                 fork_args=None, block_limits=None, snapshot=None,
+                 segments=None):
         self.app = app
         self.task_graph = task_graph
         self.arg_list = arg_list
         self.args_to_remove = args_to_remove
+        self.fork_args = fork_args
+        self.block_limits = block_limits
+        self.snapshot = snapshot
+        self.segments = segments
+        self._ready = ReadyArrayTasks(task_graph)
+        self._priority = self._critical_paths()
+        self._executable = None
+        self._blocks = dict()  # From first task of a block to its tasks.
+        self._block_of = dict()  # From each task in a block to the first.
 
     def __call__(self, completed_jobs):
-        """This is a functor, not a class."""
-        keep = [job for job in self.task_graph.nodes
-                if job not in completed_jobs]
-        remaining = nx.subgraph(self.task_graph, keep)
-        runnable = find_runnable(remaining)
-        return self.construct_descriptions(runnable)
+        """This is a functor, not a class. Returns descriptions of
+        all tasks that can run, given those that are complete."""
+        for completed in completed_jobs:
+            for task in self.tasks_of(completed):
+                self._ready.complete(task)
+        return self.construct_descriptions(self._ready.ready)
+
+    def _critical_paths(self):
+        """Remaining run time along the longest path from each job,
+        so that tasks at the start of long chains start first.
+        All tasks of a job have the same path after them."""
+        def job_minutes(job_id):
+            return job_resources(self.app, job_id)["run_time_minutes"]
+
+        return critical_path_lengths(self.task_graph.job_graph, job_minutes)
+
+    def complete(self, task):
+        """Mark one task, or a block of tasks, complete and return
+        descriptions of only those tasks it unblocked."""
+        newly_ready = list()
+        for block_task in self.tasks_of(task):
+            newly_ready.extend(self._ready.complete(block_task))
+            if self.segments is not None:
+                self.segments.finished(block_task)
+        return self.construct_descriptions(newly_ready)
+
+    def tasks_of(self, task):
+        """The tasks that the process for this task does."""
+        return self._blocks.get(task, [task])
 
     def construct_descriptions(self, runnable):
         job_descriptions = dict()
-        for job_id, task_id in runnable:
-            python_executable, argv0 = subprocess_executable(self.app)
+        for block in self._task_blocks(runnable):
+            job_id, task_id = block[0]
+            last_task_id = block[-1][1] if len(block) > 1 else None
             job_select = self.app.job_id_to_arguments(job_id)
             args = setup_args_for_job(
                 self.args_to_remove, job_select, self.arg_list)
             if task_id > 0:
                 args.extend(["--task-id", str(task_id)])
-            job = self.app.job(job_id)
-            job_descriptions[(job_id, task_id)] = SimpleNamespace(
-                memory=job.resources["memory_gigabytes"],
-                args=[str(python_executable)] + argv0 + args,
+            if last_task_id is not None:
+                args.extend(["--last-task-id", str(last_task_id)])
+            args.extend(snapshot_arguments(self.snapshot, job_id))
+            resources = job_resources(self.app, job_id)
+            description = SimpleNamespace(
+                memory=resources["memory_gigabytes"],
+                threads=resources["threads"],
+                priority=self._priority[job_id],
             )
+            if last_task_id is not None:
+                description.tasks = block
+                self._blocks[block[0]] = block
+                self._block_of.update((task, block[0]) for task in block)
+            if self.fork_args is not None:
+                description.args = args
+                description.function = partial(
+                    run_task, self.app, job_id, task_id, self.fork_args,
+                    last_task_id,
+                )
+            else:
+                description.args = self._command() + args
+            job_descriptions[(job_id, task_id)] = description
         return job_descriptions
 
+    def _task_blocks(self, runnable):
+        """Groups tasks into lists of consecutive tasks of one job.
+        Each list is at most as long as the block size for that job.
+        Tasks that are already in a block stay in that block."""
+        if self.block_limits is None:
+            yield from ([task] for task in runnable)
+            return
+        by_job = dict()
+        for job_id, task_id in runnable:
+            first = self._block_of.get((job_id, task_id))
+            if first == (job_id, task_id):
+                yield self._blocks[first]
+            elif first is None:
+                by_job.setdefault(job_id, list()).append(task_id)
+        for job_id, task_ids in by_job.items():
+            size = task_block_size(
+                job_resources(self.app, job_id), self.block_limits)
+            block = list()
+            for task_id in sorted(task_ids):
+                if block and (len(block) == size or
+                              task_id != block[-1][1] + 1):
+                    yield block
+                    block = list()
+                block.append((job_id, task_id))
+            yield block
+
+    def _command(self):
+        """The Python executable and script, found once."""
+        if self._executable is None:
+            python_executable, argv0 = subprocess_executable(self.app)
+            self._executable = [str(python_executable)] + argv0
+        return self._executable
+
+
+def task_block_size(resources, block_limits):
+    """
+    How many tasks of a task array to run in each process. Each
+    process claims the memory and threads of one task, because it
+    runs its tasks one after another, so the blocks are sized to
+    spread the array across as many processes as fit at once.
+
+    Args:
+        resources (Dict): Resources of the job.
+        block_limits (SimpleNamespace): Total ``memory`` and ``threads``.
+
+    Returns:
+        int: The number of tasks in a block, at least one.
+    """
+    task_cnt = int(resources.get("task_cnt", 1))
+    # A task claims at least the least memory that qsub is asked for.
+    concurrent = int(min(
+        block_limits.memory // max(resources["memory_gigabytes"], 0.125),
+        block_limits.threads // max(resources.get("threads", 1), 1),
+    ))
+    return max(1, -(-task_cnt // max(concurrent, 1)))
+
+
+def task_journal(app, command_args):
+    """
+    The journal of a local run, named for the app and its run ID.
+    Tasks are recorded by their command-line arguments.
+
+    Returns:
+        TaskJournal: Which appends to an existing journal if
+        the ``--resume`` flag is set.
+    """
+    journal_path = (run_directory() /
+                    f"{application_name(app)}{command_args.run_id}.journal")
+
+    def task_key(task):
+        job_id, task_id = task
+        arguments = [str(arg) for arg in app.job_id_to_arguments(job_id)]
+        return json.dumps(arguments + ["--task-id", str(task_id)])
+
+    return TaskJournal(journal_path, task_key, resume=command_args.resume)
+
+
+def without_journaled(task_graph, journal):
+    """Removes tasks the journal says completed.
+    Tasks that started and didn't finish will run again."""
+    completed_keys = journal.completed_keys()
+    completed = [task for task in task_graph
+                 if journal.task_key(task) in completed_keys]
+    LOGGER.info(f"Resuming from {journal.path} with {len(completed)} "
+                f"of {len(task_graph)} tasks complete.")
+    remaining = task_graph.copy()
+    remaining.remove_nodes_from(completed)
+    return remaining
+
 
 def multiprocess_jobs(app, command_args, arg_list, args_to_remove):
+    journal = task_journal(app, command_args)
     job_graph = job_subset(app, command_args)
     task_graph = expand_task_arrays(job_graph, app)
+    if command_args.resume:
+        task_graph = without_journaled(task_graph, journal)
+    LOGGER.info(f"Journal of this run is {journal.path}. Resume with "
+                f"--resume --run-id {command_args.run_id}")
     LOGGER.debug(f"{len(task_graph)} tasks to run")
-    run_next = RunNext(app, task_graph, arg_list, args_to_remove)
-    graph_do(run_next, command_args.memory_limit)
+    fork_args = command_args if command_args.fork_tasks else None
+    if command_args.task_blocks:
+        block_limits = SimpleNamespace(
+            memory=command_args.memory_limit,
+            threads=command_args.cpu_limit or usable_cores(),
+        )
+    else:
+        block_limits = None
+    if fork_args is None:
+        snapshot = write_graph_snapshot(
+            app, job_graph,
+            lambda job_id: setup_args_for_job(
+                args_to_remove, app.job_id_to_arguments(job_id), arg_list),
+        )
+    else:
+        snapshot = None  # Forks already have the job graph.
+    run_name = f"{application_name(app)}{command_args.run_id}"
+    try:
+        with shared_segments(app, task_graph, run_name) as segments:
+            run_next = RunNext(app, task_graph, arg_list, args_to_remove,
+                               fork_args, block_limits, snapshot, segments)
+            result = graph_do(
+                run_next, command_args.memory_limit,
+                cpu_limit=command_args.cpu_limit,
+                pin_cores=command_args.pin_cores,
+                measure_memory=command_args.measure_memory,
+                keep_going=command_args.keep_going,
+                journal=journal,
+            )
+            segments.keep = bool(result.failed)
+    finally:
+        journal.close()
+    if command_args.memory_report:
+        write_memory_report(
+            app, result.peak_memory, command_args.memory_report)
+    if command_args.keep_going:
+        report_outcomes(
+            task_graph,
+            {task for done in result.completed
+             for task in run_next.tasks_of(done)},
+            {task for failed in result.failed
+             for task in run_next.tasks_of(failed)},
+        )
+
+
+def report_outcomes(task_graph, succeeded, failed):
+    """
+    Logs which tasks succeeded, failed, or were skipped because
+    a task they depend on failed.
+
+    Raises:
+        ChildProcessProblem: If any task failed.
+    """
+    skipped = [task for task in task_graph
+               if task not in succeeded and task not in failed]
+    LOGGER.info(f"{len(succeeded)} tasks succeeded, {len(failed)} failed, "
+                f"and {len(skipped)} were skipped.")
+    for outcome, tasks in [("Failed", failed), ("Skipped", skipped)]:
+        if not tasks:
+            continue
+        if len(tasks) < 20:
+            LOGGER.info(f"{outcome} {', '.join(str(t) for t in tasks)}")
+        else:
+            LOGGER.info(f"{outcome} {len(tasks)} tasks.")
+    if failed:
+        raise ChildProcessProblem(
+            f"{len(failed)} tasks failed and {len(skipped)} were skipped."
+        )
+
+
+def write_memory_report(app, peak_memory, report_path):
+    """Writes a CSV of the declared and peak memory of each task,
+    so that declarations can be made to match use.
+
+    Args:
+        app (Application): The application.
+        peak_memory (Dict): From task, which is (job_id, task_id),
+            to the peak gigabytes it used.
+        report_path (Path): Where to write the CSV.
+    """
+    with report_path.open("w", newline="") as report_stream:
+        writer = csv.writer(report_stream)
+        writer.writerow(
+            ["job_id", "task_id", "memory_gigabytes", "peak_gigabytes"])
+        for (job_id, task_id), peak in peak_memory.items():
+            declared = job_resources(app, job_id)["memory_gigabytes"]
+            writer.writerow([job_id, task_id, declared, f"{peak:.3f}"])
+    LOGGER.info(f"Wrote peak memory of {len(peak_memory)} tasks "
+                f"to {report_path}")
 
 
 class GridEngineReturnCodes(Enum):
@@ -230,11 +535,15 @@ def entry(app, arg_list=None):
     parser, args_to_remove = execution_parser()
     app.add_arguments(parser)
     args = parser.parse_args(arg_list)
+    if args.job_table is not None:
+        args = parser.parse_args(
+            job_table_arguments(args.job_table, args.task_id))
     offset = 10 * (args.quiet_app - args.verbose_app)
     logging.basicConfig(level=logging.INFO + offset)
 
     def work():
         app.initialize(args)
+        clear_job_cache(app)
         if args.grid_engine:
             launch_jobs(app, args, arg_list, args_to_remove)
         elif args.memory_limit:
@@ -0,0 +1,221 @@
+"""
+Records of the outputs each job wrote, so that ``--continue`` can
+decide a job is done by comparing those records with one ``stat``
+of each file, instead of opening every output to validate it.
+A record also keeps a fingerprint of the job's inputs, as they
+were when the job started, so that a job whose inputs changed
+afterwards runs again, the way ``make`` rebuilds a target.
+
+Each job has its own record file, named by a hash of its output
+paths, in the directory named by ``manifest-directory`` in the
+configuration. Each output is recorded at the file that holds its
+contents, which, for a shelf, is beside its path. Jobs without file
+outputs, or with an output whose contents aren't in a file, have no
+record, and their completion is checked by validating outputs,
+as before. Within ``shared_listings``, files are looked up in the
+listing of their directory, the way validation looks them up.
+"""
+import json
+import os
+from hashlib import blake2b, sha256
+from logging import getLogger
+from pathlib import Path
+from threading import Lock
+
+from . import data_passing
+from .config import configuration, shared_directory
+
+LOGGER = getLogger(__name__)
+HASH_EDGE_BYTES = 1024 * 1024
+# From the configured manifest directory to where it is in this process.
+_DIRECTORIES = dict()
+_DIRECTORIES_LOCK = Lock()
+
+
+def _entity_paths(entities):
+    """Paths of entities that are files, in a stable order."""
+    paths = [getattr(entity, "_file_path", None) for entity in entities]
+    return sorted(str(path) for path in paths if path is not None)
+
+
+def _stat(path):
+    """The ``os.stat_result``, or None if the file doesn't exist,
+    from the shared listings, if there are any."""
+    return data_passing._stat(path, data_passing._SHARED_LISTINGS)
+
+
+def _content_path(entity):
+    """Where an entity's contents are. For an entity whose contents
+    may be in one of several files, as a shelf, it's the first of
+    those that exists. None if its contents aren't in a file,
+    as for arrays in shared memory."""
+    if hasattr(entity, "_content_paths"):
+        candidates = entity._content_paths()
+    else:
+        candidates = [entity._file_path]
+    if not candidates:
+        return None
+    return str(next(
+        (path for path in candidates[:-1] if _stat(path) is not None),
+        candidates[-1],
+    ))
+
+
+def _content_paths(entities):
+    """Where the contents of entities that are files are, in a stable
+    order, with None for those whose contents aren't in a file."""
+    return sorted(
+        (_content_path(entity) for entity in entities
+         if getattr(entity, "_file_path", None) is not None),
+        key=lambda path: (path is None, path),
+    )
+
+
+def _manifest_directory():
+    """The manifest directory, found once in this process."""
+    configured = configuration()["manifest-directory"]
+    with _DIRECTORIES_LOCK:
+        if configured not in _DIRECTORIES:
+            _DIRECTORIES[configured] = shared_directory(
+                "manifest-directory", "manifests")
+        return _DIRECTORIES[configured]
+
+
+def manifest_path(job):
+    """
+    Where the record of this job's outputs goes.
+
+    Returns:
+        Path: The record file, or None if the job has no file outputs.
+    """
+    outputs = _entity_paths(job.outputs.values())
+    if not outputs:
+        return None
+    key = sha256("\n".join(outputs).encode()).hexdigest()[:32]
+    return _manifest_directory() / f"{key}.json"
+
+
+def content_hash(path):
+    """A fast hash of a file, from its size and its first and last
+    megabyte, which notices most rewrites without reading it all."""
+    digest = blake2b(digest_size=16)
+    with open(path, "rb") as stream:
+        size = os.fstat(stream.fileno()).st_size
+        digest.update(str(size).encode())
+        digest.update(stream.read(HASH_EDGE_BYTES))
+        if size > 2 * HASH_EDGE_BYTES:
+            stream.seek(-HASH_EDGE_BYTES, os.SEEK_END)
+        digest.update(stream.read(HASH_EDGE_BYTES))
+    return digest.hexdigest()
+
+
+def _fingerprint(paths, with_hash):
+    """From path to its size, modification time and, optionally,
+    content hash. A file that doesn't exist maps to None."""
+    prints = dict()
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            prints[path] = None
+            continue
+        prints[path] = dict(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+        if with_hash:
+            prints[path]["hash"] = content_hash(path)
+    return prints
+
+
+def _use_hash():
+    return configuration().getboolean("manifest-content-hash", False)
+
+
+def input_fingerprint(job):
+    """Fingerprint of a job's inputs, taken just before it runs.
+    Inputs whose contents aren't in a file aren't part of it."""
+    paths = _content_paths(job.inputs.values())
+    return _fingerprint(
+        [path for path in paths if path is not None], _use_hash())
+
+
+def record_manifest(job, inputs):
+    """
+    Writes the record of a job that ran successfully. The job's work
+    is done, so a record that can't be written is only a warning,
+    and the job's completion will be checked by validating outputs.
+
+    Args:
+        job (Job): The job or task that ran.
+        inputs (Dict): The ``input_fingerprint`` from before it ran.
+    """
+    try:
+        _record_manifest(job, inputs)
+    except OSError as write_error:
+        LOGGER.warning(f"Could not record the outputs of {job}: "
+                       f"{write_error}")
+
+
+def _record_manifest(job, inputs):
+    path = manifest_path(job)
+    if path is None:
+        return
+    paths = _content_paths(job.outputs.values())
+    if None in paths:
+        # A record of the other outputs would say the job is done
+        # without the output that isn't in a file.
+        LOGGER.debug(f"Not recording {path} for outputs not in files.")
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+        return
+    outputs = _fingerprint(paths, _use_hash())
+    partial_path = path.with_suffix(f".{os.getpid()}")
+    partial_path.write_text(json.dumps(dict(outputs=outputs, inputs=inputs)))
+    os.replace(partial_path, path)
+
+
+def _matches(path, recorded):
+    """Whether a file is as it was recorded. If the size and time
+    differ but a content hash was recorded, the hash decides."""
+    stat = _stat(path)
+    if stat is None:
+        return recorded is None
+    if recorded is None:
+        return False
+    if (stat.st_size == recorded["size"] and
+            stat.st_mtime_ns == recorded["mtime_ns"]):
+        return True
+    if "hash" in recorded and stat.st_size == recorded["size"]:
+        return content_hash(path) == recorded["hash"]
+    return False
+
+
+def manifest_current(job):
+    """
+    Whether the job's outputs are as it recorded them, and its
+    inputs are as they were when it ran.
+
+    Returns:
+        bool: Whether it's current, or None if there is no record.
+    """
+    path = manifest_path(job)
+    if path is None or _stat(path) is None:
+        return None
+    try:
+        record = json.loads(Path(path).read_text())
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as read_error:
+        LOGGER.warning(f"Ignoring unreadable manifest {path}: {read_error}")
+        return None
+    if set(record["outputs"]) != set(_content_paths(job.outputs.values())):
+        return None  # The job's outputs changed since it was recorded.
+    for output, recorded in record["outputs"].items():
+        if recorded is None or not _matches(output, recorded):
+            LOGGER.debug(f"Output {output} changed since it was written.")
+            return False
+    for input_path, recorded in record["inputs"].items():
+        if not _matches(input_path, recorded):
+            LOGGER.debug(f"Input {input_path} changed since the job ran.")
+            return False
+    return True
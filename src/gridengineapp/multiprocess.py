@@ -4,12 +4,25 @@ that says which must either start or complete before the next can start.
 It is a layer over the Python subprocess module.
 """
 import os
+import selectors
+import signal
 import subprocess
-import time
+import sys
+import traceback
+from heapq import heappush, heappop
+from itertools import count
 from logging import getLogger
 from textwrap import fill
+from threading import Lock, Thread
+from types import SimpleNamespace
+
+from .config import configuration
+from .proc_memory import (
+    proc_available, process_tree_rss_gigabytes, host_available_gigabytes
+)
 
 LOGGER = getLogger(__name__)
+NICE_LEVEL = 19
 
 
 class NotEnoughResources(Exception):
@@ -20,18 +33,331 @@ class ChildProcessProblem(Exception):
     """A subprocess had a nonzero exit code."""
 
 
-def graph_do(run_next, memory_limit, sleep_duration=1):
+class ChildWatcher:
+    """
+    Blocks until at least one watched child process exits.
+    On Linux, this waits on a process file descriptor for each child,
+    so it wakes as soon as a child exits. Where those aren't available,
+    a thread waits on each child and wakes the watcher through a pipe.
+    Either way, nothing polls on a timer.
+    """
+    def __init__(self):
+        self._children = dict()
+        self._pidfds = dict()
+        self._selector = selectors.DefaultSelector()
+        self._wake_read, self._wake_write = os.pipe()
+        os.set_blocking(self._wake_read, False)
+        self._selector.register(self._wake_read, selectors.EVENT_READ)
+
+    def __len__(self):
+        return len(self._children)
+
+    def add(self, key, child):
+        """Watch a child process.
+
+        Args:
+            key: The task ID to return when this child finishes.
+            child (subprocess.Popen): A started process.
+        """
+        self._children[key] = child
+        pidfd = _open_pidfd(child)
+        if pidfd is not None:
+            self._pidfds[key] = pidfd
+            self._selector.register(pidfd, selectors.EVENT_READ)
+        else:
+            Thread(target=self._wait_on, args=(child,), daemon=True).start()
+
+    def _wait_on(self, child):
+        child.wait()
+        os.write(self._wake_write, b"x")
+
+    def wait(self, timeout=None):
+        """
+        Waits for children to exit and reaps every one that has.
+
+        Args:
+            timeout (float): Longest to wait, in seconds, before
+                checking children anyway. None waits indefinitely.
+
+        Returns:
+            List: Keys of children that have finished, with their
+            return codes set.
+        """
+        if self._children:
+            self._selector.select(timeout)
+        try:
+            while os.read(self._wake_read, 4096):
+                pass
+        except BlockingIOError:
+            pass  # The wake pipe is empty.
+        finished = [key for (key, child) in self._children.items()
+                    if child.poll() is not None]
+        for key in finished:
+            del self._children[key]
+            if key in self._pidfds:
+                pidfd = self._pidfds.pop(key)
+                self._selector.unregister(pidfd)
+                os.close(pidfd)
+        return finished
+
+    def close(self):
+        for pidfd in self._pidfds.values():
+            os.close(pidfd)
+        self._pidfds.clear()
+        self._selector.close()
+        os.close(self._wake_read)
+        os.close(self._wake_write)
+
+
+def _open_pidfd(child):
+    """Returns a file descriptor that becomes readable when the child
+    exits, or None if the operating system can't make one."""
+    pid = getattr(child, "pid", None)
+    if pid is None or not hasattr(os, "pidfd_open"):
+        return None
+    try:
+        return os.pidfd_open(pid)
+    except OSError as ose:
+        LOGGER.debug(f"No pidfd for {pid}: {ose}")
+        return None
+
+
+def usable_cores():
+    """How many cores this process is allowed to run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+class LocalResources:
+    """
+    Accounts for the memory and cores that running tasks claim,
+    so that a task starts only when both its memory and its threads fit.
+    A task that asks for more threads than the limit is counted as
+    using all cores, so it can still run, alone.
+
+    Args:
+        memory_limit (float): Gigabytes that running tasks may claim.
+        cpu_limit (int): Cores that running tasks may claim.
+            Defaults to the number of usable cores.
+        pin_cores (bool): Whether to bind each task to its own
+            set of cores, disjoint from those of other tasks.
+    """
+    def __init__(self, memory_limit, cpu_limit=None, pin_cores=False):
+        self.memory_limit = memory_limit
+        self.cpu_limit = cpu_limit if cpu_limit else usable_cores()
+        self._memory = dict()
+        self._threads = dict()
+        # Totals of the claims above, kept as tasks come and go.
+        self._memory_claimed = 0
+        self._threads_claimed = 0
+        self._cores = dict()
+        self.peaks = dict()
+        """Peak gigabytes of each task, if measured."""
+        if pin_cores and hasattr(os, "sched_getaffinity"):
+            self._free_cores = sorted(os.sched_getaffinity(0))
+            self.cpu_limit = min(self.cpu_limit, len(self._free_cores))
+        else:
+            self._free_cores = None
+
+    @property
+    def memory_remaining(self):
+        return self.memory_limit - self._memory_claimed
+
+    @property
+    def cores_remaining(self):
+        return self.cpu_limit - self._threads_claimed
+
+    def threads(self, description):
+        return min(getattr(description, "threads", 1), self.cpu_limit)
+
+    def fits(self, description):
+        return (description.memory <= self.memory_remaining and
+                self.threads(description) <= self.cores_remaining)
+
+    def claim(self, task_id, description):
+        """Record that a task is starting.
+
+        Returns:
+            List[int]: Cores on which to pin the task, or None
+            if tasks aren't pinned.
+        """
+        self._memory[task_id] = description.memory
+        self._threads[task_id] = self.threads(description)
+        self._memory_claimed += self._memory[task_id]
+        self._threads_claimed += self._threads[task_id]
+        if self._free_cores is None:
+            return None
+        cores = self._free_cores[:self._threads[task_id]]
+        del self._free_cores[:self._threads[task_id]]
+        self._cores[task_id] = cores
+        return cores
+
+    def started(self, task_id, child):
+        """Record the process for a task that has started."""
+
+    def sample(self):
+        """Update anything measured about running tasks."""
+
+    def release(self, task_id):
+        """Record that a task finished."""
+        self._memory_claimed -= self._memory.pop(task_id)
+        self._threads_claimed -= self._threads.pop(task_id)
+        if not self._memory:
+            # Don't let rounding accumulate over a long run.
+            self._memory_claimed = 0
+        if task_id in self._cores:
+            self._free_cores.extend(self._cores.pop(task_id))
+            self._free_cores.sort()
+
+    def close(self):
+        """Called when no more tasks will start."""
+
+
+class MeasuredResources(LocalResources):
+    """
+    Admits tasks according to the memory that running tasks use,
+    as read from ``/proc``, instead of the memory they claim.
+    A task counts as its claim until it is first measured and as its
+    resident memory afterwards, and new tasks must also fit within
+    the memory the host had available when last sampled, less a reserve
+    and less the claims of tasks that haven't been measured yet.
+
+    If the host's available memory falls below the reserve, this
+    stops, with SIGSTOP, the most recently started task, one per sample,
+    and it continues stopped tasks, with SIGCONT, once the host has
+    twice the reserve available, or as soon as every running task
+    is stopped. Nothing new starts while a task is stopped.
+    It records the peak memory of every task in ``peaks``.
+
+    Args:
+        memory_limit (float): Gigabytes that running tasks may use.
+        cpu_limit (int): Cores that running tasks may claim.
+        pin_cores (bool): Whether to bind each task to its own cores.
+        reserve_gigabytes (float): Memory to leave free on the host.
+            Defaults to ``local-memory-reserve-gigabytes``
+            in the configuration.
+    """
+    def __init__(self, memory_limit, cpu_limit=None, pin_cores=False,
+                 reserve_gigabytes=None):
+        super().__init__(memory_limit, cpu_limit, pin_cores)
+        if reserve_gigabytes is None:
+            reserve_gigabytes = float(
+                configuration()["local-memory-reserve-gigabytes"])
+        self.reserve_gigabytes = reserve_gigabytes
+        self._pids = dict()  # In order of starting.
+        self._measured = dict()
+        self._stopped = list()
+        self._host_available = host_available_gigabytes()
+
+    @property
+    def memory_remaining(self):
+        in_use = sum(self._measured.get(task_id, claim)
+                     for (task_id, claim) in self._memory.items())
+        remaining = self.memory_limit - in_use
+        if self._host_available is not None:
+            # The host's sample doesn't include tasks that started
+            # after it, so they are charged their claims against it.
+            unmeasured = sum(claim for (task_id, claim) in self._memory.items()
+                             if task_id not in self._measured)
+            remaining = min(
+                remaining,
+                self._host_available - self.reserve_gigabytes - unmeasured,
+            )
+        return remaining
+
+    def fits(self, description):
+        return not self._stopped and super().fits(description)
+
+    def started(self, task_id, child):
+        self._pids[task_id] = child.pid
+
+    def sample(self):
+        for task_id, pid in self._pids.items():
+            resident = process_tree_rss_gigabytes(pid)
+            if resident is not None:
+                self._measured[task_id] = resident
+                self.peaks[task_id] = max(
+                    resident, self.peaks.get(task_id, 0))
+        self._host_available = host_available_gigabytes()
+        self._relieve_pressure()
+
+    def _relieve_pressure(self):
+        self._continue_if_all_stopped()
+        if self._host_available is None:
+            return
+        if self._host_available < self.reserve_gigabytes:
+            unstopped = [task_id for task_id in self._pids
+                         if task_id not in self._stopped]
+            # Leave one task running so that the run makes progress.
+            if len(unstopped) > 1:
+                self._signal(unstopped[-1], signal.SIGSTOP)
+                self._stopped.append(unstopped[-1])
+        elif (self._stopped and
+              self._host_available > 2 * self.reserve_gigabytes):
+            self._signal(self._stopped.pop(), signal.SIGCONT)
+
+    def _continue_if_all_stopped(self):
+        """If every running task is stopped, nothing could finish
+        to free memory, so one must continue, however little
+        memory the host has."""
+        if self._stopped and len(self._stopped) == len(self._pids):
+            self._signal(self._stopped.pop(), signal.SIGCONT)
+
+    def _signal(self, task_id, signal_number):
+        LOGGER.info(
+            f"{signal.Signals(signal_number).name} to {task_id} because "
+            f"host has {self._host_available:.2f} GB available."
+        )
+        try:
+            os.kill(self._pids[task_id], signal_number)
+        except ProcessLookupError:
+            pass  # It already finished.
+
+    def release(self, task_id):
+        claim = self._memory[task_id]
+        super().release(task_id)
+        del self._pids[task_id]
+        self._measured.pop(task_id, None)
+        if task_id in self._stopped:
+            self._stopped.remove(task_id)
+        self._continue_if_all_stopped()
+        if task_id in self.peaks:
+            LOGGER.info(f"{task_id} peak memory {self.peaks[task_id]:.2f} "
+                        f"GB of {claim} GB claimed")
+
+    def close(self):
+        while self._stopped:
+            self._signal(self._stopped.pop(), signal.SIGCONT)
+
+
+def graph_do(run_next, memory_limit, sleep_duration=1, cpu_limit=None,
+             pin_cores=False, measure_memory=False, keep_going=False,
+             journal=None):
     """
     This runs processes and blocks until completion.
     The ``run_next`` function must have the signature
     ``run_next(completed) -> args.``
+    If ``run_next`` also has a method ``complete(task_id) -> args``,
+    then this calls that method, instead, for each task that finishes,
+    and it returns only the tasks which that completion unblocked.
     The tasks run at a high nice level because we assume we are running
     on a user's machine.
 
     ``completed`` is a set of the IDs of tasks,
     which are likely location IDs, and it returns a
     dictionary from ID to a Namespace object with attributes
-    ``memory`` and ``args``.
+    ``memory`` and ``args``, and, optionally, ``threads``,
+    which is one if it isn't there, and ``priority``, where tasks with
+    higher priority start first. If the object has a ``function``,
+    then the task runs in a fork of this process, which calls that
+    function and exits with the integer it returns. If the object
+    has ``tasks``, then its one process does all of those tasks,
+    and the journal records each of them.
+
+    Each time through the loop, this starts every task that fits
+    within both the memory limit and the cpu limit and then waits
+    for any child to exit, reaping all children that have finished.
 
     Args:
         run_next (function): Returns tasks that can run. This function
@@ -43,72 +369,332 @@ def graph_do(run_next, memory_limit, sleep_duration=1):
             and ``memory`` which is the maximum number of Gb this process
             could require.
         memory_limit (float): How much memory to use. This function doesn't
-            check memory in the operating system. It checks against claims
-            by the processes.
-        sleep_duration (float): How long to wait if there's nothing to do.
+            check memory in the operating system, unless ``measure_memory``
+            is set. It checks against claims by the processes.
+        sleep_duration (float): The longest to wait for a child to exit
+            before checking all children again. Children that exit
+            are noticed immediately, so this is only a safeguard,
+            except when measuring memory, where this is how often
+            memory is sampled.
+        cpu_limit (int): How many cores to use, checked against the
+            threads that each process claims. Defaults to all cores
+            this process may use.
+        pin_cores (bool): Bind each process to its own cores with
+            ``sched_setaffinity``, so processes don't share caches.
+        measure_memory (bool): Admit processes according to the memory
+            they use, as measured, instead of what they claim.
+            See ``MeasuredResources``.
+        keep_going (bool): When a process fails, keep running every
+            task that doesn't depend on it, instead of raising
+            ``ChildProcessProblem`` as soon as running processes finish.
+        journal (TaskJournal): If given, this records in it when
+            each task starts and finishes.
+
+    Returns:
+        SimpleNamespace: With ``completed``, the set of tasks completed,
+        ``failed``, the set of tasks whose processes failed, which
+        is empty unless ``keep_going`` is set, and ``peak_memory``,
+        a dictionary from task to its peak gigabytes, which is empty
+        unless memory is measured.
     """
     completed = set()
+    failures = dict()  # From task ID to its finished process.
     unblocked = run_next(completed)
-    running = set()  # Running is a subset of unblocked.
-    popen_objects = dict()  # Tracks processes associated with running.
-
-    def _resources_to_run(nr):
-        return (nr not in running | completed and
-                unblocked[nr].memory <= memory_remaining)
-
-    def _process_complete(job_id):
-        return popen_objects[job_id].poll() is not None
-
-    # Permit only one process to start or stop on each iteration
-    # in order to reduce complexity.
-    while unblocked:
-        assert running.issubset(set(unblocked.keys()))
-        assert not running & completed, f"Run {running} comp {completed}"
-
-        memory_usage = sum(unblocked[run_mem].memory for run_mem in running)
-        memory_remaining = memory_limit - memory_usage
-        next_to_run = next(filter(_resources_to_run, unblocked.keys()), None)
-        if not running and next_to_run is None:
-            raise NotEnoughResources(fill("""
-                Processes require more than allotted memory: {memory_limit}.
-                Even though {unblocked.keys()} not done and {completed} done.
-            """))
-
-        if next_to_run is not None:
-            # 1) Start a job: U -> U', R -> R' + 1, C -> C'=C
-            child = _run_or_throw(unblocked[next_to_run].args)
-            running.add(next_to_run)
-            popen_objects[next_to_run] = child
-        else:
-            # 2) Finish a job: U -> U' >= U-1, R -> R'-1, C -> C' + 1
-            newly_completed = next(filter(_process_complete, running), None)
-            if newly_completed is not None:  # A process ID of 0 is False.
-                running.remove(newly_completed)
-                completed.add(newly_completed)
-                unblocked = run_next(completed)
-                LOGGER.debug(f"unblocked new {unblocked.keys()}")
-                assert set(unblocked.keys()) not in completed
-                result = popen_objects[newly_completed]
+    running = dict()  # Running is a subset of unblocked, to its process.
+    waiting = AdmissionQueue(unblocked.items())  # Unblocked, not running.
+    resources = _local_resources(
+        memory_limit, cpu_limit, pin_cores, measure_memory)
+    watcher = ChildWatcher()
+    try:
+        while unblocked and (keep_going or not failures):
+            assert not running.keys() & completed, \
+                f"Run {running.keys()} comp {completed}"
+            resources.sample()
+            _start_all_that_fit(waiting, running, watcher, resources, journal)
+            if not running:
+                raise NotEnoughResources(fill(f"""
+                    Processes require more than allotted memory:
+                    {memory_limit}. Even though {unblocked.keys()}
+                    not done and {completed} done.
+                """))
+
+            for finished, result in _reap(
+                    watcher, running, unblocked, resources,
+                    sleep_duration, journal):
+                del unblocked[finished]
                 if result.returncode != 0:
-                    raise ChildProcessProblem(
-                        f"Child {result.args} had return code "
-                        f"{result.returncode}"
-                    )
-                del popen_objects[newly_completed]
-            else:
-                time.sleep(sleep_duration)
+                    failures[finished] = result
+                    continue
+                completed.add(finished)
+                newly_unblocked = _unblocked_by(run_next, completed, finished)
+                LOGGER.debug(f"unblocked new {newly_unblocked.keys()}")
+                assert not newly_unblocked.keys() & completed
+                for task, description in newly_unblocked.items():
+                    if task not in failures and task not in unblocked:
+                        unblocked[task] = description
+                        waiting.add(task, description)
+        # After a failure, start nothing new, but let running children
+        # finish, so that none are left orphaned.
+        while running:
+            for finished, result in _reap(
+                    watcher, running, unblocked, resources,
+                    sleep_duration, journal):
+                if result.returncode != 0:
+                    failures[finished] = result
+                else:
+                    completed.add(finished)
+    finally:
+        resources.close()
+        watcher.close()
+
+    if failures and not keep_going:
+        first = next(iter(failures.values()))
+        raise ChildProcessProblem(
+            f"Child {first.args} had return code {first.returncode}"
+        )
+    return SimpleNamespace(
+        completed=completed,
+        failed=set(failures),
+        peak_memory=resources.peaks,
+    )
+
+
+def _local_resources(memory_limit, cpu_limit, pin_cores, measure_memory):
+    if measure_memory and proc_available():
+        return MeasuredResources(memory_limit, cpu_limit, pin_cores)
+    if measure_memory:
+        LOGGER.warning("Cannot measure memory, so using memory claims.")
+    return LocalResources(memory_limit, cpu_limit, pin_cores)
+
+
+def _reap(watcher, running, unblocked, resources, sleep_duration, journal):
+    """Waits for children to exit and yields each task that
+    finished, with its process."""
+    for finished in watcher.wait(sleep_duration):
+        result = running.pop(finished)
+        resources.release(finished)
+        if journal is not None:
+            journal.finished(
+                _covered_tasks(finished, unblocked[finished]),
+                result.returncode,
+            )
+        if result.returncode != 0:
+            LOGGER.error(f"Child {result.args} had return code "
+                         f"{result.returncode}")
+        yield finished, result
+
+
+def _covered_tasks(task, description):
+    """The tasks that one process does."""
+    return getattr(description, "tasks", [task])
+
+
+def _unblocked_by(run_next, completed, finished):
+    """Asks ``run_next`` what can run now that a task has finished."""
+    if hasattr(run_next, "complete"):
+        return run_next.complete(finished)
+    else:
+        return run_next(completed)
+
+
+class AdmissionQueue:
+    """
+    Tasks waiting to start, in the order to try starting them, which
+    puts those with the highest ``priority`` first and, among equal
+    priorities, those that claim the most memory first, because the
+    small ones can fill in around them. Tasks without a priority have
+    priority zero.
+
+    Tasks are kept in a heap for each claim of memory and threads,
+    so finding the next task that fits costs time proportional to
+    the number of different claims, not the number of waiting tasks,
+    and a task array of any size is one claim.
+
+    Args:
+        tasks (Iterable): Pairs of task ID and its description.
+    """
+    def __init__(self, tasks=()):
+        self._claims = dict()  # From (memory, threads) to a heap.
+        self._added = count()  # Keeps the order tasks were added.
+        self._length = 0
+        for task, description in tasks:
+            self.add(task, description)
+
+    def __len__(self):
+        return self._length
+
+    def add(self, task, description):
+        claim = (description.memory, getattr(description, "threads", 1))
+        heappush(self._claims.setdefault(claim, list()), (
+            -getattr(description, "priority", 0), next(self._added),
+            task, description,
+        ))
+        self._length += 1
+
+    def fitting(self, fits):
+        """
+        Removes and yields, in order, each task that fits.
+        The caller claims resources for a task before asking for
+        the next, and a claim that didn't fit isn't asked again,
+        because resources only shrink as tasks start.
+
+        Args:
+            fits (function): From a description to whether it fits.
+
+        Yields:
+            Tuple: Task ID and its description.
+        """
+        open_claims = set(self._claims)
+        while open_claims:
+            best = None
+            for claim in list(open_claims):
+                first = self._claims[claim][0]
+                if not fits(first[3]):
+                    open_claims.discard(claim)
+                elif best is None or self._rank(claim) < self._rank(best):
+                    best = claim
+            if best is None:
+                return
+            _priority, _added, task, description = heappop(
+                self._claims[best])
+            self._length -= 1
+            if not self._claims[best]:
+                del self._claims[best]
+                open_claims.discard(best)
+            yield task, description
 
+    def _rank(self, claim):
+        first = self._claims[claim][0]
+        return first[0], -claim[0], first[1]
 
-def _nice_process():
-    os.nice(19)
+
+def _start_all_that_fit(waiting, running, watcher, resources, journal):
+    for next_to_run, description in waiting.fitting(resources.fits):
+        cores = resources.claim(next_to_run, description)
+        if journal is not None:
+            journal.started(_covered_tasks(next_to_run, description))
+        child = _start_child(description, cores)
+        running[next_to_run] = child
+        resources.started(next_to_run, child)
+        watcher.add(next_to_run, child)
+
+
+def _nice_process(pid):
+    """Lowers the priority of a started process. Doing this from the
+    parent, instead of in a ``preexec_fn``, lets subprocess use its
+    fast spawn path. The child runs at normal priority only for the
+    moment between its start and this call."""
+    try:
+        os.setpriority(os.PRIO_PROCESS, pid, NICE_LEVEL)
+    except ProcessLookupError:
+        pass  # It already finished.
+    except OSError as ose:
+        LOGGER.debug(f"Could not nice process {pid}: {ose}")
+
+
+def _pin_process(pid, cores):
+    """Binds a started process to the given cores. As with the nice
+    level, this happens just after the process starts, before it
+    has started threads of its own."""
+    try:
+        os.sched_setaffinity(pid, cores)
+    except ProcessLookupError:
+        pass  # It already finished.
+    except OSError as ose:
+        LOGGER.debug(f"Could not pin process {pid} to {cores}: {ose}")
+
+
+def _start_child(description, cores=None):
+    """Starts a process for a task, either by running its arguments
+    or, if it has a ``function``, by forking and calling that."""
+    if hasattr(description, "function"):
+        child = _fork_or_throw(description.function, description.args)
+    else:
+        child = _run_or_throw(description.args)
+    if getattr(child, "pid", None) is not None:
+        _nice_process(child.pid)
+        if cores:
+            _pin_process(child.pid, cores)
+    return child
 
 
 def _run_or_throw(args):
     try:
         args = [str(arg) for arg in args]
-        child = subprocess.Popen(args=args, preexec_fn=_nice_process)
+        child = subprocess.Popen(args=args)
     except ValueError as ve:
         raise Exception(f"Invalid arguments to process: {ve}")
     except OSError as ose:
         raise Exception(f"Operating system error running process {ose}")
     return child
+
+
+class ForkedChild:
+    """
+    Looks enough like a ``subprocess.Popen`` for ``graph_do`` to
+    watch a process made with ``os.fork``.
+
+    Args:
+        pid (int): Process ID of the child.
+        args (List[str]): Description of what the child does,
+            for error messages.
+    """
+    def __init__(self, pid, args):
+        self.pid = pid
+        self.args = args
+        self.returncode = None
+        self._wait_lock = Lock()
+
+    def poll(self):
+        """Doesn't block. If a thread is in ``wait``, that thread will
+        set the return code, so this returns None until it does,
+        the same as ``Popen.poll``."""
+        if self.returncode is not None:
+            return self.returncode
+        if not self._wait_lock.acquire(False):
+            return None
+        try:
+            return self._wait(os.WNOHANG)
+        finally:
+            self._wait_lock.release()
+
+    def wait(self):
+        with self._wait_lock:
+            return self._wait(0)
+
+    def _wait(self, options):
+        """Call with the lock held."""
+        if self.returncode is not None:
+            return self.returncode
+        try:
+            pid, status = os.waitpid(self.pid, options)
+        except ChildProcessError:
+            return self.returncode
+        if pid == self.pid:
+            if os.WIFSIGNALED(status):
+                self.returncode = -os.WTERMSIG(status)
+            else:
+                self.returncode = os.WEXITSTATUS(status)
+        return self.returncode
+
+
+def _fork_or_throw(function, args):
+    """Forks this process. The child calls the function, which returns
+    an exit code, and the child exits without returning."""
+    sys.stdout.flush()
+    sys.stderr.flush()
+    try:
+        pid = os.fork()
+    except OSError as ose:
+        raise Exception(f"Operating system error forking process {ose}")
+    if pid == 0:
+        exit_code = 1
+        try:
+            exit_code = function()
+        except BaseException:
+            traceback.print_exc()
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(exit_code if isinstance(exit_code, int) else 0)
+    return ForkedChild(pid, args)
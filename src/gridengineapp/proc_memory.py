@@ -0,0 +1,93 @@
+"""
+Reads memory use of processes and of the host from the Linux
+``/proc`` filesystem. Every function returns None where ``/proc``
+doesn't have the answer, so callers can fall back to declared claims.
+"""
+import os
+from logging import getLogger
+from pathlib import Path
+
+LOGGER = getLogger(__name__)
+PROC = Path("/proc")
+GIGABYTE = 1024 ** 3
+
+
+def proc_available():
+    """Whether this machine has a ``/proc`` that reports memory."""
+    return (PROC / "meminfo").exists()
+
+
+def process_rss_bytes(pid):
+    """Resident set size of one process.
+
+    Args:
+        pid (int): Process ID.
+
+    Returns:
+        int: Bytes resident, or None if the process is gone.
+    """
+    try:
+        with (PROC / str(pid) / "statm").open() as statm:
+            resident_pages = int(statm.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE")
+
+
+def child_pids(pid):
+    """Process IDs of direct children of a process, as far as
+    the kernel reports them for each of its threads."""
+    children = list()
+    try:
+        threads = list((PROC / str(pid) / "task").iterdir())
+    except OSError:
+        return children
+    for thread in threads:
+        try:
+            children.extend(
+                int(child) for child in
+                (thread / "children").read_text().split()
+            )
+        except OSError:
+            pass  # The thread ended or the kernel doesn't list children.
+    return children
+
+
+def process_tree_rss_gigabytes(pid):
+    """Resident memory of a process and all its descendants.
+
+    Args:
+        pid (int): Process ID.
+
+    Returns:
+        float: Gigabytes resident, or None if the process is gone.
+    """
+    root_bytes = process_rss_bytes(pid)
+    if root_bytes is None:
+        return None
+    total = root_bytes
+    to_visit = child_pids(pid)
+    while to_visit:
+        descendant = to_visit.pop()
+        descendant_bytes = process_rss_bytes(descendant)
+        if descendant_bytes is not None:
+            total += descendant_bytes
+            to_visit.extend(child_pids(descendant))
+    return total / GIGABYTE
+
+
+def host_available_gigabytes():
+    """How much memory the kernel says it could give to new work,
+    which is ``MemAvailable`` in ``/proc/meminfo``.
+
+    Returns:
+        float: Gigabytes available, or None if it's unknown.
+    """
+    try:
+        with (PROC / "meminfo").open() as meminfo:
+            for line in meminfo:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024 / GIGABYTE
+    except (OSError, ValueError):
+        LOGGER.debug(f"Cannot read available memory from {PROC}")
+    return None
@@ -3,6 +3,7 @@ from functools import lru_cache
 from logging import getLogger
 from os import environ, linesep
 from subprocess import run, PIPE, TimeoutExpired, CalledProcessError
+from threading import Lock
 from time import sleep
 
 from .config import configuration
@@ -14,15 +15,22 @@ This module-level global guards against writing unit tests that run
 on the cluster but fail to run under Travis off the cluster.
 Look in tests/conftest.py for implementation.
 """
+# So that threads that submit at once ask ``which`` only once.
+_FULL_PATH_LOCK = Lock()
 
 
-@lru_cache(maxsize=16)
 def find_full_path(executable):
     """Uses the Bash shell's ``which`` command to find the full path
     to the given command. We could hard-code the command location.
     This ``which`` is necessary because grid engine's commands change
     how they pipe to stdout when they sense they are inside a shell.
     """
+    with _FULL_PATH_LOCK:
+        return _which(executable)
+
+
+@lru_cache(maxsize=16)
+def _which(executable):
     process_result = run(
         f"which {executable}", shell=True, stdout=PIPE,
         universal_newlines=True)
@@ -0,0 +1,108 @@
+"""
+The longest run time of each queue, asked of ``qconf`` once, and the
+memory and cores of the largest host, asked of ``qhost`` once, kept
+in a file in the shared tmp area, so that every launcher on the
+cluster reads the file instead of asking again, until the file
+is older than ``queue-catalog-ttl-seconds``.
+"""
+import json
+import os
+from bisect import bisect_right
+from hashlib import sha256
+from logging import getLogger
+from threading import Lock
+from time import time
+
+from .config import configuration, shared_directory
+from .submit import max_run_minutes_on_queue, largest_host
+
+LOGGER = getLogger(__name__)
+# From directory and queue names to the catalog this process read.
+_CATALOGS = dict()
+_CATALOGS_LOCK = Lock()
+
+
+class QueueCatalog:
+    """
+    Queues sorted by their longest run time.
+
+    Args:
+        run_minutes (Dict[str,int]): From queue name to the most
+            minutes a job may run on it.
+        host (Dict): The ``memory_gigabytes`` and ``threads`` of
+            the largest host, or None if they aren't known.
+    """
+    def __init__(self, run_minutes, host=None):
+        self.run_minutes = dict(run_minutes)
+        self.host = dict(host) if host else None
+        self._sorted = sorted(
+            (minutes, queue) for (queue, minutes) in self.run_minutes.items())
+        self._minutes = [minutes for (minutes, _queue) in self._sorted]
+
+    def shortest_longer_than(self, run_time_minutes):
+        """
+        The queue with the shortest run time that is longer than
+        the given one, or None if no queue is long enough.
+        """
+        queue_idx = bisect_right(self._minutes, run_time_minutes)
+        if queue_idx < len(self._sorted):
+            return self._sorted[queue_idx][1]
+        return None
+
+    @property
+    def longest(self):
+        """Most minutes any queue allows."""
+        return self._minutes[-1] if self._minutes else 0
+
+
+def queue_catalog(directory=None):
+    """
+    The catalog of the queues in the ``queues`` configuration.
+
+    Args:
+        directory (Path): Where catalogs are kept. Defaults to
+            ``queue-catalog-directory`` in the configuration.
+
+    Returns:
+        QueueCatalog: Read once in this process.
+    """
+    queues = configuration()["queues"].split()
+    with _CATALOGS_LOCK:
+        key = (str(directory), tuple(queues))
+        if key not in _CATALOGS:
+            if directory is None:
+                directory = shared_directory(
+                    "queue-catalog-directory", "queues")
+            _CATALOGS[key] = QueueCatalog(*_fetch(directory, queues))
+        return _CATALOGS[key]
+
+
+def _fetch(directory, queues):
+    """Reads run times and the largest host from the shared file if
+    it's recent enough, or else asks ``qconf`` and ``qhost`` and
+    writes the file."""
+    name = sha256(" ".join(queues).encode()).hexdigest()[:16]
+    path = directory / f"{name}.json"
+    ttl = float(configuration()["queue-catalog-ttl-seconds"])
+    try:
+        stored = json.loads(path.read_text())
+        if time() - stored["fetched"] < ttl:
+            return stored["run_minutes"], stored.get("host")
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError, KeyError) as read_error:
+        LOGGER.warning(f"Ignoring unreadable queue catalog {path}: "
+                       f"{read_error}")
+
+    run_minutes = {queue: max_run_minutes_on_queue(queue) for queue in queues}
+    host = largest_host()
+    if all(run_minutes.values()) and host is not None:
+        partial_path = path.with_suffix(f".{os.getpid()}")
+        partial_path.write_text(json.dumps(
+            dict(fetched=time(), run_minutes=run_minutes, host=host)))
+        os.replace(partial_path, path)
+    else:
+        # Don't keep a failed qconf or qhost for others to read.
+        LOGGER.info(f"Not saving queue catalog with failures "
+                    f"{run_minutes} {host}")
+    return run_minutes, host
@@ -1,12 +1,23 @@
+import json
 import logging
 import re
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import networkx as nx
 
 from .argument_handling import setup_args_for_job
-from .config import configuration
+from .config import configuration, run_directory
+from .delete import qdel
 from .determine_executable import executable_for_job
 from .graph_choice import job_subset, execution_ordered
+from .graph_snapshot import write_graph_snapshot, snapshot_arguments
+from .job_cache import cached_job, job_resources
+from .journal import SubmissionLedger
+from .job_table import write_job_table
 from .qsub_template import QsubTemplate
-from .submit import max_run_minutes_on_queue, qsub
+from .queue_catalog import queue_catalog
+from .status import qstat_short
+from .submit import qsub, template_to_args
 
 LOGGER = logging.getLogger(__name__)
 
@@ -42,19 +53,49 @@ def choose_queue(run_time_minutes):
     Returns:
         str: The name of the queue to use.
     """
-    queues = configuration()["queues"].split()
-    acceptable = list()
-    for queue in queues:
-        queue_minutes = max_run_minutes_on_queue(queue)
-        if queue_minutes > run_time_minutes:
-            acceptable.append((queue_minutes, queue))
-    acceptable.sort()
-    if len(acceptable) > 0:
-        return acceptable[0][1]
-    else:
+    catalog = queue_catalog()
+    queue = catalog.shortest_longer_than(run_time_minutes)
+    if queue is None:
         raise RuntimeError(
             f"No queue long enough for {run_time_minutes} "
-            f"among the queues {queues}."
+            f"among the queues {sorted(catalog.run_minutes)}."
+        )
+    return queue
+
+
+def check_resources(app, job_graph):
+    """
+    Finds jobs that no queue or host could run, before any job is
+    submitted, so that a launch doesn't stop partway, and no job
+    waits in the queue forever.
+
+    Raises:
+        RuntimeError: If any job needs more run time than every queue,
+            or more memory or threads than the largest host has.
+    """
+    catalog = queue_catalog()
+    host = catalog.host if catalog.host else dict()
+    impossible = list()
+    for job_id in job_graph:
+        resources = job_resources(app, job_id)
+        needs = list()
+        if resources["run_time_minutes"] >= catalog.longest:
+            needs.append(f"{resources['run_time_minutes']} minutes")
+        if resources["memory_gigabytes"] > host.get(
+                "memory_gigabytes", float("inf")):
+            needs.append(f"{resources['memory_gigabytes']} GB")
+        if resources["threads"] > host.get("threads", float("inf")):
+            needs.append(f"{resources['threads']} threads")
+        if needs:
+            impossible.append(f"{job_id} needs {', '.join(needs)}")
+    if impossible:
+        largest = (f"{host['memory_gigabytes']:.1f} GB and "
+                   f"{host['threads']} threads" if host else "unknown")
+        raise RuntimeError(
+            f"{len(impossible)} jobs ask for more than the cluster has. "
+            f"The longest queue in {sorted(catalog.run_minutes)} allows "
+            f"{catalog.longest} minutes, and the largest host has "
+            f"{largest}. {'; '.join(impossible[:5])}."
         )
 
 
@@ -75,7 +116,7 @@ def format_memory(mem_gb):
     return mem_string
 
 
-def configure_qsub(name, job_id, job, holds, args):
+def configure_qsub(name, job_id, job, holds, args, array_holds=None):
     resources = job.resources
     template = QsubTemplate()
     template.N = f"{name}_{sanitize_id(str(job_id))}"
@@ -88,6 +129,8 @@ def configure_qsub(name, job_id, job, holds, args):
         template.r = "y"
     if holds:
         template.hold_jid = [str(h) for h in holds]
+    if array_holds:
+        template.hold_jid_ad = [str(h) for h in array_holds]
     if hasattr(args, "project") and args.project is not None:
         template.P = args.project
     else:
@@ -100,38 +143,399 @@ def configure_qsub(name, job_id, job, holds, args):
     return job.configure_qsub(template)
 
 
+def application_name(app):
+    """The app's ``name`` attribute, if it has one,
+    or the name of its class."""
+    if hasattr(app, "name"):
+        return app.name
+    else:
+        return app.__class__.__name__
+
+
 def launch_jobs(app, args, arg_list, args_to_remove):
     """
     Launches grid engine jobs for this app.
 
     If an edge in a job graph has a "launch" property, set to True,
     then the dependent job will wait until the previous job is
-    launched but not wait for it to finish.
+    launched but not wait for it to finish. If an edge between
+    two task arrays of the same size has a "by_task" property,
+    set to True, then each task of the dependent job waits only
+    for the task with the same task ID, with ``-hold_jid_ad``.
+
+    Sibling jobs, which have the same jobs before and after them
+    and would have the same qsub flags, apart from their names, are
+    submitted as one task array, if there are at least
+    ``--sibling-arrays`` of them, or ``sibling-array-minimum``
+    in the configuration, which is off by default. A job that is
+    part of an array gets a grid ID of the array's ID and its task,
+    as ``12345.7``.
+
+    Each submission is recorded in a ledger named for the run ID.
+    Launching with the same ``--run-id`` again keeps the jobs that
+    the ledger records and qstat shows are still queued or running,
+    and new jobs hold on their grid IDs. Recorded jobs that have left
+    the queue and are done aren't submitted again or held on.
     """
     job_graph = job_subset(app, args)
-    if hasattr(app, "name"):
-        app_name = app.name
+    check_resources(app, job_graph)
+    job_name = application_name(app) + args.run_id
+
+    snapshot = write_graph_snapshot(
+        app, job_graph,
+        lambda job_id: setup_args_for_job(
+            args_to_remove, app.job_id_to_arguments(job_id), arg_list),
+    )
+
+    ledger = submission_ledger(app, job_name)
+    reuse, finished = earlier_submissions(app, job_graph, ledger)
+    # Templates without holds, made once for each job, from which
+    # sibling keys are made and to which holds are added.
+    templates = dict()
+
+    def template_for(app_job_id):
+        if app_job_id not in templates:
+            templates[app_job_id] = configure_qsub(
+                job_name, app_job_id, cached_job(app, app_job_id), [], args)
+        return templates[app_job_id]
+
+    def qsub_flags(app_job_id):
+        """Flags that must match for jobs to share a task array."""
+        if app_job_id in reuse:
+            return None
+        resources = cached_job(app, app_job_id).resources
+        if "task_cnt" in resources and int(resources["task_cnt"]) > 1:
+            return None
+        return _flags_apart_from_name(template_for(app_job_id))
+
+    minimum = _sibling_array_minimum(args)
+    if minimum > 0:
+        unit_graph = collapse_siblings(job_graph, qsub_flags, minimum)
     else:
-        app_name = app.__class__.__name__
-    job_name = app_name + args.run_id
+        unit_graph = job_graph
 
-    grid_id = dict()
-    for app_job_id in execution_ordered(job_graph):
-        job_args = run_job_under_no_profile(
-            app, arg_list, args_to_remove, app_job_id)
+    def prepare(unit, grid_id):
         holds = list()
-        for source, _sink, data in job_graph.in_edges(app_job_id, data=True):
-            if not ("launch" in data and data["launch"]):
-                # Qsub's grid_engine_id can be 10851099.1-30:1 for tasks.
-                grid_job_id = grid_id[source].split(".")[0]
+        array_holds = list()
+        for source, _sink, data in unit_graph.in_edges(unit, data=True):
+            if "launch" in data and data["launch"]:
+                continue
+            if source in finished:
+                continue  # It has left the queue, so can't be held on.
+            # Qsub's grid_engine_id can be 10851099.1-30:1 for tasks.
+            grid_job_id = grid_id[source].split(".")[0]
+            if data.get("by_task") and _same_task_arrays(app, source, unit):
+                array_holds.append(grid_job_id)
+            else:
                 holds.append(grid_job_id)
-        template = configure_qsub(
-            job_name, app_job_id, app.job(app_job_id), holds, args
+        app_job_id = unit.members[0] if isinstance(unit, JobArray) else unit
+        job_args = run_job_under_no_profile(
+            app, arg_list, args_to_remove, app_job_id
+        ) + snapshot_arguments(snapshot, app_job_id)
+        template = template_for(app_job_id)
+        _add_holds(template, holds, array_holds)
+        if isinstance(unit, JobArray):
+            table = write_job_table([
+                setup_args_for_job(
+                    args_to_remove, app.job_id_to_arguments(member),
+                    arg_list,
+                ) + snapshot_arguments(snapshot, member)
+                for member in unit.members
+            ])
+            job_args.extend(["--job-table", str(table)])
+            template.N = (f"{job_name}_{sanitize_id(str(app_job_id))}_"
+                          f"{len(unit.members)}")
+            template.t = f"1-{len(unit.members)}"
+        return template, job_args
+
+    try:
+        unit_id = submit_jobs(
+            unit_graph, prepare, int(configuration()["qsub-threads"]),
+            reuse,
+            lambda unit, grid_id: ledger.submitted(
+                _job_grid_ids(unit, grid_id)),
         )
-        grid_job_id = qsub(template, job_args)
-        grid_id[app_job_id] = grid_job_id
-    if len(grid_id) < 20:
-        LOGGER.debug(f"Launched {', '.join(grid_id.values())}")
+    finally:
+        ledger.close()
+    grid_id = dict()
+    for unit, unit_grid_id in unit_id.items():
+        grid_id.update(_job_grid_ids(unit, unit_grid_id))
+    grid_id = {
+        app_job_id: grid_id[app_job_id]
+        for app_job_id in execution_ordered(job_graph)
+    }
+    if len(unit_id) < 20:
+        LOGGER.debug(f"Launched {', '.join(unit_id.values())}")
     else:
-        LOGGER.debug(f"Launched {len(grid_id)} jobs.")
+        LOGGER.debug(f"Launched {len(unit_id)} grid jobs "
+                     f"for {len(grid_id)} jobs.")
     return grid_id
+
+
+def _flags_apart_from_name(template):
+    """Qsub flags of a template, other than its name, as a key."""
+    if isinstance(template, QsubTemplate):
+        template = template._template
+    return tuple(template_to_args(
+        {flag: value for (flag, value) in template.items()
+         if flag != "N"}))
+
+
+def _sibling_array_minimum(args):
+    """Fewest siblings to submit as one array, from the command line,
+    or else from the configuration. Zero means none are."""
+    if getattr(args, "sibling_arrays", None) is not None:
+        return args.sibling_arrays
+    return int(configuration()["sibling-array-minimum"])
+
+
+def _add_holds(template, holds, array_holds):
+    """Adds holds to a template, after those the job asked for."""
+    if isinstance(template, QsubTemplate):
+        template = template._template
+    for flag, flag_holds in [("hold_jid", holds),
+                             ("hold_jid_ad", array_holds)]:
+        if flag_holds:
+            template[flag] = (list(template.get(flag, list())) +
+                              [str(hold) for hold in flag_holds])
+
+
+def _job_grid_ids(unit, grid_id):
+    """From each job that a submission ran to its grid ID. Each job
+    of an array gets the array's ID and its task, as ``12345.7``."""
+    if not isinstance(unit, JobArray):
+        return {unit: grid_id}
+    array_id = grid_id.split(".")[0]
+    return {
+        member: f"{array_id}.{task_id}"
+        for (task_id, member) in enumerate(unit.members, 1)
+    }
+
+
+def _same_task_arrays(app, source, sink):
+    """Whether both jobs are task arrays with the same number of tasks,
+    so that a task of one can hold on the same task of the other."""
+    task_cnts = list()
+    for job_id in [source, sink]:
+        if isinstance(job_id, JobArray):
+            task_cnts.append(1)  # Its tasks are different jobs.
+        else:
+            task_cnt = job_resources(app, job_id).get("task_cnt")
+            task_cnts.append(int(task_cnt) if task_cnt else 1)
+    if task_cnts[0] > 1 and task_cnts[0] == task_cnts[1]:
+        return True
+    LOGGER.warning(f"Job {sink} holds on all tasks of {source}, not task "
+                   f"by task, because their task counts are {task_cnts}.")
+    return False
+
+
+class JobArray:
+    """Sibling jobs that are submitted as one task array,
+    where task ``n`` runs ``members[n - 1]``."""
+    def __init__(self, members):
+        self.members = members
+
+    def __repr__(self):
+        return f"JobArray({self.members[0]}, +{len(self.members) - 1})"
+
+
+def collapse_siblings(job_graph, sibling_key, minimum):
+    """
+    Puts sibling jobs together, where siblings have the same jobs
+    before and after them, with the same ``launch`` on those edges,
+    and the same key.
+
+    Args:
+        job_graph (nx.DiGraph): Jobs to submit.
+        sibling_key (function): From job ID to something hashable,
+            which must be equal for jobs to share a task array,
+            or None for a job that can't be part of one.
+        minimum (int): Fewest siblings to put in one array.
+
+    Returns:
+        nx.DiGraph: A graph where each group of siblings is one
+        ``JobArray`` node, and other nodes are job IDs, with the
+        edges of the job graph between them.
+    """
+    groups = dict()
+    for job_id in execution_ordered(job_graph):
+        key = sibling_key(job_id)
+        if key is None:
+            continue
+        before = frozenset(
+            (source, bool(data.get("launch")))
+            for (source, _sink, data) in job_graph.in_edges(job_id, data=True)
+        )
+        after = frozenset(
+            (sink, bool(data.get("launch")))
+            for (_source, sink, data) in job_graph.out_edges(job_id, data=True)
+        )
+        groups.setdefault((before, after, key), list()).append(job_id)
+
+    unit_of = {job_id: job_id for job_id in job_graph}
+    for members in groups.values():
+        if len(members) >= max(minimum, 2):
+            array = JobArray(members)
+            unit_of.update((member, array) for member in members)
+    unit_graph = nx.DiGraph()
+    unit_graph.add_nodes_from(unit_of.values())
+    unit_graph.add_edges_from(
+        (unit_of[source], unit_of[sink], data)
+        for (source, sink, data) in job_graph.edges(data=True)
+    )
+    LOGGER.debug(f"Submitting {len(job_graph)} jobs as "
+                 f"{len(unit_graph)} grid jobs.")
+    return unit_graph
+
+
+def submit_jobs(job_graph, prepare, max_workers, submitted=None,
+                record=None):
+    """
+    Submits each job after every job it depends on has been submitted,
+    so that it can hold on their grid IDs. Jobs whose predecessors are
+    all submitted go to qsub at the same time, on a pool of threads,
+    because each qsub waits mostly on the qmaster. Preparing templates
+    happens in this thread, so that applications' ``configure_qsub``
+    is never called from two threads at once.
+
+    If a qsub fails, this submits nothing more, waits for those
+    already running, records them, and then raises.
+
+    Args:
+        job_graph (nx.DiGraph): Jobs to submit.
+        prepare (function): Given a job ID and the dictionary of
+            grid IDs so far, returns the template and command for qsub.
+        max_workers (int): Most qsub commands to run at once.
+        submitted (Dict): From job ID to grid ID, for jobs that were
+            submitted before, so aren't submitted again.
+        record (function): Called with the job ID and grid ID of
+            each job, as soon as it's submitted.
+
+    Returns:
+        Dict: From job ID to grid ID, in execution order.
+    """
+    grid_id = dict(submitted) if submitted else dict()
+    waiting = {job_id: job_graph.in_degree(job_id) for job_id in job_graph}
+    for job_id in grid_id:
+        for successor in job_graph.successors(job_id):
+            waiting[successor] -= 1
+    ordered = list(execution_ordered(job_graph))
+    ready = [job_id for job_id in ordered
+             if waiting[job_id] == 0 and job_id not in grid_id]
+    running = dict()  # From future of a qsub to its job ID.
+    failure = None
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while ready or running:
+            try:
+                for job_id in ready:
+                    template, command = prepare(job_id, grid_id)
+                    running[pool.submit(qsub, template, command)] = job_id
+            except Exception as prepare_error:
+                failure = failure or prepare_error
+            ready = list()
+            if not running:
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                job_id = running.pop(future)
+                try:
+                    grid_id[job_id] = future.result()
+                except Exception as qsub_error:
+                    failure = failure or qsub_error
+                    continue
+                if record is not None:
+                    record(job_id, grid_id[job_id])
+                for successor in job_graph.successors(job_id):
+                    waiting[successor] -= 1
+                    if waiting[successor] == 0 and failure is None:
+                        ready.append(successor)
+    if failure is not None:
+        raise failure
+    return {job_id: grid_id[job_id] for job_id in ordered}
+
+
+def reusable_submissions(job_graph, recorded, live_ids, done):
+    """
+    Which jobs from an earlier launch of this run are still queued
+    or running, or have finished, and can stay. A job in the queue
+    can stay only if every job it depends on stays, because a job
+    that is submitted again would otherwise run without waiting for
+    the new submission. A job that has left the queue stays if it
+    is done, so the jobs that wait for it stay, too.
+
+    Args:
+        job_graph (nx.DiGraph): Jobs to launch.
+        recorded (Dict): From job ID to the grid ID it got before.
+        live_ids (Set[str]): Grid job numbers that qstat lists.
+        done (function): Whether a job is done, asked only of
+            recorded jobs that have left the queue.
+
+    Returns:
+        Dict, Set, List: From job ID to grid ID, for jobs that stay,
+        the job IDs among those that have finished, and grid IDs of
+        jobs that are in the queue but must be deleted, because they
+        will be submitted again.
+    """
+    reuse = dict()
+    finished = set()
+    stale = list()
+    for job_id in execution_ordered(job_graph):
+        grid_id = recorded.get(job_id)
+        if grid_id is None:
+            continue
+        if grid_id.split(".")[0] not in live_ids:
+            if done(job_id):
+                reuse[job_id] = grid_id
+                finished.add(job_id)
+            continue
+        if all(pred in reuse for pred in job_graph.predecessors(job_id)):
+            reuse[job_id] = grid_id
+        else:
+            stale.append(grid_id)
+    return reuse, finished, stale
+
+
+def submission_ledger(app, job_name):
+    """The ledger of the grid jobs of a run, named for the app and
+    its run ID, with jobs recorded by their command-line arguments."""
+    def job_key(job_id):
+        return json.dumps(
+            [str(arg) for arg in app.job_id_to_arguments(job_id)])
+
+    return SubmissionLedger(run_directory() / f"{job_name}.ledger", job_key)
+
+
+def earlier_submissions(app, job_graph, ledger):
+    """
+    Finds jobs that an earlier launch of this run submitted and
+    that are still in the queue or are done, with one call to qstat,
+    and deletes those in the queue that have to be submitted again.
+
+    Returns:
+        Dict, Set: From job ID to grid ID, for jobs not to submit,
+        and which of those have finished, so aren't held on.
+    """
+    recorded_keys = ledger.grid_ids()
+    if not recorded_keys:
+        return dict(), set()
+    recorded = dict()
+    for job_id in job_graph:
+        key = ledger.job_key(job_id)
+        if key in recorded_keys:
+            recorded[job_id] = recorded_keys[key]
+    live_ids = {
+        str(grid_job.job_id) for grid_job in qstat_short()
+        if "deleted" not in grid_job.status
+    }
+    reuse, finished, stale = reusable_submissions(
+        job_graph, recorded, live_ids,
+        lambda job_id: cached_job(app, job_id).done(),
+    )
+    if stale:
+        LOGGER.info(f"Deleting {len(stale)} queued jobs that depend "
+                    f"on jobs that will be submitted again.")
+        qdel(stale)
+    LOGGER.info(f"Keeping {len(reuse) - len(finished)} jobs that "
+                f"{ledger.path} says were submitted and are still queued "
+                f"or running, and {len(finished)} that are done.")
+    return reuse, finished
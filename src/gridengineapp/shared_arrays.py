@@ -0,0 +1,259 @@
+"""
+Passes NumPy arrays from one job to the jobs that read them through
+shared memory, when all of them run on one machine. A producer writes
+each array as an ``.npy`` file in a directory under ``/dev/shm``,
+which is memory, and each consumer maps those files, so it reads
+the producer's pages without copying or parsing them.
+
+Shared memory is used only within a local run, which sets
+``GRIDENGINEAPP_SHARED_MEMORY`` to the run's directory for the
+processes it starts. The run counts, for each set of arrays,
+the tasks that read it, and removes the arrays when the last of
+those tasks finishes. Without a local run, as on the grid, arrays
+go to the entity's file, instead. So do arrays that no task of the
+run reads, such as final outputs, because they must outlive the run.
+
+Files in ``/dev/shm`` are used, rather than
+``multiprocessing.shared_memory``, because that module's resource
+tracker unlinks a segment when the process that made it exits,
+and here the process that writes arrays exits before its readers
+start.
+"""
+import os
+import shutil
+from contextlib import contextmanager
+from getpass import getuser
+from hashlib import sha256
+from logging import getLogger
+from pathlib import Path
+from tempfile import gettempdir
+
+from .config import configuration
+from .data_passing import FileEntity
+from .job_cache import cached_job
+
+try:
+    import numpy as np
+except ImportError:
+    pass
+
+LOGGER = getLogger(__name__)
+SHARED_MEMORY_VARIABLE = "GRIDENGINEAPP_SHARED_MEMORY"
+
+
+def _segment_name(file_path):
+    """Name of the shared directory for an entity's file."""
+    return sha256(str(file_path).encode()).hexdigest()[:32]
+
+
+def _readers_marker(segment):
+    """A file that exists if tasks of the run read the segment."""
+    return segment.with_suffix(".readers")
+
+
+class SharedArrays(FileEntity):
+    """
+    Named NumPy arrays that one job writes and others read.
+    Within a local run, if tasks of the run read them, they are
+    in shared memory. Otherwise, they are in an ``.npz`` file
+    at the given path.
+
+    Args:
+        file_path (Path|str): Path to the file to use when
+            not in a local run.
+        required_arrays (Iterable[str]): Names of arrays that
+            must be there for this to be valid.
+    """
+    def __init__(self, file_path, required_arrays=None):
+        super().__init__(file_path)
+        self._arrays = set(required_arrays) if required_arrays else set()
+
+    @property
+    def segment(self):
+        """The shared directory for these arrays, or None if
+        this process isn't part of a local run."""
+        run_directory = os.environ.get(SHARED_MEMORY_VARIABLE)
+        if not run_directory:
+            return None
+        return Path(run_directory) / _segment_name(self._file_path)
+
+    def _stored_names(self):
+        """Names of arrays that are stored, from shared memory if they
+        are there, or from the file, or None if neither exists."""
+        segment = self.segment
+        if segment is not None and segment.exists():
+            return {entry.stem for entry in segment.glob("*.npy")}
+        if self._file_path.exists():
+            with np.load(str(self._file_path)) as stored:
+                return set(stored.files)
+        return None
+
+    def _content_paths(self):
+        """None, while the arrays are in shared memory, where they
+        aren't a file, so that no manifest records them."""
+        segment = self.segment
+        if segment is not None and segment.exists():
+            return []
+        return [self._file_path]
+
+    def validate(self):
+        """
+        Returns:
+            None, on success, or a string on error.
+        """
+        names = self._stored_names()
+        if names is None:
+            return f"Arrays {self._file_path} not found"
+        missing = self._arrays - names
+        if missing:
+            return f"Arrays {self._file_path} missing {sorted(missing)}"
+
+    def write(self, arrays):
+        """
+        Stores arrays, replacing any stored before. They go to
+        shared memory only if tasks of this run will read them.
+
+        Args:
+            arrays (Dict[str, np.ndarray]): From name to array.
+        """
+        segment = self.segment
+        if segment is None or not _readers_marker(segment).exists():
+            partial_path = self.path.with_suffix(f".{os.getpid()}.npz")
+            np.savez(str(partial_path), **arrays)
+            os.replace(partial_path, self._file_path)
+            if segment is not None:
+                shutil.rmtree(segment, ignore_errors=True)
+            return
+        # Write beside the segment, then rename, so that a reader
+        # sees all of the arrays or none of them.
+        partial = segment.with_suffix(f".{os.getpid()}")
+        partial.mkdir(parents=True, exist_ok=True)
+        for name, array in arrays.items():
+            np.save(str(partial / f"{name}.npy"), array)
+        shutil.rmtree(segment, ignore_errors=True)
+        os.replace(partial, segment)
+        LOGGER.debug(f"Shared {sorted(arrays)} for {self._file_path}")
+
+    def read(self, names=None):
+        """
+        Reads arrays. From shared memory, each is a read-only
+        view of the shared pages.
+
+        Args:
+            names (Iterable[str]): Arrays to read. Defaults to all.
+
+        Returns:
+            Dict[str, np.ndarray]: From name to array.
+        """
+        segment = self.segment
+        if segment is not None and segment.exists():
+            if names is None:
+                names = [entry.stem for entry in segment.glob("*.npy")]
+            return {
+                name: np.load(str(segment / f"{name}.npy"), mmap_mode="r")
+                for name in names
+            }
+        with np.load(str(self._file_path)) as stored:
+            names = stored.files if names is None else names
+            return {name: stored[name] for name in names}
+
+    def mock(self):
+        self.write({name: np.zeros(1) for name in sorted(self._arrays)})
+
+    def remove(self):
+        segment = self.segment
+        if segment is not None:
+            shutil.rmtree(segment, ignore_errors=True)
+        super().remove()
+
+
+class SharedSegments:
+    """
+    Counts the tasks that read each set of shared arrays
+    and removes the arrays once all of those tasks finish.
+
+    Args:
+        directory (Path): The run's shared-memory directory.
+        readers (Dict[str, int]): From segment name to how many
+            tasks read it.
+        inputs (Dict): From job ID to the names of the segments
+            that its tasks read.
+    """
+    def __init__(self, directory, readers, inputs):
+        self.directory = directory
+        # Set this if tasks failed, to keep arrays for a resumed run.
+        self.keep = False
+        self._readers = readers
+        self._inputs = inputs
+
+    def finished(self, task):
+        """Call when a task finishes successfully."""
+        for name in self._inputs.get(task[0], ()):
+            self._readers[name] -= 1
+            if self._readers[name] == 0:
+                LOGGER.debug(f"Releasing shared arrays {name}")
+                shutil.rmtree(self.directory / name, ignore_errors=True)
+
+
+def _shared_inputs(app, task_graph):
+    """From job ID to the segments its inputs read, for jobs
+    that read shared arrays."""
+    inputs = dict()
+    for job_id in task_graph.job_graph:
+        names = [
+            _segment_name(entity._file_path)
+            for entity in cached_job(app, job_id).inputs.values()
+            if isinstance(entity, SharedArrays)
+        ]
+        if names:
+            inputs[job_id] = names
+    return inputs
+
+
+@contextmanager
+def shared_segments(app, task_graph, run_name):
+    """
+    Within this context, processes that this process starts put
+    shared arrays that tasks of the run read in shared memory, and
+    other shared arrays in their files. If the run succeeds, all
+    shared memory is removed at the end. If it fails, it stays,
+    so that resuming the run can read it.
+
+    Args:
+        app (Application): The application, for its jobs' inputs.
+        task_graph (TaskGraph): The tasks of this run.
+        run_name (str): Unique to this run, to name its directory.
+
+    Yields:
+        SharedSegments: Call its ``finished`` as tasks finish.
+    """
+    root = Path(configuration().get("shared-memory-directory", "/dev/shm"))
+    if not root.is_dir():
+        root = Path(gettempdir())
+    directory = Path(root) / f"gridengineapp-{getuser()}-{run_name}"
+    inputs = _shared_inputs(app, task_graph)
+    readers = dict()
+    for job_id, names in inputs.items():
+        for name in names:
+            readers[name] = (
+                readers.get(name, 0) + len(task_graph.task_ids(job_id)))
+    directory.mkdir(parents=True, exist_ok=True)
+    for name in readers:
+        _readers_marker(directory / name).touch()
+    previous = os.environ.get(SHARED_MEMORY_VARIABLE)
+    os.environ[SHARED_MEMORY_VARIABLE] = str(directory)
+    segments = SharedSegments(directory, readers, inputs)
+    try:
+        yield segments
+    except BaseException:
+        segments.keep = True
+        raise
+    finally:
+        if not segments.keep:
+            shutil.rmtree(directory, ignore_errors=True)
+        elif directory.exists():
+            LOGGER.info(f"Keeping shared arrays in {directory} to resume.")
+        if previous is None:
+            del os.environ[SHARED_MEMORY_VARIABLE]
+        else:
+            os.environ[SHARED_MEMORY_VARIABLE] = previous
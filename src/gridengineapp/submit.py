@@ -1,10 +1,13 @@
 from functools import lru_cache
 from logging import getLogger
+from threading import Lock
 
 from .qsub_template import QsubTemplate
 from .process import run_check
 
 LOGGER = getLogger(__name__)
+# So that threads that submit at once ask qconf about a queue once.
+_QUEUE_LOCK = Lock()
 
 
 class FairTemplate(QsubTemplate):
@@ -28,8 +31,13 @@ class FairTemplate(QsubTemplate):
         return self.l.get("m_mem_free", None)
 
 
-@lru_cache(maxsize=10)
 def max_run_minutes_on_queue(queue_name):
+    with _QUEUE_LOCK:
+        return _queue_run_minutes(queue_name)
+
+
+@lru_cache(maxsize=10)
+def _queue_run_minutes(queue_name):
     try:
         qconf_key_value = run_check("qconf", ["-sq", queue_name])
     except RuntimeError:
@@ -46,6 +54,61 @@ def max_run_minutes_on_queue(queue_name):
     return hours * 60 + minutes
 
 
+def largest_host():
+    """
+    The most memory and cores that any execution host has, from
+    ``qhost``, so that jobs that ask for more can be found before
+    they wait in the queue forever.
+
+    Returns:
+        Dict: With ``memory_gigabytes`` and ``threads``, or None
+        if ``qhost`` fails or lists no hosts.
+    """
+    try:
+        qhost_out = run_check("qhost", [])
+    except RuntimeError:
+        LOGGER.error("Cannot ask qhost about the execution hosts.")
+        return None
+    return _largest_in_qhost(qhost_out)
+
+
+def _largest_in_qhost(qhost_out):
+    """Reads the ``NCPU`` and ``MEMTOT`` columns of ``qhost`` output,
+    skipping the ``global`` host, which has dashes for both."""
+    lines = qhost_out.splitlines()
+    if not lines:
+        return None
+    header = lines[0].split()
+    try:
+        cpu_idx, memory_idx = header.index("NCPU"), header.index("MEMTOT")
+    except ValueError:
+        LOGGER.error(f"Cannot read qhost columns {header}.")
+        return None
+    threads, memory = 0, 0.0
+    for line in lines[1:]:
+        columns = line.split()
+        if len(columns) != len(header):
+            continue
+        try:
+            host_threads = int(columns[cpu_idx])
+            host_memory = _gigabytes(columns[memory_idx])
+        except ValueError:
+            continue
+        threads = max(threads, host_threads)
+        memory = max(memory, host_memory)
+    if not threads:
+        return None
+    return dict(memory_gigabytes=memory, threads=threads)
+
+
+def _gigabytes(size):
+    """From a size that grid engine prints, such as ``251.8G``."""
+    scale = dict(K=1 / 1024 ** 2, M=1 / 1024, G=1, T=1024)
+    if size[-1:].upper() in scale:
+        return float(size[:-1]) * scale[size[-1:].upper()]
+    return float(size) / 1024 ** 3
+
+
 def template_to_args(template):
     """This encodes the consistent rule for qsub's flag system.
     Represent arguments to qsub with a dictionary where the keys are the
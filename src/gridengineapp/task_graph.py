@@ -0,0 +1,168 @@
+"""
+A graph of tasks that stores task arrays as ranges of task IDs on
+the nodes of the job graph, instead of storing one node for every task
+and one edge for every pair of tasks in dependent arrays. Every task
+of a job depends on every task of each job that job depends on,
+so edges between tasks are implied by edges between jobs.
+"""
+import logging
+
+import networkx as nx
+
+from .graph_choice import execution_ordered
+
+LOGGER = logging.getLogger(__name__)
+
+
+class TaskGraph:
+    """
+    Tasks are ``(job_id, task_id)`` tuples, as in a graph made by
+    expanding every task into a node, and this answers the same
+    questions as such a graph would, for iterating over tasks,
+    counting them, and finding their predecessors and successors.
+    Storage and construction are proportional to the number of jobs
+    and job edges, plus the task IDs of jobs that have had some,
+    but not all, of their tasks removed.
+
+    Args:
+        job_graph (nx.DiGraph): Graph of job IDs. Edge data isn't kept.
+        task_ids (Dict): From job ID to a sequence of its task IDs,
+            which is usually a range.
+    """
+    def __init__(self, job_graph, task_ids):
+        self.job_graph = nx.DiGraph()
+        self.job_graph.add_nodes_from(job_graph)
+        self.job_graph.add_edges_from(job_graph.edges)
+        self._task_ids = dict(task_ids)
+        self.edges = TaskEdges(self)
+
+    def task_ids(self, job_id):
+        """The task IDs of one job."""
+        return self._task_ids[job_id]
+
+    def tasks_of_job(self, job_id):
+        """The tasks of one job, as ``(job_id, task_id)``."""
+        return [(job_id, task_id) for task_id in self._task_ids[job_id]]
+
+    def __iter__(self):
+        for job_id in nx.topological_sort(self.job_graph):
+            yield from self.tasks_of_job(job_id)
+
+    def __len__(self):
+        return sum(len(ids) for ids in self._task_ids.values())
+
+    def __contains__(self, task):
+        job_id, task_id = task
+        return job_id in self._task_ids and task_id in self._task_ids[job_id]
+
+    def predecessors(self, task):
+        for job_pred in self.job_graph.predecessors(task[0]):
+            yield from self.tasks_of_job(job_pred)
+
+    def successors(self, task):
+        for job_succ in self.job_graph.successors(task[0]):
+            yield from self.tasks_of_job(job_succ)
+
+    def copy(self):
+        return TaskGraph(self.job_graph, self._task_ids)
+
+    def remove_nodes_from(self, tasks):
+        """Removes tasks. A job with no tasks left is removed, with its
+        edges, as it would be from a graph with a node for each task."""
+        removed = dict()
+        for job_id, task_id in tasks:
+            removed.setdefault(job_id, set()).add(task_id)
+        for job_id, task_ids in removed.items():
+            if job_id not in self._task_ids:
+                continue
+            remaining = [task_id for task_id in self._task_ids[job_id]
+                         if task_id not in task_ids]
+            if remaining:
+                self._task_ids[job_id] = remaining
+            else:
+                del self._task_ids[job_id]
+                self.job_graph.remove_node(job_id)
+
+
+class TaskEdges:
+    """The task-to-task edges that a ``TaskGraph`` implies, which
+    are counted and checked without making each of them."""
+    def __init__(self, task_graph):
+        self._graph = task_graph
+
+    def __len__(self):
+        return sum(
+            len(self._graph.task_ids(u)) * len(self._graph.task_ids(v))
+            for u, v in self._graph.job_graph.edges
+        )
+
+    def __iter__(self):
+        for u, v in self._graph.job_graph.edges:
+            for u_task in self._graph.tasks_of_job(u):
+                for v_task in self._graph.tasks_of_job(v):
+                    yield u_task, v_task
+
+    def __contains__(self, edge):
+        u_task, v_task = edge
+        return (
+            u_task in self._graph and v_task in self._graph and
+            self._graph.job_graph.has_edge(u_task[0], v_task[0])
+        )
+
+
+class ReadyArrayTasks:
+    """
+    Tracks which tasks of a ``TaskGraph`` are ready to run as tasks
+    complete, without searching the graph for them each time. It counts,
+    for each job, the tasks of the jobs it depends on that haven't
+    completed, so completing a task costs time proportional to the
+    number of jobs that depend on its job, and a job's tasks all
+    become ready when that count reaches zero.
+
+    Args:
+        task_graph (TaskGraph): The graph of tasks.
+    """
+    def __init__(self, task_graph):
+        self._graph = task_graph
+        job_graph = task_graph.job_graph
+        self._waiting = {
+            job_id: sum(len(task_graph.task_ids(pred))
+                        for pred in job_graph.predecessors(job_id))
+            for job_id in job_graph
+        }
+        # Ready, but not complete, in the order they became ready.
+        self._ready = {
+            task: None
+            for job_id in execution_ordered(job_graph)
+            if self._waiting[job_id] == 0
+            for task in task_graph.tasks_of_job(job_id)
+        }
+        self.completed = set()
+
+    @property
+    def ready(self):
+        """Tasks that can run and haven't completed."""
+        return list(self._ready)
+
+    def complete(self, task):
+        """
+        Mark a task as complete.
+
+        Args:
+            task: A ``(job_id, task_id)`` in the graph.
+
+        Returns:
+            List: Tasks that became ready because this one completed.
+        """
+        if task in self.completed:
+            return list()
+        self.completed.add(task)
+        self._ready.pop(task, None)
+        newly_ready = list()
+        for successor in self._graph.job_graph.successors(task[0]):
+            self._waiting[successor] -= 1
+            if self._waiting[successor] == 0:
+                successor_tasks = self._graph.tasks_of_job(successor)
+                self._ready.update((task, None) for task in successor_tasks)
+                newly_ready.extend(successor_tasks)
+        return newly_ready
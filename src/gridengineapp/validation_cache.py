@@ -0,0 +1,159 @@
+"""
+Remembers whether files were valid, so that checking a file that
+hasn't changed since it was last validated costs a ``stat``, instead
+of opening it to read its datasets or keys. Results are in a SQLite
+database in a directory on this host, in write-ahead-log mode, so
+that the processes of a local run can read and write it at once.
+A result applies only while the file has the size and modification
+time it had when it was validated.
+"""
+import os
+from logging import getLogger
+from threading import Lock
+from time import time
+
+from .config import configuration, shared_directory
+
+try:
+    import sqlite3
+except ImportError:
+    sqlite3 = None
+
+LOGGER = getLogger(__name__)
+# Most paths to ask about in one query.
+LOOKUP_CHUNK = 500
+# The cache for this process, with the process ID that opened it.
+_CACHE = None
+_CACHE_LOCK = Lock()
+
+
+class ValidationCache:
+    """
+    Validation results of files, by path and by the kind of
+    validation, which names the entity class and what it requires.
+    When there are more than ``maxsize`` results, the oldest
+    are dropped. Threads may share it.
+
+    Args:
+        path (Path): The database file.
+        maxsize (int): How many results to keep.
+    """
+    def __init__(self, path, maxsize):
+        self.path = path
+        self.maxsize = maxsize
+        self._lock = Lock()
+        self._connection = sqlite3.connect(
+            str(path), timeout=30, check_same_thread=False,
+            isolation_level=None,
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS validations (
+                path TEXT, kind TEXT, size INTEGER, mtime_ns INTEGER,
+                result TEXT, stored REAL, PRIMARY KEY (path, kind))
+        """)
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS by_stored ON validations (stored)")
+        self._count = self._connection.execute(
+            "SELECT count(*) FROM validations").fetchone()[0]
+
+    def lookup(self, signatures):
+        """
+        Results that are still current.
+
+        Args:
+            signatures (List[Tuple]): Each is ``(path, kind, size,
+                mtime_ns)`` of a file as it is now.
+
+        Returns:
+            Dict: From signature to its result, which is None
+            for a valid file or an error string, for those
+            signatures that have a result.
+        """
+        wanted = set(signatures)
+        paths = sorted({signature[0] for signature in wanted})
+        found = dict()
+        try:
+            with self._lock:
+                for begin in range(0, len(paths), LOOKUP_CHUNK):
+                    chunk = paths[begin:begin + LOOKUP_CHUNK]
+                    rows = self._connection.execute(
+                        f"SELECT path, kind, size, mtime_ns, result "
+                        f"FROM validations WHERE path IN "
+                        f"({', '.join('?' * len(chunk))})",
+                        chunk,
+                    )
+                    for path, kind, size, mtime_ns, result in rows:
+                        if (path, kind, size, mtime_ns) in wanted:
+                            found[(path, kind, size, mtime_ns)] = result
+        except sqlite3.Error as read_error:
+            LOGGER.debug(f"Validation cache unreadable: {read_error}")
+        return found
+
+    def store(self, results):
+        """
+        Args:
+            results (Dict): From signature, as for ``lookup``,
+                to the result of validating that file.
+        """
+        if not results:
+            return
+        now = time()
+        try:
+            with self._lock:
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO validations "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [signature + (result, now)
+                     for (signature, result) in results.items()],
+                )
+                self._count += len(results)
+                if self._count > self.maxsize:
+                    self._evict()
+        except sqlite3.Error as write_error:
+            LOGGER.debug(f"Validation cache unwritable: {write_error}")
+
+    def _evict(self):
+        """Drops the oldest results, leaving room to grow, so
+        that eviction doesn't happen on every store."""
+        keep = self.maxsize * 9 // 10
+        self._connection.execute("""
+            DELETE FROM validations WHERE rowid IN (
+                SELECT rowid FROM validations ORDER BY stored, rowid
+                LIMIT max(0, (SELECT count(*) FROM validations) - ?))
+        """, (keep,))
+        self._count = self._connection.execute(
+            "SELECT count(*) FROM validations").fetchone()[0]
+
+    def close(self):
+        self._connection.close()
+
+
+def validation_cache():
+    """
+    The cache for this process, opened the first time it's needed.
+    A forked process opens its own, because SQLite connections can't
+    cross a fork.
+
+    Returns:
+        ValidationCache: Or None if the cache is turned off, by setting
+        ``validation-cache-size`` to zero, or can't be opened.
+    """
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is not None and _CACHE[0] == os.getpid():
+            return _CACHE[1]
+        cache = None
+        maxsize = int(configuration().get("validation-cache-size", "0"))
+        if sqlite3 is not None and maxsize > 0:
+            directory = shared_directory(
+                "validation-cache-directory", "validation")
+            try:
+                cache = ValidationCache(directory / "validation.db", maxsize)
+            except sqlite3.Error as open_error:
+                LOGGER.warning(
+                    f"Validating without a cache in {directory} "
+                    f"because it can't be opened: {open_error}")
+        _CACHE = (os.getpid(), cache)
+        return cache
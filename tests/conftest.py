@@ -1,9 +1,11 @@
+import tempfile
 from getpass import getuser
 from pathlib import Path
 
 import pytest
 
 import gridengineapp.process
+import gridengineapp.validation_cache
 from gridengineapp.config import configuration
 
 gridengineapp.process.BLOCK_QCALLS = True
@@ -15,6 +17,34 @@ def pytest_addoption(parser):
                     help="run functions requiring access to fair cluster")
 
 
+# Configured directories that tests, and the processes they start,
+# write to, so that each test has its own.
+SHARED_DIRECTORIES = [
+    "queue-catalog-directory", "qsub-shell-file-directory",
+    "local-run-directory", "manifest-directory",
+    "validation-cache-directory",
+]
+
+
+@pytest.fixture(autouse=True)
+def shared_directories(tmp_path_factory, monkeypatch):
+    """Points shared directories at a temporary directory for each
+    test, beside its tmp_path. Children read the configuration again,
+    so the temporary directory, under which they put these when not
+    on the cluster, is moved too."""
+    shared = tmp_path_factory.mktemp("shared")
+    for key in SHARED_DIRECTORIES:
+        monkeypatch.setitem(
+            configuration(), key, str(shared / key.rsplit("-", 1)[0]))
+    monkeypatch.setenv("TMPDIR", str(shared))
+    monkeypatch.setattr(tempfile, "tempdir", str(shared))
+    validation_module = gridengineapp.validation_cache
+    monkeypatch.setattr(validation_module, "_CACHE", None)
+    yield shared
+    if validation_module._CACHE and validation_module._CACHE[1]:
+        validation_module._CACHE[1].close()
+
+
 @pytest.fixture
 def fair(request):
     return FairDbFuncArg(request)
@@ -1,8 +1,10 @@
 from configparser import ConfigParser
+from getpass import getuser
 from pathlib import Path
 
 from gridengineapp.config import (
-    shell_directory, configuration, installed_config_parsers
+    shell_directory, configuration, installed_config_parsers,
+    shared_directory,
 )
 
 
@@ -17,6 +19,14 @@ def test_shell_directory():
     assert shell_dir.is_dir()
 
 
+def test_fallback_directory_is_per_user(tmp_path, monkeypatch):
+    monkeypatch.setitem(
+        configuration(), "local-run-directory", "/not-a-cluster/{user}/runs")
+    run_dir = shared_directory("local-run-directory", "runs")
+    assert run_dir.name == f"runs-{getuser()}"
+    assert run_dir.is_dir()
+
+
 def test_use_outside_configuration():
     """Verify that external config adds to internal config."""
     parser = ConfigParser()
@@ -0,0 +1,123 @@
+from random import Random
+
+import networkx as nx
+import pytest
+
+from gridengineapp import graph_choice
+from gridengineapp.graph_choice import execution_ordered, jobs_not_done
+
+np = pytest.importorskip("numpy")
+from gridengineapp.csr_graph import CSRGraph  # noqa: E402
+
+
+def random_dag(node_cnt, edge_cnt, seed):
+    """A DAG with tuple identifiers, listed out of order."""
+    rng = Random(seed)
+    graph = nx.DiGraph()
+    nodes = [(location, "both") for location in range(node_cnt)]
+    rng.shuffle(nodes)
+    graph.add_nodes_from(nodes)
+    for _ in range(edge_cnt):
+        u, v = sorted(rng.sample(range(node_cnt), 2))
+        graph.add_edge((u, "both"), (v, "both"))
+    return graph
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_csr_descendants_match(seed):
+    graph = random_dag(200, 400, seed)
+    compact = CSRGraph.from_networkx(graph)
+    starts = list(graph)[:3]
+    expected = set(starts)
+    for start in starts:
+        expected |= nx.descendants(graph, start)
+    reached = compact.descendants(compact.mask(starts))
+    assert set(compact.identifiers_of(reached)) == expected
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_csr_topological_levels(seed):
+    graph = random_dag(200, 400, seed)
+    compact = CSRGraph.from_networkx(graph)
+    level_of = {
+        compact.identifiers[node_idx]: level_idx for (level_idx, level)
+        in enumerate(compact.topological_levels())
+        for node_idx in level.tolist()
+    }
+    assert len(level_of) == len(graph)
+    assert all(level_of[u] < level_of[v] for u, v in graph.edges)
+
+
+def test_csr_cycle_has_no_order():
+    compact = CSRGraph.from_networkx(nx.DiGraph([(0, 1), (1, 2), (2, 1)]))
+    with pytest.raises(nx.NetworkXUnfeasible):
+        compact.topological_levels()
+
+
+def test_compact_graph_made_once_per_graph(monkeypatch):
+    made = list()
+    from_networkx = CSRGraph.from_networkx
+
+    def count_made(graph):
+        made.append(graph)
+        return from_networkx(graph)
+
+    monkeypatch.setattr(CSRGraph, "from_networkx", count_made)
+    graph = random_dag(100, 200, 4)
+    first = list(execution_ordered(graph))
+    graph_choice.topological_levels(graph)
+    assert list(execution_ordered(graph)) == first
+    assert len(made) == 1
+    graph.remove_node(next(iter(graph)))
+    assert len(list(execution_ordered(graph))) == 99
+    assert len(made) == 2
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_execution_ordered_matches_networkx(seed, monkeypatch):
+    graph = random_dag(300, 500, seed)
+    compact_order = list(execution_ordered(graph))
+    monkeypatch.setattr(graph_choice, "CSRGraph", None)
+    assert compact_order == list(execution_ordered(graph))
+
+
+def one_at_a_time_not_done(job_graph, job_done):
+    """How jobs_not_done marked jobs when it checked them in order."""
+    not_done = set()
+    for check in nx.topological_sort(job_graph):
+        if check not in not_done and not job_done(check):
+            not_done |= {check} | nx.descendants(job_graph, check)
+    return not_done
+
+
+@pytest.mark.parametrize("compact", [True, False])
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_jobs_not_done_matches_one_at_a_time(seed, compact, monkeypatch):
+    if not compact:
+        monkeypatch.setattr(graph_choice, "CSRGraph", None)
+    graph = random_dag(300, 500, seed)
+    rng = Random(seed)
+    done = {node: rng.random() < 0.9 for node in graph}
+    asked = list()
+
+    def job_done(job_id):
+        asked.append(job_id)
+        return done[job_id]
+
+    expected = one_at_a_time_not_done(graph, job_done)
+    expected_asked = set(asked)
+    asked.clear()
+    assert set(jobs_not_done(graph, job_done, max_workers=4)) == expected
+    assert len(asked) == len(expected_asked)
+    assert set(asked) == expected_asked
+
+
+@pytest.mark.parametrize("compact", [True, False])
+def test_topological_levels(compact, monkeypatch):
+    if not compact:
+        monkeypatch.setattr(graph_choice, "CSRGraph", None)
+    graph = nx.DiGraph([(0, 1), (0, 2), (1, 3), (2, 3), (4, 3)])
+    levels = graph_choice.topological_levels(graph)
+    assert [set(level) for level in levels] == [{0, 4}, {1, 2}, {3}]
+    with pytest.raises(nx.NetworkXUnfeasible):
+        graph_choice.topological_levels(nx.DiGraph([(0, 1), (1, 0)]))
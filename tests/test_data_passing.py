@@ -1,6 +1,14 @@
+import os
+import shutil
 from copy import deepcopy
 
-from gridengineapp.data_passing import PandasFile, ShelfFile, FileEntity
+import pytest
+
+from gridengineapp import Job
+from gridengineapp.data_passing import (
+    PandasFile, ParquetFile, ShelfFile, FileEntity, DirectoryListings,
+    validate_entities, shared_listings, stored_columns,
+)
 
 
 def test_file_path_constructed(tmp_path):
@@ -101,3 +109,149 @@ def test_shelf_remove(tmp_path):
     assert shelf.validate() is None
     shelf.remove()
     assert shelf.validate() is not None
+
+
+def test_validate_does_not_make_directory(tmp_path):
+    db = FileEntity(tmp_path / "subdir" / "my.db")
+    assert validate_entities([db]) == [f"File {db._file_path} not found"]
+    assert not (tmp_path / "subdir").exists()
+
+
+def test_path_makes_directory_again_after_removal(tmp_path):
+    entity = FileEntity(tmp_path / "subdir" / "out.txt")
+    entity.path.write_text("first")
+    shutil.rmtree(tmp_path / "subdir")
+    entity.path.write_text("second")
+    assert entity.validate() is None
+
+
+def test_validate_outside_shared_listings_asks_each_file(
+        tmp_path, monkeypatch):
+    for name in ["a.txt", "b.txt"]:
+        (tmp_path / name).write_text("data")
+    monkeypatch.setattr(
+        os, "scandir", lambda directory: pytest.fail("Listed directory"))
+    entities = [FileEntity(tmp_path / name)
+                for name in ["a.txt", "b.txt", "c.txt"]]
+    assert [error is None for error in validate_entities(entities)] == \
+        [True, True, False]
+
+
+def test_listings_list_each_directory_once(tmp_path, monkeypatch):
+    for name in ["a.hdf", "b.hdf"]:
+        (tmp_path / name).write_text("data")
+    listed = list()
+    real_scandir = os.scandir
+
+    def counting_scandir(directory):
+        listed.append(directory)
+        return real_scandir(directory)
+
+    monkeypatch.setattr(os, "scandir", counting_scandir)
+    listings = DirectoryListings()
+    assert listings.exists(tmp_path / "a.hdf")
+    assert listings.size(tmp_path / "b.hdf") == 4
+    assert not listings.exists(tmp_path / "c.hdf")
+    assert listings.size(tmp_path / "c.hdf") is None
+    assert not listings.exists(tmp_path / "missing" / "d.hdf")
+    assert listed == [tmp_path, tmp_path / "missing"]
+
+
+def test_validate_entities_matches_validate(tmp_path):
+    written = FileEntity(tmp_path / "written.txt")
+    written.mock()
+    shelf = ShelfFile(tmp_path / "my.shelf", required_keys={"hi"})
+    shelf.mock()
+    missing = ShelfFile(tmp_path / "other.shelf")
+    entities = [written, FileEntity(tmp_path / "not.txt"), shelf, missing]
+    assert validate_entities(entities) == [e.validate() for e in entities]
+
+
+class AlwaysThere(FileEntity):
+    def validate(self):
+        return None
+
+
+def test_validate_entities_respects_overrides(tmp_path):
+    assert validate_entities([AlwaysThere(tmp_path / "nope")]) == [None]
+
+
+def test_shared_listings_across_jobs(tmp_path):
+    jobs = [Job(), Job()]
+    for job_idx, job in enumerate(jobs):
+        job.outputs["out"] = FileEntity(tmp_path / f"{job_idx}.txt")
+    jobs[0].outputs["out"].mock()
+    with shared_listings() as listings:
+        assert [job.done() for job in jobs] == [True, False]
+        # The listing was taken once, so it doesn't see this file.
+        jobs[1].outputs["out"].mock()
+        assert not jobs[1].done()
+        assert listings.names(tmp_path) == {"0.txt"}
+    assert jobs[1].done()
+
+
+def test_stored_columns_without_reading(tmp_path, mocker):
+    pd = pytest.importorskip("pandas")
+    path = tmp_path / "frames.hdf"
+    frame = pd.DataFrame(dict(a=[1, 2], b=[3.0, 4.0]))
+    frame.to_hdf(path, key="fixed", format="fixed")
+    frame.to_hdf(path, key="table", format="table")
+    read = mocker.spy(pd.HDFStore, "get")
+    columns = stored_columns(path, ["fixed", "table", "missing"])
+    assert columns == dict(
+        fixed={"a", "b"}, table={"a", "b"}, missing=None)
+    assert read.call_count == 0
+
+
+def test_stored_columns_cached_until_file_changes(tmp_path, mocker):
+    pd = pytest.importorskip("pandas")
+    path = tmp_path / "frames.hdf"
+    pd.DataFrame(dict(a=[1])).to_hdf(path, key="data", format="fixed")
+    opened = mocker.spy(pd.HDFStore, "open")
+    assert stored_columns(path, ["data"]) == dict(data={"a"})
+    assert stored_columns(path, ["data"]) == dict(data={"a"})
+    assert opened.call_count == 1
+    pd.DataFrame(dict(a=[1], b=[2])).to_hdf(
+        path, key="data", format="fixed", mode="w")
+    opened.reset_mock()
+    assert stored_columns(path, ["data"]) == dict(data={"a", "b"})
+    assert opened.call_count == 1
+
+
+def test_parquet_validate_from_footer(tmp_path):
+    pytest.importorskip("pyarrow")
+    path = tmp_path / "frame.parquet"
+    ParquetFile(path, required_columns=["a", "b"], rows=3).mock()
+    assert ParquetFile(path, ["a"], rows=3).validate() is None
+    missing = ParquetFile(path, ["a", "c"]).validate()
+    assert "['c']" in missing
+    assert "rows" in ParquetFile(path, rows=4).validate()
+    assert ParquetFile(tmp_path / "none.parquet").validate() is not None
+
+
+def test_parquet_truncated_is_invalid(tmp_path):
+    pytest.importorskip("pyarrow")
+    path = tmp_path / "frame.parquet"
+    entity = ParquetFile(path, required_columns=["a"], rows=3)
+    entity.mock()
+    path.write_bytes(path.read_bytes()[:20])
+    assert "unreadable" in entity.validate()
+    job = Job()
+    job.outputs["out"] = entity
+    assert not job.done()
+    path.write_text("not parquet")
+    assert "unreadable" in validate_entities([entity])[0]
+
+
+def test_parquet_read_selected(tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    pq = pytest.importorskip("pyarrow.parquet")
+    path = tmp_path / "frame.parquet"
+    table = pa.table(dict(a=list(range(10)), b=list(range(10, 20))))
+    pq.write_table(table, str(path), row_group_size=4)
+    entity = ParquetFile(path, ["a", "b"], rows=10)
+    assert validate_entities([entity]) == [None]
+    assert entity.read().num_rows == 10
+    just_a = entity.read(columns=["a"], row_groups=[1])
+    assert just_a.column_names == ["a"]
+    assert just_a.column("a").to_pylist() == [4, 5, 6, 7]
@@ -0,0 +1,83 @@
+import os
+from time import time
+
+import networkx as nx
+import pytest
+
+from gridengineapp import Job, IntegerIdentifier
+from gridengineapp.graph_snapshot import (
+    write_graph_snapshot, GraphSnapshot, snapshot_arguments
+)
+
+
+def diamond():
+    return nx.DiGraph([
+        (IntegerIdentifier(0), IntegerIdentifier(1)),
+        (IntegerIdentifier(0), IntegerIdentifier(2)),
+        (IntegerIdentifier(1), IntegerIdentifier(3)),
+        (IntegerIdentifier(2), IntegerIdentifier(3)),
+    ])
+
+
+class DiamondApp:
+    @staticmethod
+    def job(_identifier):
+        return Job()
+
+
+def test_snapshot_round_trip(tmp_path):
+    graph = diamond()
+    snapshot = write_graph_snapshot(
+        DiamondApp(), graph, lambda jid: ["--job-id", int(jid)], tmp_path)
+    reader = GraphSnapshot(snapshot.path)
+    assert len(reader) == 4
+    for job_id, job_idx in snapshot.index.items():
+        node = reader.node(job_idx)
+        assert node.identifier == job_id
+        assert node.arguments == ["--job-id", str(job_id)]
+        assert node.resources["threads"] == 1
+        predecessors = {reader.node(p).identifier for p in node.predecessors}
+        assert predecessors == set(graph.predecessors(job_id))
+    with pytest.raises(IndexError):
+        reader.node(4)
+    reader.close()
+    assert snapshot_arguments(snapshot, IntegerIdentifier(3)) == [
+        "--graph-snapshot", str(snapshot.path), "--snapshot-index", "3"]
+
+
+def test_snapshot_reused_for_same_contents(tmp_path):
+    def arguments(jid):
+        return ["--job-id", int(jid)]
+
+    first = write_graph_snapshot(DiamondApp(), diamond(), arguments, tmp_path)
+    inode = first.path.stat().st_ino
+    again = write_graph_snapshot(DiamondApp(), diamond(), arguments, tmp_path)
+    assert again.path == first.path
+    assert again.path.stat().st_ino == inode
+    other = write_graph_snapshot(
+        DiamondApp(), diamond(), lambda jid: ["--other", int(jid)], tmp_path)
+    assert other.path != first.path
+
+
+def test_unpicklable_identifiers_have_no_snapshot(tmp_path):
+    graph = nx.DiGraph()
+    graph.add_node(lambda: None)
+    snapshot = write_graph_snapshot(DiamondApp(), graph, list, tmp_path)
+    assert snapshot is None
+    assert snapshot_arguments(snapshot, 7) == []
+
+
+def test_unused_snapshots_age_out(tmp_path):
+    def arguments(jid):
+        return ["--job-id", int(jid)]
+
+    old = write_graph_snapshot(DiamondApp(), diamond(), arguments, tmp_path)
+    reused = write_graph_snapshot(
+        DiamondApp(), diamond(), lambda jid: ["--other", int(jid)], tmp_path)
+    long_ago = time() - 30 * 24 * 3600
+    for snapshot in [old, reused]:
+        os.utime(snapshot.path, (long_ago, long_ago))
+    write_graph_snapshot(
+        DiamondApp(), diamond(), lambda jid: ["--other", int(jid)], tmp_path)
+    assert not old.path.exists()
+    assert reused.path.exists()
@@ -0,0 +1,59 @@
+from types import SimpleNamespace
+
+import pytest
+
+from gridengineapp import Job
+from gridengineapp.job_cache import (
+    JobCache, cached_job, job_resources, clear_job_cache
+)
+
+
+class CountingApp:
+    def __init__(self):
+        self.made = list()
+
+    def job(self, identifier):
+        self.made.append(identifier)
+        return Job()
+
+
+def test_cached_job_makes_each_job_once():
+    app = CountingApp()
+    first = cached_job(app, 3)
+    assert cached_job(app, 3) is first
+    assert job_resources(app, 3)["threads"] == 1
+    cached_job(app, 4)
+    assert app.made == [3, 4]
+    clear_job_cache(app)
+    assert cached_job(app, 3) is not first
+    assert app.made == [3, 4, 3]
+
+
+def test_job_cache_drops_least_recently_used():
+    app = CountingApp()
+    cache = JobCache(2)
+    cache.job(app, "a")
+    cache.job(app, "b")
+    cache.job(app, "a")
+    cache.job(app, "c")  # Drops b, which was used longest ago.
+    assert len(cache) == 2
+    cache.job(app, "a")
+    cache.job(app, "b")
+    assert app.made == ["a", "b", "c", "b"]
+
+
+def test_job_resources_are_read_only():
+    app = CountingApp()
+    resources = job_resources(app, 1)
+    assert job_resources(app, 1) is resources
+    with pytest.raises(TypeError):
+        resources["threads"] = 4
+
+
+def test_unhashable_app_is_not_cached():
+    made = list()
+    app = SimpleNamespace(job=lambda jid: made.append(jid) or Job())
+    cached_job(app, 1)
+    cached_job(app, 1)
+    assert job_resources(app, 1)["memory_gigabytes"] == 1
+    assert made == [1, 1, 1]
@@ -0,0 +1,81 @@
+import json
+
+from gridengineapp.journal import Journal, TaskJournal, SubmissionLedger
+
+
+def test_journal_round_trip(tmp_path):
+    journal = Journal(tmp_path / "run.journal")
+    journal.append(event="start", task="a")
+    journal.append(event="finish", task="a", returncode=0)
+    journal.close()
+    records = list(journal.records())
+    assert [r["event"] for r in records] == ["start", "finish"]
+
+
+def test_journal_skips_partial_line(tmp_path):
+    journal_path = tmp_path / "run.journal"
+    journal = TaskJournal(journal_path, str)
+    journal.started([1])
+    journal.finished([1], 0)
+    journal.started([2])
+    journal.close()
+    with journal_path.open("a") as stream:
+        stream.write(json.dumps(dict(event="finish", tasks=["2"]))[:12])
+    assert TaskJournal(journal_path, str).completed_keys() == {"1"}
+
+
+def test_resume_after_partial_line(tmp_path):
+    journal_path = tmp_path / "run.journal"
+    journal = TaskJournal(journal_path, str)
+    journal.started([1])
+    journal.close()
+    with journal_path.open("a") as stream:
+        stream.write(json.dumps(dict(event="finish", tasks=["1"]))[:12])
+    resumed = TaskJournal(journal_path, str, resume=True)
+    resumed.finished([1], 0)
+    resumed.close()
+    assert resumed.completed_keys() == {"1"}
+
+
+def test_task_journal_rerun_not_complete(tmp_path):
+    journal = TaskJournal(tmp_path / "run.journal", str)
+    journal.started([1])
+    journal.finished([1], 0)
+    journal.started([2])
+    journal.finished([2], 1)
+    journal.close()
+    resumed = TaskJournal(tmp_path / "run.journal", str, resume=True)
+    assert resumed.completed_keys() == {"1"}
+    resumed.started([1])
+    resumed.close()
+    assert resumed.completed_keys() == set()
+
+
+def test_new_journal_starts_over(tmp_path):
+    journal = TaskJournal(tmp_path / "run.journal", str)
+    journal.started([1])
+    journal.finished([1], 0)
+    journal.close()
+    again = TaskJournal(tmp_path / "run.journal", str)
+    again.started([2])
+    again.close()
+    assert len(list(again.records())) == 1
+
+
+def test_task_journal_records_blocks(tmp_path):
+    journal = TaskJournal(tmp_path / "run.journal", str)
+    journal.started([1, 2, 3])
+    journal.finished([1, 2, 3], 0)
+    journal.started([4, 5])
+    journal.close()
+    assert journal.completed_keys() == {"1", "2", "3"}
+
+
+def test_ledger_keeps_last_grid_id(tmp_path):
+    ledger = SubmissionLedger(tmp_path / "run.ledger", str)
+    ledger.submitted({1: "101", 2: "102.1"})
+    ledger.close()
+    ledger = SubmissionLedger(tmp_path / "run.ledger", str)
+    ledger.submitted({1: "201"})
+    ledger.close()
+    assert ledger.grid_ids() == {"1": "201", "2": "102.1"}
@@ -11,9 +11,20 @@ import pytest
 from gridengineapp import (
     Job, FileEntity, IntegerIdentifier, entry, check_complete,
 )
-from gridengineapp.argument_handling import setup_args_for_job
-from gridengineapp.graph_choice import jobs_not_done
-from gridengineapp.main import job_task_ids, expand_task_arrays
+from gridengineapp.argument_handling import (
+    setup_args_for_job, execution_parser
+)
+from gridengineapp.graph_choice import jobs_not_done, critical_path_lengths
+from gridengineapp.graph_snapshot import (
+    write_graph_snapshot, snapshot_arguments
+)
+from gridengineapp.job_table import write_job_table
+from gridengineapp.main import (
+    job_task_ids, expand_task_arrays, task_block_size, RunNext
+)
+from gridengineapp.queue_catalog import QueueCatalog
+import gridengineapp.run_grid_app as run_grid_app
+from gridengineapp.task_graph import TaskGraph
 
 LOGGER = getLogger(__name__)
 
@@ -132,6 +143,213 @@ def test_local_all_jobs(tmp_path):
     assert len(list(data_dir.glob("*.hdf"))) == 13
 
 
+class JobsWithoutGraph(Application):
+    """Can make jobs but not the job graph, as for a child process."""
+    def job_graph(self):
+        raise AssertionError("Child made the job graph.")
+
+
+def test_local_job_from_snapshot(tmp_path):
+    app = Application()
+    app.base_directory = tmp_path
+    snapshot = write_graph_snapshot(
+        app, app.job_graph(), app.job_id_to_arguments, tmp_path)
+    args = ["--base-directory", str(tmp_path)] + snapshot_arguments(
+        snapshot, IntegerIdentifier(4))
+    assert entry(JobsWithoutGraph(), args) == 0
+    data_files = (tmp_path / "data").glob("*.hdf")
+    assert [data_file.name for data_file in data_files] == ["4.hdf"]
+
+
+def test_local_job_from_job_table(tmp_path):
+    table = write_job_table([
+        ["--job-id", str(job_id), "--base-directory", str(tmp_path)]
+        for job_id in [4, 7, 9]
+    ], tmp_path)
+    args = ["--job-table", str(table), "--task-id", "2"]
+    assert entry(Application(), args) == 0
+    data_files = (tmp_path / "data").glob("*.hdf")
+    assert [data_file.name for data_file in data_files] == ["7.hdf"]
+
+
+def test_launch_collapses_leaves_into_arrays(tmp_path, monkeypatch):
+    submitted = list()
+
+    def fake_qsub(template, command):
+        submitted.append((template, command))
+        return f"{100 + len(submitted)}" + (".1-3:1" if template.t else "")
+
+    monkeypatch.setattr(run_grid_app, "qsub", fake_qsub)
+    monkeypatch.setattr(
+        run_grid_app, "queue_catalog",
+        lambda: QueueCatalog({"general.q": 10000}))
+    monkeypatch.setattr(
+        run_grid_app, "executable_for_job", lambda app: "app.py")
+    app = Application()
+    app.base_directory = tmp_path
+    args = ["--grid-engine", "--base-directory", str(tmp_path),
+            "--sibling-arrays", "2"]
+    parser, args_to_remove = execution_parser()
+    grid_id = run_grid_app.launch_jobs(
+        app, app.add_arguments(parser).parse_args(args), args,
+        args_to_remove)
+    # The root, three parents, and an array of leaves under each parent.
+    assert len(submitted) == 7
+    assert len(grid_id) == 13
+    arrays = [(template, command) for (template, command) in submitted
+              if template.t]
+    assert [template.t for template, _command in arrays] == ["1-3"] * 3
+    for template, command in arrays:
+        assert len(template.hold_jid) == 1
+        table = Path(command[command.index("--job-table") + 1])
+        assert table.exists()
+    leaf_ids = [grid_id[IntegerIdentifier(leaf)] for leaf in range(4, 13)]
+    assert sorted(leaf_id.split(".")[1] for leaf_id in leaf_ids) == \
+        ["1", "1", "1", "2", "2", "2", "3", "3", "3"]
+
+
+def test_launch_submits_each_job_by_default(tmp_path, monkeypatch):
+    submitted = list()
+
+    def fake_qsub(template, command):
+        submitted.append(template)
+        return f"{100 + len(submitted)}"
+
+    monkeypatch.setattr(run_grid_app, "qsub", fake_qsub)
+    monkeypatch.setattr(
+        run_grid_app, "queue_catalog",
+        lambda: QueueCatalog({"general.q": 10000}))
+    monkeypatch.setattr(
+        run_grid_app, "executable_for_job", lambda app: "app.py")
+    configured = list()
+    real_configure = run_grid_app.configure_qsub
+
+    def count_configure(name, job_id, *args, **kwargs):
+        configured.append(job_id)
+        return real_configure(name, job_id, *args, **kwargs)
+
+    monkeypatch.setattr(run_grid_app, "configure_qsub", count_configure)
+    app = Application()
+    app.base_directory = tmp_path
+    args = ["--grid-engine", "--base-directory", str(tmp_path)]
+    parser, args_to_remove = execution_parser()
+    grid_id = run_grid_app.launch_jobs(
+        app, app.add_arguments(parser).parse_args(args), args,
+        args_to_remove)
+    assert len(submitted) == 13
+    assert not any(template.t for template in submitted)
+    assert all("." not in job_grid_id for job_grid_id in grid_id.values())
+    assert len(configured) == len(set(configured)) == len(grid_id)
+
+
+def test_launch_again_keeps_queued_jobs(tmp_path, monkeypatch):
+    submitted = list()
+
+    def crash_after_parents(template, command):
+        if template.t:
+            raise RuntimeError("qsub was killed")
+        submitted.append(template)
+        return f"{100 + len(submitted)}"
+
+    monkeypatch.setattr(run_grid_app, "qsub", crash_after_parents)
+    monkeypatch.setattr(
+        run_grid_app, "queue_catalog",
+        lambda: QueueCatalog({"general.q": 10000}))
+    monkeypatch.setattr(
+        run_grid_app, "executable_for_job", lambda app: "app.py")
+    app = Application()
+    app.base_directory = tmp_path
+    args = ["--grid-engine", "--base-directory", str(tmp_path),
+            "--run-id", token_hex(4), "--sibling-arrays", "2"]
+    parser, args_to_remove = execution_parser()
+    parsed = app.add_arguments(parser).parse_args(args)
+    with pytest.raises(RuntimeError):
+        run_grid_app.launch_jobs(app, parsed, args, args_to_remove)
+    # The root and three parents were submitted before the crash.
+    assert len(submitted) == 4
+
+    # The root finished, and the parents are still queued.
+    app.job(IntegerIdentifier(0)).mock_run()
+    queued = [SimpleNamespace(job_id=str(grid_id), status={"queued"})
+              for grid_id in [102, 103, 104]]
+    monkeypatch.setattr(run_grid_app, "qstat_short", lambda: queued)
+    deleted = list()
+    monkeypatch.setattr(run_grid_app, "qdel", deleted.extend)
+    submitted.clear()
+    monkeypatch.setattr(
+        run_grid_app, "qsub",
+        lambda template, command: submitted.append(template) or "200.1-3:1")
+    grid_id = run_grid_app.launch_jobs(app, parsed, args, args_to_remove)
+    # Only the arrays of leaves are submitted, holding on the parents.
+    assert not deleted
+    assert len(submitted) == 3
+    assert sorted(template.hold_jid[0] for template in submitted) == \
+        ["102", "103", "104"]
+    assert grid_id[IntegerIdentifier(0)] == "101"
+
+    # Everything from the last launch is queued or done,
+    # so nothing is submitted.
+    queued = [SimpleNamespace(job_id=str(grid_id), status={"queued"})
+              for grid_id in [102, 103, 104, 200]]
+    submitted.clear()
+    assert run_grid_app.launch_jobs(
+        app, parsed, args, args_to_remove) == grid_id
+    assert not submitted
+    assert not deleted
+
+
+class ArrayJob(LocationJob):
+    def __init__(self, location_id, base_directory, task_cnt):
+        super().__init__(location_id, base_directory)
+        self.task_cnt = task_cnt
+
+    @property
+    def resources(self):
+        return dict(super().resources, task_cnt=self.task_cnt)
+
+
+class ArrayApplication(Application):
+    """Job 1 holds on job 0 task by task, but job 2 can't,
+    because it has a different number of tasks."""
+    def job_graph(self):
+        job_graph = nx.DiGraph()
+        for job_idx in [1, 2]:
+            job_graph.add_edge(
+                IntegerIdentifier(0), IntegerIdentifier(job_idx),
+                by_task=True)
+        return job_graph
+
+    def job(self, identifier):
+        task_cnt = 4 if int(identifier) == 2 else 3
+        return ArrayJob(int(identifier), self.base_directory, task_cnt)
+
+
+def test_launch_holds_by_task(tmp_path, monkeypatch):
+    submitted = dict()
+
+    def fake_qsub(template, command):
+        job_id = command[command.index("--job-id") + 1]
+        submitted[job_id] = template
+        return f"{100 + int(job_id)}.1-3:1"
+
+    monkeypatch.setattr(run_grid_app, "qsub", fake_qsub)
+    monkeypatch.setattr(
+        run_grid_app, "queue_catalog",
+        lambda: QueueCatalog({"general.q": 10000}))
+    monkeypatch.setattr(
+        run_grid_app, "executable_for_job", lambda app: "app.py")
+    app = ArrayApplication()
+    args = ["--grid-engine", "--base-directory", str(tmp_path)]
+    parser, args_to_remove = execution_parser()
+    run_grid_app.launch_jobs(
+        app, app.add_arguments(parser).parse_args(args), args,
+        args_to_remove)
+    assert submitted["1"].hold_jid_ad == ["100"]
+    assert submitted["1"].hold_jid == []
+    assert submitted["2"].hold_jid == ["100"]
+    assert submitted["2"].hold_jid_ad == []
+
+
 def test_local_continue_jobs(tmp_path):
     args = ["--job-id", "0", "--base-directory", str(tmp_path)]
     app = Application()
@@ -234,3 +452,53 @@ def test_expand_task_arrays_tiny():
     task_graph = expand_task_arrays(graph, app)
     assert len(graph) == len(task_graph)
     assert len(graph.edges) == len(task_graph.edges)
+
+
+def test_critical_path_lengths():
+    graph = nx.DiGraph()
+    graph.add_edges_from([(0, 1), (1, 2), (0, 3)])
+    graph.add_edge(3, 4, launch=True)
+    durations = {0: 1, 1: 2, 2: 3, 3: 10, 4: 100}
+    lengths = critical_path_lengths(graph, durations.get)
+    assert lengths == {0: 11, 1: 5, 2: 3, 3: 10, 4: 100}
+
+
+@pytest.mark.parametrize("task_cnt,memory,threads,expected", [
+    (10, 1, 1, 3),  # Four fit by memory.
+    (10, 1, 4, 5),  # Two fit by threads.
+    (10, 8, 1, 10),  # None fit, so all run in one.
+    (1, 1, 1, 1),
+    (10, 0, 1, 2),  # No memory, so eight fit by threads.
+])
+def test_task_block_size(task_cnt, memory, threads, expected):
+    resources = dict(
+        task_cnt=task_cnt, memory_gigabytes=memory, threads=threads)
+    limits = SimpleNamespace(memory=4, threads=8)
+    assert task_block_size(resources, limits) == expected
+
+
+def test_run_next_blocks_consecutive_tasks():
+    graph = TaskGraph(nx.DiGraph([("a", "b")]), dict(a=range(1, 7), b=[0]))
+    graph.remove_nodes_from([("a", 4)])
+    resources = dict(
+        a=dict(task_cnt=6, memory_gigabytes=1, threads=1,
+               run_time_minutes=1),
+        b=dict(memory_gigabytes=1, threads=1, run_time_minutes=1),
+    )
+    app = SimpleNamespace(
+        job=lambda job_id: SimpleNamespace(resources=resources[job_id]),
+        job_id_to_arguments=lambda job_id: ["--job-id", job_id],
+    )
+    limits = SimpleNamespace(memory=3, threads=8)
+    run_next = RunNext(app, graph, [], dict(), block_limits=limits)
+    run_next._executable = ["python"]
+    ready = run_next(set())
+    assert set(ready) == {("a", 1), ("a", 3), ("a", 5)}
+    assert ready[("a", 1)].tasks == [("a", 1), ("a", 2)]
+    assert ready[("a", 1)].args[-4:] == [
+        "--task-id", "1", "--last-task-id", "2"]
+    assert not hasattr(ready[("a", 3)], "tasks")
+    assert run_next(set()).keys() == ready.keys()
+    assert run_next.complete(("a", 1)) == dict()
+    assert run_next.complete(("a", 3)) == dict()
+    assert set(run_next.complete(("a", 5))) == {("b", 0)}
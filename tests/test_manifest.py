@@ -0,0 +1,120 @@
+import os
+
+import pytest
+
+from gridengineapp import Job, FileEntity, ShelfFile
+from gridengineapp import manifest
+from gridengineapp.data_passing import shared_listings
+from gridengineapp.manifest import (
+    input_fingerprint, record_manifest, manifest_current
+)
+from gridengineapp.shared_arrays import SharedArrays, SHARED_MEMORY_VARIABLE
+
+
+def make_job(tmp_path):
+    job = Job()
+    job.inputs["in"] = FileEntity(tmp_path / "in.txt")
+    job.outputs["out"] = FileEntity(tmp_path / "out.txt")
+    job.inputs["in"].path.write_text("input")
+    return job
+
+
+def run(job):
+    inputs = input_fingerprint(job)
+    job.outputs["out"].path.write_text("output")
+    record_manifest(job, inputs)
+
+
+def test_no_manifest_means_validate(tmp_path):
+    job = make_job(tmp_path)
+    assert manifest_current(job) is None
+    assert not job.done()
+    job.outputs["out"].mock()
+    assert job.done()
+
+
+def test_manifest_current_after_run(tmp_path):
+    job = make_job(tmp_path)
+    run(job)
+    assert manifest_current(job) is True
+    assert job.done()
+
+
+def test_changed_input_means_not_done(tmp_path):
+    job = make_job(tmp_path)
+    run(job)
+    (tmp_path / "in.txt").write_text("different input")
+    assert manifest_current(job) is False
+    assert not job.done()
+
+
+def test_changed_or_missing_output_means_not_done(tmp_path):
+    job = make_job(tmp_path)
+    run(job)
+    (tmp_path / "out.txt").write_text("truncated")
+    assert not job.done()
+    run(job)
+    assert job.done()
+    (tmp_path / "out.txt").unlink()
+    assert not job.done()
+
+
+def test_content_hash_forgives_touch(tmp_path, monkeypatch):
+    monkeypatch.setattr(manifest, "_use_hash", lambda: True)
+    job = make_job(tmp_path)
+    run(job)
+    stat = os.stat(tmp_path / "out.txt")
+    os.utime(tmp_path / "out.txt",
+             ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert manifest_current(job) is True
+    (tmp_path / "out.txt").write_text("OUTPUT")
+    assert manifest_current(job) is False
+
+
+def test_shelf_output_recorded_beside_its_path(tmp_path):
+    job = make_job(tmp_path)
+    job.outputs["out"] = ShelfFile(tmp_path / "out", required_keys={"one"})
+    inputs = input_fingerprint(job)
+    job.outputs["out"].mock()
+    record_manifest(job, inputs)
+    assert manifest_current(job) is True
+    assert job.done()
+    job.outputs["out"].remove()
+    assert not job.done()
+
+
+def test_no_manifest_for_arrays_in_shared_memory(tmp_path, monkeypatch):
+    np = pytest.importorskip("numpy")
+    monkeypatch.setenv(SHARED_MEMORY_VARIABLE, str(tmp_path / "shm"))
+    job = make_job(tmp_path)
+    job.outputs["arrays"] = SharedArrays(tmp_path / "a.npz", ["x"])
+    # A task of the run reads them, so they stay in shared memory.
+    segment = job.outputs["arrays"].segment
+    segment.parent.mkdir()
+    segment.with_suffix(".readers").touch()
+    inputs = input_fingerprint(job)
+    job.outputs["out"].path.write_text("output")
+    job.outputs["arrays"].write(dict(x=np.arange(3)))
+    record_manifest(job, inputs)
+    assert manifest_current(job) is None
+    assert job.done()
+
+
+def test_unwritable_manifest_only_warns(tmp_path, monkeypatch, caplog):
+    job = make_job(tmp_path)
+
+    def no_space(*args, **kwargs):
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(manifest.os, "replace", no_space)
+    run(job)
+    assert "Could not record" in caplog.text
+    assert manifest_current(job) is None
+
+
+def test_manifest_current_uses_shared_listings(tmp_path, monkeypatch):
+    job = make_job(tmp_path)
+    run(job)
+    with shared_listings():
+        monkeypatch.setattr(manifest.data_passing.os, "stat", None)
+        assert manifest_current(job) is True
@@ -1,33 +1,39 @@
+import os
 import random
+import signal
 import subprocess
 from argparse import Namespace
 from pathlib import Path
+from time import sleep, time
 
 import pytest
 
+import gridengineapp.multiprocess
+
 from gridengineapp.multiprocess import (
-    graph_do, NotEnoughResources, ChildProcessProblem
+    graph_do, NotEnoughResources, ChildProcessProblem, LocalResources,
+    MeasuredResources, AdmissionQueue,
 )
 
 DONE = list()
 
 
 class PopenObject:
+    """Stands in for a process that finishes when waited upon.
+    It has no pid, so the watcher waits on it with a thread."""
     def __init__(self, args, kwargs):
         self.args = args
         self.kwargs = kwargs
-        self.done = False
+        self.returncode = None
+
+    def wait(self):
+        sleep(random.uniform(0, 0.01))
+        DONE.append(self.args)
         self.returncode = 0
+        return self.returncode
 
     def poll(self):
-        assert not self.done
-        dice = random.uniform(0, 1)
-        if dice < 0.1:
-            self.done = True
-            DONE.append(self.args)
-            return True
-        else:
-            return None
+        return self.returncode
 
 
 def popen_ish(*args, **kwargs):
@@ -89,3 +95,266 @@ def test_graph_die():
 
     with pytest.raises(ChildProcessProblem):
         graph_do(run_next, 2, sleep_duration=0)
+
+
+def test_graph_does_not_wait_between_children():
+    """Short children shouldn't each cost a sleep_duration."""
+    if not Path("/bin/true").exists():
+        return
+    to_do = dict()
+    for i in range(20):
+        to_do[i] = Namespace(memory=1, args=["/bin/true"])
+
+    def run_next(completed):
+        return {x: y for (x, y) in to_do.items()
+                if x not in completed}
+
+    start = time()
+    graph_do(run_next, 2, sleep_duration=5)
+    assert time() - start < 5
+
+
+def test_local_resources_counts_threads():
+    resources = LocalResources(memory_limit=100, cpu_limit=64)
+    sixteen = Namespace(memory=1, threads=16)
+    for task_id in range(4):
+        assert resources.fits(sixteen)
+        resources.claim(task_id, sixteen)
+    assert not resources.fits(sixteen)
+    assert not resources.fits(Namespace(memory=1))
+    resources.release(2)
+    assert resources.fits(sixteen)
+
+
+def test_local_resources_too_many_threads_runs_alone():
+    resources = LocalResources(memory_limit=100, cpu_limit=4)
+    greedy = Namespace(memory=1, threads=32)
+    assert resources.fits(greedy)
+    resources.claim("greedy", greedy)
+    assert not resources.fits(Namespace(memory=1, threads=1))
+
+
+def test_local_resources_pins_disjoint_cores():
+    if not hasattr(os, "sched_getaffinity"):
+        return
+    available = sorted(os.sched_getaffinity(0))
+    resources = LocalResources(memory_limit=100, pin_cores=True)
+    pinned = set()
+    task_id = 0
+    while resources.fits(Namespace(memory=1, threads=1)):
+        cores = resources.claim(task_id, Namespace(memory=1, threads=1))
+        assert not set(cores) & pinned
+        pinned |= set(cores)
+        task_id += 1
+    assert pinned == set(available)
+    resources.release(0)
+    assert resources.claim("again", Namespace(memory=1)) == [available[0]]
+
+
+def test_graph_measures_memory():
+    if not (Path("/bin/sleep").exists() and Path("/proc/meminfo").exists()):
+        return
+    to_do = dict()
+    for i in range(3):
+        to_do[i] = Namespace(memory=1, args=["/bin/sleep", "0.5"])
+
+    def run_next(completed):
+        return {x: y for (x, y) in to_do.items()
+                if x not in completed}
+
+    result = graph_do(run_next, 2, sleep_duration=0.1, measure_memory=True)
+    assert result.completed == set(to_do.keys())
+    assert set(result.peak_memory.keys()) == set(to_do.keys())
+    assert all(0 < peak < 1 for peak in result.peak_memory.values())
+
+
+def test_measured_resources_count_claim_until_measured():
+    if not Path("/proc/meminfo").exists():
+        return
+    resources = MeasuredResources(
+        memory_limit=4, cpu_limit=4, reserve_gigabytes=0)
+    resources.claim("big", Namespace(memory=3))
+    assert not resources.fits(Namespace(memory=2))
+    resources.started("big", Namespace(pid=os.getpid()))
+    resources.sample()
+    assert resources.peaks["big"] < 3
+    assert resources.fits(Namespace(memory=2))
+
+
+def test_measured_charges_unmeasured_claims_to_host(monkeypatch):
+    monkeypatch.setattr(
+        gridengineapp.multiprocess, "host_available_gigabytes",
+        lambda: 5.0)
+    resources = MeasuredResources(
+        memory_limit=64, cpu_limit=64, reserve_gigabytes=1)
+    admitted = 0
+    while resources.fits(Namespace(memory=3)):
+        resources.claim(admitted, Namespace(memory=3))
+        admitted += 1
+    assert admitted == 1
+
+
+def test_measured_continues_when_all_running_are_stopped(monkeypatch):
+    available = [0.5]
+    monkeypatch.setattr(
+        gridengineapp.multiprocess, "host_available_gigabytes",
+        lambda: available[0])
+    monkeypatch.setattr(
+        gridengineapp.multiprocess, "process_tree_rss_gigabytes",
+        lambda pid: None)
+    signals = list()
+    monkeypatch.setattr(
+        gridengineapp.multiprocess.os, "kill",
+        lambda pid, signal_number: signals.append((pid, signal_number)))
+    resources = MeasuredResources(
+        memory_limit=64, cpu_limit=64, reserve_gigabytes=1)
+    for task_id, pid in [("A", 1), ("B", 2)]:
+        resources.claim(task_id, Namespace(memory=1))
+        resources.started(task_id, Namespace(pid=pid))
+    resources.sample()
+    assert signals == [(2, signal.SIGSTOP)]
+    # Between the reserve and twice the reserve, and A finishes.
+    available[0] = 1.5
+    resources.release("A")
+    assert signals[-1] == (2, signal.SIGCONT)
+    resources.sample()
+    assert signals[-1] == (2, signal.SIGCONT)
+    resources.release("B")
+    assert resources.fits(Namespace(memory=0.1))
+
+
+def test_graph_forks_functions(tmp_path):
+    to_do = dict()
+    for i in range(5):
+        marker = tmp_path / f"{i}.txt"
+        to_do[i] = Namespace(
+            memory=1, args=[str(i)],
+            function=lambda marker=marker: marker.write_text("x") and 0,
+        )
+
+    def run_next(completed):
+        return {x: y for (x, y) in to_do.items()
+                if x not in completed}
+
+    graph_do(run_next, 2)
+    assert len(list(tmp_path.glob("*.txt"))) == 5
+
+
+def test_forked_children_reaped_without_pidfd(tmp_path, monkeypatch):
+    """Without process file descriptors, a short task is reaped
+    when it finishes, not when a longer sibling does."""
+    monkeypatch.delattr(os, "pidfd_open", raising=False)
+
+    def task(name, duration):
+        def run():
+            (tmp_path / name).write_text(str(time()))
+            sleep(duration)
+            return 0
+        return Namespace(memory=1, args=[name], function=run)
+
+    to_do = dict(short=task("short", 0.1), long=task("long", 2))
+
+    def run_next(completed):
+        available = {x: y for (x, y) in to_do.items() if x not in completed}
+        if "short" in completed and "after" not in completed:
+            available["after"] = task("after", 0)
+        return available
+
+    begin = time()
+    graph_do(run_next, 4, cpu_limit=4)
+    started = float((tmp_path / "after").read_text()) - begin
+    assert started < 1.5
+
+
+def test_graph_forked_failure():
+    to_do = {0: Namespace(memory=1, args=["fails"], function=lambda: 7)}
+
+    def run_next(completed):
+        return {x: y for (x, y) in to_do.items()
+                if x not in completed}
+
+    with pytest.raises(ChildProcessProblem):
+        graph_do(run_next, 2)
+
+
+def test_admission_order_prefers_priority_then_memory():
+    waiting = AdmissionQueue([
+        ("short", Namespace(memory=1, priority=1)),
+        ("long", Namespace(memory=1, priority=9)),
+        ("big", Namespace(memory=4, priority=1)),
+        ("tiny", Namespace(memory=0.5, priority=1)),
+    ])
+    order = [task for (task, _description)
+             in waiting.fitting(lambda description: True)]
+    assert order == ["long", "big", "short", "tiny"]
+    assert len(waiting) == 0
+
+
+def test_admission_skips_claims_that_did_not_fit():
+    waiting = AdmissionQueue(
+        (task_idx, Namespace(memory=2)) for task_idx in range(10000))
+    waiting.add("small", Namespace(memory=1))
+    resources = LocalResources(memory_limit=5, cpu_limit=64)
+    asked = list()
+
+    def fits(description):
+        asked.append(description)
+        return resources.fits(description)
+
+    started = list()
+    for task, description in waiting.fitting(fits):
+        resources.claim(task, description)
+        started.append(task)
+    assert started == [0, 1, "small"]
+    assert len(asked) < 10
+    assert len(waiting) == 9998
+
+
+def test_graph_keep_going_skips_dependents():
+    if not (Path("/bin/false").exists() and Path("/bin/true").exists()):
+        return
+    depends_on = {"bad": [], "after_bad": ["bad"], "good": [],
+                  "after_good": ["good"]}
+    to_do = {
+        task: Namespace(memory=1, args=["/bin/false" if task == "bad"
+                                        else "/bin/true"])
+        for task in depends_on
+    }
+
+    def run_next(completed):
+        return {x: y for (x, y) in to_do.items()
+                if x not in completed and set(depends_on[x]) <= completed}
+
+    result = graph_do(run_next, 2, keep_going=True)
+    assert result.completed == {"good", "after_good"}
+    assert result.failed == {"bad"}
+
+
+def test_graph_failure_waits_for_running_children(monkeypatch):
+    if not (Path("/bin/false").exists() and Path("/bin/sleep").exists()):
+        return
+    to_do = {
+        "fail": Namespace(memory=1, args=["/bin/false"]),
+        "slow": Namespace(memory=1, args=["/bin/sleep", "0.5"]),
+        "never": Namespace(memory=1, args=["/bin/true"]),
+    }
+    started = list()
+
+    def run_next(completed):
+        if "fail" in completed or "slow" in completed:
+            return {"never": to_do["never"]}
+        return {x: to_do[x] for x in ["fail", "slow"]}
+
+    real_start = gridengineapp.multiprocess._start_child
+
+    def record_start(description, cores=None):
+        child = real_start(description, cores)
+        started.append(child)
+        return child
+
+    monkeypatch.setattr(
+        gridengineapp.multiprocess, "_start_child", record_start)
+    with pytest.raises(ChildProcessProblem):
+        graph_do(run_next, 2, cpu_limit=2)
+    assert len(started) == 2
+    assert all(child.returncode is not None for child in started)
@@ -0,0 +1,124 @@
+import json
+
+import pytest
+
+import gridengineapp.queue_catalog as queue_module
+from gridengineapp.config import configuration
+from gridengineapp.queue_catalog import QueueCatalog, queue_catalog
+from gridengineapp.run_grid_app import check_resources
+from gridengineapp.submit import _largest_in_qhost
+
+
+def test_shortest_queue_longer_than():
+    catalog = QueueCatalog({"all.q": 4320, "long.q": 20160, "i.q": 60})
+    assert catalog.shortest_longer_than(10) == "i.q"
+    assert catalog.shortest_longer_than(60) == "all.q"
+    assert catalog.shortest_longer_than(5000) == "long.q"
+    assert catalog.shortest_longer_than(20160) is None
+    assert catalog.longest == 20160
+
+
+@pytest.fixture
+def asked(monkeypatch):
+    asked = list()
+
+    def fake_qconf(queue):
+        asked.append(queue)
+        return 60 * len(queue)
+
+    def fake_qhost():
+        asked.append("qhost")
+        return dict(memory_gigabytes=256.0, threads=64)
+
+    monkeypatch.setattr(queue_module, "max_run_minutes_on_queue", fake_qconf)
+    monkeypatch.setattr(queue_module, "largest_host", fake_qhost)
+    monkeypatch.setattr(queue_module, "_CATALOGS", dict())
+    return asked
+
+
+def test_catalog_shared_through_file(tmp_path, asked):
+    queues = configuration()["queues"].split()
+    expected = {queue: 60 * len(queue) for queue in queues}
+    catalog = queue_catalog(tmp_path)
+    assert catalog.run_minutes == expected
+    assert catalog.host == dict(memory_gigabytes=256.0, threads=64)
+    assert asked == queues + ["qhost"]
+    assert queue_catalog(tmp_path) is catalog
+    queue_module._CATALOGS.clear()  # As for another process.
+    assert queue_catalog(tmp_path).run_minutes == expected
+    assert queue_catalog(tmp_path).host == catalog.host
+    assert asked == queues + ["qhost"]
+
+
+def test_catalog_directory_found_once(tmp_path, asked, monkeypatch):
+    found = list()
+
+    def fake_shared_directory(key, fallback):
+        found.append(key)
+        return tmp_path
+
+    monkeypatch.setattr(
+        queue_module, "shared_directory", fake_shared_directory)
+    catalog = queue_catalog()
+    assert queue_catalog() is catalog
+    assert found == ["queue-catalog-directory"]
+
+
+def test_catalog_refetched_after_ttl(tmp_path, asked):
+    queue_catalog(tmp_path)
+    catalog_file = next(tmp_path.glob("*.json"))
+    stored = json.loads(catalog_file.read_text())
+    stored["fetched"] -= 1e6
+    catalog_file.write_text(json.dumps(stored))
+    queue_module._CATALOGS.clear()
+    queue_catalog(tmp_path)
+    assert asked == 2 * (configuration()["queues"].split() + ["qhost"])
+
+
+QHOST = """\
+HOSTNAME                ARCH         NCPU NSOC NCOR NTHR  LOAD  MEMTOT  MEMUSE  SWAPTO  SWAPUS
+----------------------------------------------------------------------------------------------
+global                  -               -    -    -    -     -       -       -       -       -
+node1                   lx-amd64       16    2    8   16  0.50   62.8G   20.1G    8.0G     0.0
+node2                   lx-amd64       64    2   32   64  1.00  503.7G  100.0G    8.0G     0.0
+node3                   lx-amd64        -    -    -    -     -       -       -       -       -
+"""  # noqa: E501
+
+
+def test_largest_host_from_qhost():
+    host = _largest_in_qhost(QHOST)
+    assert host["threads"] == 64
+    assert host["memory_gigabytes"] == pytest.approx(503.7)
+    assert _largest_in_qhost("") is None
+
+
+class LongJobs:
+    @staticmethod
+    def job(job_id):
+        run_time, memory, threads = job_id
+        return type("LongJob", (), dict(resources=dict(
+            run_time_minutes=run_time, memory_gigabytes=memory,
+            threads=threads,
+        )))
+
+
+def test_check_resources_before_launch(monkeypatch):
+    import gridengineapp.run_grid_app as run_grid_app
+    monkeypatch.setattr(
+        run_grid_app, "queue_catalog",
+        lambda: QueueCatalog(
+            {"a.q": 100}, dict(memory_gigabytes=64.0, threads=16)))
+    check_resources(LongJobs(), [(10, 1, 1), (99, 64, 16)])
+    with pytest.raises(RuntimeError, match="2 jobs"):
+        check_resources(LongJobs(), [(10, 1, 1), (100, 1, 1), (200, 1, 1)])
+    with pytest.raises(RuntimeError, match="65 GB"):
+        check_resources(LongJobs(), [(10, 65, 1)])
+    with pytest.raises(RuntimeError, match="17 threads"):
+        check_resources(LongJobs(), [(10, 1, 17)])
+
+
+def test_check_resources_without_host(monkeypatch):
+    import gridengineapp.run_grid_app as run_grid_app
+    monkeypatch.setattr(
+        run_grid_app, "queue_catalog", lambda: QueueCatalog({"a.q": 100}))
+    check_resources(LongJobs(), [(10, 1000, 1000)])
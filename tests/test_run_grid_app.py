@@ -1,6 +1,16 @@
+from threading import Lock
+from time import sleep
+
+import networkx as nx
 import pytest
 
-from gridengineapp.run_grid_app import sanitize_id, format_memory
+import gridengineapp.run_grid_app as run_grid_app
+from gridengineapp.graph_choice import execution_ordered
+from gridengineapp.job_table import write_job_table, job_table_arguments
+from gridengineapp.run_grid_app import (
+    sanitize_id, format_memory, submit_jobs, collapse_siblings, JobArray,
+    reusable_submissions,
+)
 
 
 @pytest.mark.parametrize("input,output", [
@@ -26,3 +36,105 @@ def test_sanitize_id(input, output):
 ])
 def test_format_memory(mem_gb, mem_str):
     assert format_memory(mem_gb) == mem_str
+
+
+def test_submit_jobs_after_predecessors(monkeypatch):
+    job_graph = nx.balanced_tree(2, 3, create_using=nx.DiGraph)
+    job_graph.edges[0, 1]["launch"] = True
+    lock = Lock()
+    running = [0, 0]  # Now and most at once.
+    holds = dict()
+
+    def fake_qsub(template, command):
+        with lock:
+            running[0] += 1
+            running[1] = max(running)
+        sleep(0.01)
+        with lock:
+            running[0] -= 1
+        return f"{1000 + command[0]}.1-3:1"
+
+    def prepare(job_id, grid_id):
+        assert all(pred in grid_id for pred in job_graph.predecessors(job_id))
+        holds[job_id] = sorted(
+            grid_id[pred].split(".")[0]
+            for pred, _, data in job_graph.in_edges(job_id, data=True)
+            if not data.get("launch")
+        )
+        return dict(), [job_id]
+
+    monkeypatch.setattr(run_grid_app, "qsub", fake_qsub)
+    grid_id = submit_jobs(job_graph, prepare, 4)
+    assert list(grid_id) == list(execution_ordered(job_graph))
+    assert grid_id == {job: f"{1000 + job}.1-3:1" for job in job_graph}
+    assert holds[1] == []
+    assert holds[3] == ["1001"]
+    assert running[1] > 1
+
+
+def test_collapse_siblings_under_each_parent():
+    job_graph = nx.balanced_tree(3, 2, create_using=nx.DiGraph)
+    unit_graph = collapse_siblings(
+        job_graph, lambda job_id: None if job_id == 5 else "same", 2)
+    arrays = [unit for unit in unit_graph if isinstance(unit, JobArray)]
+    assert sorted(sorted(array.members) for array in arrays) == [
+        [4, 6], [7, 8, 9], [10, 11, 12]]
+    # The mid-level jobs have different children, so stay apart.
+    assert {0, 1, 2, 3, 5} < set(unit_graph)
+    assert len(unit_graph) == 8
+    for array in arrays:
+        parent = next(job_graph.predecessors(array.members[0]))
+        assert list(unit_graph.predecessors(array)) == [parent]
+
+
+def test_collapse_siblings_keeps_different_keys_apart():
+    job_graph = nx.DiGraph([(0, 1), (0, 2), (0, 3)])
+    job_graph.edges[0, 3]["launch"] = True
+    unit_graph = collapse_siblings(job_graph, lambda job_id: "same", 2)
+    assert len(unit_graph) == 3
+    assert unit_graph.edges[0, 3]["launch"]
+    assert len(collapse_siblings(job_graph, lambda job_id: "same", 3)) == 4
+
+
+def test_job_table_rows_by_task(tmp_path):
+    table = write_job_table([["--job-id", 4], ["--job-id", 6]], tmp_path)
+    assert write_job_table([["--job-id", 4], ["--job-id", 6]], tmp_path) == \
+        table
+    assert job_table_arguments(table, 2) == [
+        "--job-id", "6", "--task-id", "0"]
+    with pytest.raises(IndexError):
+        job_table_arguments(table, 3)
+
+
+def test_reusable_submissions_need_reused_predecessors():
+    job_graph = nx.DiGraph([(0, 1), (1, 2), (0, 3)])
+    recorded = {0: "10", 1: "11", 2: "12.3", 3: "13"}
+    reuse, finished, stale = reusable_submissions(
+        job_graph, recorded, {"10", "12", "13"}, lambda job_id: False)
+    assert reuse == {0: "10", 3: "13"}
+    assert not finished
+    assert stale == ["12.3"]
+
+
+def test_reusable_submissions_keep_children_of_finished():
+    job_graph = nx.DiGraph([(0, 1), (1, 2), (0, 3)])
+    recorded = {0: "10", 1: "11", 2: "12.3", 3: "13"}
+    reuse, finished, stale = reusable_submissions(
+        job_graph, recorded, {"12", "13"}, lambda job_id: job_id == 0)
+    assert reuse == {0: "10", 3: "13"}
+    assert finished == {0}
+    assert stale == ["12.3"]
+
+
+def test_submit_jobs_skips_submitted(monkeypatch):
+    job_graph = nx.DiGraph([(0, 1), (0, 2)])
+    monkeypatch.setattr(
+        run_grid_app, "qsub", lambda template, command: str(command[0]))
+    recorded = dict()
+    grid_id = submit_jobs(
+        job_graph,
+        lambda job_id, grid_id: (dict(), [f"{grid_id[0]}-{job_id}"]),
+        2, {0: "old"}, recorded.__setitem__,
+    )
+    assert grid_id == {0: "old", 1: "old-1", 2: "old-2"}
+    assert recorded == {1: "old-1", 2: "old-2"}
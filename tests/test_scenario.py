@@ -50,6 +50,52 @@ def test_location_app_processes_parallel(example_module, tmp_path):
     assert len(list((tmp_path / "data").glob("*.hdf"))) == 13
 
 
+def test_location_app_forked_parallel(example_module, tmp_path):
+    location_module = example_module("location_hierarchy", "location_app")
+    app = location_module.LocationApp()
+    args = ["--base-directory", str(tmp_path), "--memory-limit", "2",
+            "--fork-tasks"]
+    entry(app, args)
+    assert len(list((tmp_path / "data").glob("*.hdf"))) == 13
+
+
+def test_location_app_forked_failure(example_module, tmp_path):
+    location_module = example_module("location_hierarchy", "location_app")
+    app = location_module.LocationApp()
+    args = ["--base-directory", str(tmp_path), "--memory-limit", "2",
+            "--fork-tasks", "--fail-for", "4"]
+    assert entry(app, args) != 0
+    assert not (tmp_path / "data" / "4.hdf").exists()
+
+
+def test_location_app_keep_going(example_module, tmp_path):
+    location_module = example_module("location_hierarchy", "location_app")
+    app = location_module.LocationApp()
+    args = ["--base-directory", str(tmp_path), "--memory-limit", "2",
+            "--fork-tasks", "--keep-going", "--fail-for", "1"]
+    assert entry(app, args) != 0
+    # Location 1 and its three children don't run, but the rest do.
+    assert len(list((tmp_path / "data").glob("*.hdf"))) == 9
+
+
+def test_location_app_resume(example_module, tmp_path):
+    location_module = example_module("location_hierarchy", "location_app")
+    run_id = token_hex(4)
+    args = ["--base-directory", str(tmp_path), "--memory-limit", "2",
+            "--fork-tasks", "--run-id", run_id]
+    app = location_module.LocationApp()
+    assert entry(app, args + ["--keep-going", "--fail-for", "1"]) != 0
+    done = {path: path.stat().st_mtime
+            for path in (tmp_path / "data").glob("*.hdf")}
+    assert len(done) == 9
+
+    app = location_module.LocationApp()
+    assert entry(app, args + ["--resume"]) == 0
+    assert len(list((tmp_path / "data").glob("*.hdf"))) == 13
+    for path, mtime in done.items():
+        assert path.stat().st_mtime == mtime
+
+
 def test_location_app_processes_grid(
         example_module, fair, shared_cluster_tmp
 ):
@@ -141,6 +187,24 @@ def test_country_app_parallel(example_module, tmp_path):
     assert len(list(tmp_path.glob("*.hdf"))) == 5
 
 
+def test_country_app_task_blocks(example_module, tmp_path):
+    location_module = example_module("single_task_array", "countries")
+    app = location_module.Countries()
+    args = ["--base-directory", str(tmp_path), "--memory-limit", "2",
+            "--cpu-limit", "2", "--task-blocks"]
+    entry(app, args)
+    assert len(list(tmp_path.glob("*.hdf"))) == 5
+
+
+def test_country_app_forked_task_blocks(example_module, tmp_path):
+    location_module = example_module("single_task_array", "countries")
+    app = location_module.Countries()
+    args = ["--base-directory", str(tmp_path), "--memory-limit", "2",
+            "--cpu-limit", "2", "--task-blocks", "--fork-tasks"]
+    entry(app, args)
+    assert len(list(tmp_path.glob("*.hdf"))) == 5
+
+
 def test_country_app_grid(example_module, fair, shared_cluster_tmp):
     location_module = example_module("single_task_array", "countries")
     app = location_module.Countries()
@@ -0,0 +1,140 @@
+from argparse import ArgumentParser
+from getpass import getuser
+from pathlib import Path
+from secrets import token_hex
+
+import networkx as nx
+import pytest
+
+from gridengineapp import entry, Job, FileEntity, IntegerIdentifier
+from gridengineapp.shared_arrays import (
+    SharedArrays, SharedSegments, SHARED_MEMORY_VARIABLE
+)
+
+np = pytest.importorskip("numpy")
+
+
+def test_arrays_in_file_outside_local_run(tmp_path, monkeypatch):
+    monkeypatch.delenv(SHARED_MEMORY_VARIABLE, raising=False)
+    arrays = SharedArrays(tmp_path / "sub" / "a.npz", ["x"])
+    assert arrays.validate() is not None
+    arrays.write(dict(x=np.arange(4), y=np.ones(2)))
+    assert arrays.validate() is None
+    assert SharedArrays(tmp_path / "sub" / "a.npz", ["z"]).validate()
+    assert arrays.read(["x"])["x"].tolist() == [0, 1, 2, 3]
+    assert set(arrays.read()) == {"x", "y"}
+
+
+def test_arrays_shared_in_local_run(tmp_path, monkeypatch):
+    monkeypatch.setenv(SHARED_MEMORY_VARIABLE, str(tmp_path / "shm"))
+    arrays = SharedArrays(tmp_path / "a.npz", ["x"])
+    arrays.segment.parent.mkdir()
+    arrays.segment.with_suffix(".readers").touch()
+    arrays.write(dict(x=np.arange(4)))
+    assert not (tmp_path / "a.npz").exists()
+    assert arrays.validate() is None
+    read = arrays.read()["x"]
+    assert isinstance(read, np.memmap)
+    assert not read.flags.writeable
+    assert read.tolist() == [0, 1, 2, 3]
+    arrays.remove()
+    assert arrays.validate() is not None
+
+
+def test_arrays_without_readers_in_file(tmp_path, monkeypatch):
+    monkeypatch.setenv(SHARED_MEMORY_VARIABLE, str(tmp_path / "shm"))
+    arrays = SharedArrays(tmp_path / "a.npz", ["x"])
+    arrays.write(dict(x=np.arange(4)))
+    assert (tmp_path / "a.npz").exists()
+    assert not arrays.segment.exists()
+    assert arrays.read()["x"].tolist() == [0, 1, 2, 3]
+
+
+def test_segments_released_after_last_reader(tmp_path):
+    (tmp_path / "seg").mkdir()
+    segments = SharedSegments(tmp_path, dict(seg=2), {1: ["seg"], 2: ["seg"]})
+    segments.finished((0, 0))
+    segments.finished((1, 0))
+    assert (tmp_path / "seg").exists()
+    segments.finished((2, 0))
+    assert not (tmp_path / "seg").exists()
+
+
+class SharingJob(Job):
+    """Job 0 shares arrays with its children, which write their sum."""
+    def __init__(self, job_idx, base_directory):
+        super().__init__()
+        self.job_idx = job_idx
+        shared = SharedArrays(base_directory / "shared.npz", ["values"])
+        if job_idx == 0:
+            self.outputs["shared"] = shared
+        else:
+            self.inputs["shared"] = shared
+            self.outputs["sum"] = FileEntity(
+                base_directory / f"sum{job_idx}.txt")
+
+    @property
+    def identifier(self):
+        return IntegerIdentifier(self.job_idx)
+
+    def run(self):
+        if self.job_idx == 0:
+            self.outputs["shared"].write(dict(values=np.arange(10)))
+        else:
+            values = self.inputs["shared"].read()["values"]
+            self.outputs["sum"].path.write_text(str(int(values.sum())))
+
+
+class SharingApplication:
+    def __init__(self):
+        self.name = "sharing"
+        self.base_directory = Path(".")
+
+    def add_arguments(self, parser=None):
+        parser = parser if parser is not None else ArgumentParser()
+        parser.add_argument("--base-directory", type=Path)
+        IntegerIdentifier.add_arguments(parser)
+        return parser
+
+    def initialize(self, args):
+        self.base_directory = args.base_directory
+
+    @staticmethod
+    def job_id_to_arguments(job_id):
+        return ["--job-id", str(job_id)]
+
+    def job_graph(self):
+        return nx.DiGraph([
+            (IntegerIdentifier(0), IntegerIdentifier(1)),
+            (IntegerIdentifier(0), IntegerIdentifier(2)),
+        ])
+
+    def job(self, identifier):
+        return SharingJob(int(identifier), self.base_directory)
+
+    def job_identifiers(self, args):
+        if isinstance(getattr(args, "job_id", None), int):
+            return [IntegerIdentifier(args.job_id)]
+        return self.job_graph().nodes
+
+
+def test_local_run_passes_shared_arrays(tmp_path):
+    run_id = token_hex(4)
+    args = ["--base-directory", str(tmp_path), "--memory-limit", "2",
+            "--fork-tasks", "--run-id", run_id]
+    assert entry(SharingApplication(), args) == 0
+    for job_idx in [1, 2]:
+        assert (tmp_path / f"sum{job_idx}.txt").read_text() == "45"
+    assert not (tmp_path / "shared.npz").exists()
+    run_directories = Path("/dev/shm").glob(
+        f"gridengineapp-{getuser()}-sharing{run_id}")
+    assert not list(run_directories)
+
+
+def test_local_run_keeps_arrays_no_task_reads(tmp_path):
+    args = ["--base-directory", str(tmp_path), "--memory-limit", "2",
+            "--fork-tasks", "--job-id", "0"]
+    assert entry(SharingApplication(), args) == 0
+    shared = SharedArrays(tmp_path / "shared.npz", ["values"])
+    assert shared.validate() is None
+    assert shared.read()["values"].sum() == 45
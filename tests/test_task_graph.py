@@ -0,0 +1,81 @@
+from random import Random
+from time import perf_counter
+
+import networkx as nx
+import pytest
+
+from gridengineapp.main import find_runnable
+from gridengineapp.task_graph import TaskGraph, ReadyArrayTasks
+
+
+def expanded(job_graph, task_ids):
+    """A graph with a node for every task, for comparison."""
+    task_graph = nx.DiGraph()
+    for job_id in job_graph:
+        task_graph.add_nodes_from((job_id, t) for t in task_ids[job_id])
+    for u, v in job_graph.edges:
+        task_graph.add_edges_from(
+            ((u, u_task), (v, v_task))
+            for u_task in task_ids[u] for v_task in task_ids[v]
+        )
+    return task_graph
+
+
+@pytest.fixture
+def arrays():
+    job_graph = nx.DiGraph([("a", "b"), ("a", "c"), ("b", "d"), ("c", "d")])
+    task_ids = dict(a=[0], b=range(1, 4), c=range(1, 6), d=range(1, 3))
+    return job_graph, task_ids
+
+
+def test_task_graph_matches_expanded(arrays):
+    job_graph, task_ids = arrays
+    compact = TaskGraph(job_graph, task_ids)
+    full = expanded(job_graph, task_ids)
+    assert len(compact) == len(full)
+    assert set(compact) == set(full)
+    assert len(compact.edges) == len(full.edges)
+    assert set(compact.edges) == set(full.edges)
+    assert (("b", 2), ("d", 1)) in compact.edges
+    assert (("b", 2), ("c", 1)) not in compact.edges
+    for task in full:
+        assert set(compact.predecessors(task)) == set(full.predecessors(task))
+        assert set(compact.successors(task)) == set(full.successors(task))
+
+
+def test_task_graph_remove_matches_expanded(arrays):
+    job_graph, task_ids = arrays
+    compact = TaskGraph(job_graph, task_ids)
+    full = expanded(job_graph, task_ids)
+    remove = [("a", 0), ("b", 2)] + [("c", t) for t in range(1, 6)]
+    remaining = compact.copy()
+    remaining.remove_nodes_from(remove)
+    full.remove_nodes_from(remove)
+    assert len(compact) == 11
+    assert set(remaining) == set(full)
+    assert set(remaining.edges) == set(full.edges)
+
+
+def test_ready_array_tasks_matches_find_runnable(arrays):
+    job_graph, task_ids = arrays
+    ready = ReadyArrayTasks(TaskGraph(job_graph, task_ids))
+    remaining = expanded(job_graph, task_ids)
+    rng = Random(3)
+    while remaining:
+        assert set(ready.ready) == set(find_runnable(remaining))
+        task = rng.choice(ready.ready)
+        newly = ready.complete(task)
+        remaining.remove_node(task)
+        assert all(new_task in remaining for new_task in newly)
+    assert ready.ready == []
+
+
+def test_task_graph_large_arrays_are_cheap():
+    job_graph = nx.DiGraph([("a", "b"), ("b", "c")])
+    task_ids = dict(a=range(1, 1001), b=range(1, 1001), c=[0])
+    begin = perf_counter()
+    task_graph = TaskGraph(job_graph, task_ids)
+    ready = ReadyArrayTasks(task_graph)
+    assert perf_counter() - begin < 1
+    assert len(task_graph.edges) == 1000 * 1000 + 1000
+    assert len(ready.ready) == 1000
@@ -0,0 +1,57 @@
+import shelve
+
+import pytest
+
+import gridengineapp.validation_cache as validation_module
+from gridengineapp.data_passing import ShelfFile, validate_entities
+from gridengineapp.validation_cache import ValidationCache
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    validation_cache = ValidationCache(tmp_path / "validation.db", 10)
+    monkeypatch.setattr(
+        validation_module, "_CACHE",
+        (validation_module.os.getpid(), validation_cache))
+    yield validation_cache
+    validation_cache.close()
+
+
+def test_cache_matches_size_and_time(cache):
+    cache.store({("a", "k", 10, 5): None, ("b", "k", 10, 5): "bad"})
+    found = cache.lookup([
+        ("a", "k", 10, 5), ("b", "k", 10, 5), ("a", "k", 10, 6),
+        ("a", "other", 10, 5), ("c", "k", 1, 1),
+    ])
+    assert found == {("a", "k", 10, 5): None, ("b", "k", 10, 5): "bad"}
+
+
+def test_cache_shared_between_connections(cache):
+    cache.store({("a", "k", 10, 5): None})
+    other = ValidationCache(cache.path, 10)
+    assert other.lookup([("a", "k", 10, 5)]) == {("a", "k", 10, 5): None}
+    other.close()
+
+
+def test_cache_evicts_oldest(cache):
+    for path_idx in range(12):
+        cache.store({(str(path_idx), "k", 1, 1): None})
+    found = cache.lookup(
+        [(str(path_idx), "k", 1, 1) for path_idx in range(12)])
+    assert len(found) <= 10
+    assert ("11", "k", 1, 1) in found
+    assert ("0", "k", 1, 1) not in found
+
+
+def test_shelf_not_opened_while_unchanged(cache, tmp_path, mocker):
+    path = tmp_path / "shelf"
+    entity = ShelfFile(path, required_keys={"one"})
+    entity.mock()
+    opened = mocker.spy(shelve, "open")
+    assert validate_entities([entity]) == [None]
+    assert validate_entities([entity]) == [None]
+    assert opened.call_count == 1
+    missing = ShelfFile(path, required_keys={"two"})
+    assert validate_entities([missing])[0] is not None
+    assert validate_entities([missing])[0] is not None
+    assert opened.call_count == 2